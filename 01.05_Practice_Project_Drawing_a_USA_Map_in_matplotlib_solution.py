@@ -5,21 +5,26 @@ Load a county-level PNG map of the USA and draw it using matplotlib
 
 import matplotlib.pyplot as plt
 
+import basemap
+import figure_export
+
 # Houston location
 
 USA_SVG_SIZE = [555, 352]
 HOUSTON_POS = [302, 280]
 
 
-def draw_USA_map(map_name):
+def draw_USA_map(map_name, output_file = None, image_format = None):
     """
     Given the name of a PNG map of the USA (specified as a string),
     draw this map using matplotlib
+    If output_file (a file name or binary buffer) is given, the map is rendered headless and written there
+    as PNG or SVG (image_format, or the file extension) instead of being shown in a window
     """
      
-    # Load map image, note that using 'rb'option in open() is critical since png files are binary
-##    with open(map_name, 'rb') as map_file:        # using 'r' causes Python to crash :(
-    map_img = plt.imread(map_name)
+    # Load map image - decoded only once per process and shared by later calls
+    usa_map = basemap.load_basemap(map_name, USA_SVG_SIZE)
+    map_img = usa_map.image
 
     #  Get dimensions of USA map image
     ypixels, xpixels, bands = map_img.shape
@@ -30,19 +35,29 @@ def draw_USA_map(map_name):
 ##    xinch = xpixels / DPI
 ##    yinch = ypixels / DPI
 ##    plt.figure(figsize=(xinch,yinch))
+    if output_file is None:
+        fig = plt.figure()
+    else:
+        fig = figure_export.new_figure()      # not tracked by pyplot, no display needed
+    axes = fig.add_subplot()
     
     # Plot USA map
-    implot = plt.imshow(map_img)
+    implot = axes.imshow(map_img)
     
     # Plot green scatter point in center of map
-    plt.scatter(x = xpixels / 2, y = ypixels / 2, s = 100, c = "Green")
+    axes.scatter(x = xpixels / 2, y = ypixels / 2, s = 100, c = "Green")
     
     # Plot red scatter point on Houston, Tx - include code that rescale coordinates for larger PNG files
-    plt.scatter(x = HOUSTON_POS[0] * xpixels / USA_SVG_SIZE[0], y = HOUSTON_POS[1] * ypixels / USA_SVG_SIZE[1], s = 100, c = "Red") 
+    houston_x, houston_y = usa_map.svg_to_pixels(HOUSTON_POS[0], HOUSTON_POS[1])
+    axes.scatter(x = houston_x, y = houston_y, s = 100, c = "Red") 
 
-    plt.show()
+    if output_file is None:
+        plt.show()
+    else:
+        figure_export.save_figure(fig, output_file, image_format)
 
 
 ##draw_USA_map("USA_Counties_555x352.png")
-draw_USA_map("USA_Counties_1000x634.png")   
+if __name__ == '__main__':
+    draw_USA_map("USA_Counties_1000x634.png")   
 
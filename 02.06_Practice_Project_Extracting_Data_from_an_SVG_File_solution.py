@@ -5,29 +5,23 @@ Output a CSV file with FIPS code and county centers
 """
 
 import math
-import csv
+import multiprocessing
 
+import bulk_csv
+import instrument
+import svg_paths
 
 
-# Parse the XMLin USA SVG file extract county attributes
-# Derive from example code - https://stackoverflow.com/questions/15857818/python-svg-parser
 
-from xml.dom import minidom
+# Parse the XML in USA SVG file extract county attributes
+# The file is streamed so that very large SVG files do not have to fit in memory
 
 def get_county_attributes(svg_file_name):
     """
     Given SVG file associate with string svg_file_name, extract county attributes from associated XML
     Return a list of tuples consisting of FIPS codes (strings) and county boundaries (strings)
     """
-    
-    svg_doc = minidom.parse(svg_file_name)
-    county_attribute_list = []
-    for path in svg_doc.getElementsByTagName('path'):
-        FIPS_code = path.getAttribute('id')
-        county_boundary_data = path.getAttribute('d')
-        county_attribute_list.append((FIPS_code, county_boundary_data))
-    svg_doc.unlink()
-    return county_attribute_list
+    return list(svg_paths.iter_path_attributes(svg_file_name, ('id', 'd')))
                                           
 
 def test_get_attributes(svg_file_name):
@@ -126,30 +120,47 @@ def test_boundary_code():
                                             
 # Put it all together to read county attributes from SVG files, compute county centers, write FIPS codes and county centers to CSV file
 
-def process_county_attributes(svg_file_name, csv_file_name):
+@instrument.traced()
+def process_county_attributes(svg_file_name, csv_file_name, processes = 1, chunk_size = 256, float_precision = None):
     """
     Given SVG file name (as string), extract county attributes (FIPS code and county boundaries)
     Then compute county centers and write a CSV file with columns corresponding to FIPS code, x-coord of centers, y-coord of centers 
+    Centers are computed chunk_size counties at a time by svg_paths.path_centers, and are identical to
+    those of compute_county_center(get_boundary_coordinates(boundary))
+    The optional argument processes sets the number of worker processes used to compute centers
+    (None uses one per CPU), each handling one chunk at a time
+    Each center is computed from its own path alone, so the CSV file is identical whatever the number
+    of processes and chunk_size
+    The optional argument float_precision writes centers with that many decimals instead of full precision
+    The CSV file is gzipped if its name ends in .gz, and only replaces any existing file once it is complete
     """
 
-    # Extract county attibutes from SVG file
-    county_attribute_list = get_county_attributes(svg_file_name)
-    print("Processed", len(county_attribute_list), "entries")
-    
-    # Ouput CSV file
-    with open(csv_file_name, 'w', newline='') as csv_file:
-        csv_writer = csv.writer(csv_file, delimiter=',', quoting=csv.QUOTE_MINIMAL)
-        for (fips, boundary) in county_attribute_list:
-            boundary_coordinates = get_boundary_coordinates(boundary)
-            center = compute_county_center(boundary_coordinates)
-            csv_writer.writerow([fips, center[0], center[1]])
+    # Extract county attibutes from SVG file as it is parsed and output CSV file
+    # Parsing, computing and writing are interleaved, so they are timed as one stage
+    county_attributes = svg_paths.iter_path_attributes(svg_file_name, ('id', 'd'))
+    county_chunks = svg_paths.iter_chunks(county_attributes, chunk_size)
+    with instrument.span('compute_centers', 'compute', processes = processes) as span, \
+         bulk_csv.open_csv(csv_file_name, float_precision = float_precision) as csv_writer:
+        if processes == 1:
+            # Chunks are parsed and computed as the writer consumes them
+            for center_rows in map(svg_paths.path_centers, county_chunks):
+                csv_writer.writerows(center_rows)
+        else:
+            # imap() hands back the chunks of centers in the same order as the counties in the SVG file
+            with multiprocessing.Pool(processes) as pool:
+                for center_rows in pool.imap(svg_paths.path_centers, county_chunks):
+                    csv_writer.writerows(center_rows)
+        span.note(rows = csv_writer.rows_written)
+    instrument.count('rows_read', csv_writer.rows_written)
+    print("Processed", csv_writer.rows_written, "entries")
     print("Wrote csv file", csv_file_name)
     
     
 # Output CSV file should have 3143 rows
     
 #process_county_attributes("USA_Counties_with_FIPS_and_names.svg", "USA_Counties_with_FIPS_and_centers.csv")                                      
-process_county_attributes("USA_Counties_2014.svg", "USA_Counties_with_FIPS_and_centers.csv")                                      
+if __name__ == '__main__':
+    process_county_attributes("USA_Counties_2014.svg", "USA_Counties_with_FIPS_and_centers.csv")                                      
 
 
 
@@ -7,7 +7,14 @@ about the expected behavior of the program.
 """
 
 import csv
-import pygal
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gdp_table
+import instrument
+import render_pool
 
 def isfloat(value):
     """
@@ -94,26 +101,21 @@ def build_plot_dict(gdpinfo, country_list):
       CSV file should still be in the output dictionary, but
       with an empty XY plot value list.
     """
-    filename = gdpinfo["gdpfile"]
-    keyfield = gdpinfo["country_name"]
-    separator = gdpinfo["separator"]
-    quote = gdpinfo["quote"]
-    
-    gdpdata_full = read_csv_as_nested_dict(filename, keyfield, separator, quote)
-    plot_dict = {}
-##    print('GDP keys: ', gdpdata_full.keys())
-##    print('Country list: ', country_list)
-    for country in country_list:
-        if country in gdpdata_full:
-            gdpdata = gdpdata_full[country]
-##            print('GDP data by country_list: ', gdpdata)
-            plot_dict[country] = build_plot_values(gdpinfo, gdpdata)
-        else:
-            plot_dict[country] = []
-##    print('Plot dict: ', plot_dict)
+    with instrument.span('load_table', 'parse'):
+        table = gdp_table.load_gdp_table(gdpinfo, ("country_name",))
+        name_index = table.index(gdpinfo["country_name"])
+    with instrument.span('compute', 'compute'):
+        plot_dict = {}
+        for country in country_list:
+            if country in name_index:
+                plot_dict[country] = table.plot_values(name_index[country],
+                                                       gdpinfo['min_year'], gdpinfo['max_year'])
+            else:
+                plot_dict[country] = []
     return plot_dict
 
 
+@instrument.traced()
 def render_xy_plot(gdpinfo, country_list, plot_file):
     """
     Inputs:
@@ -130,15 +132,49 @@ def render_xy_plot(gdpinfo, country_list, plot_file):
       The image will be stored in a file named by plot_file.
     """
     plot_dict = build_plot_dict(gdpinfo, country_list)
-    gdp_chart = pygal.XY()
-
-    for country in country_list:
-        gdp_chart.add(country, plot_dict[country])
+    with instrument.span('render', 'render'):
+        gdp_chart = render_pool.build_chart(xy_plot_spec(country_list, plot_dict))
         
-    gdp_chart.render_to_file(plot_file)
+        render_pool.output_chart(gdp_chart, plot_file)
     return
 
 
+def xy_plot_spec(country_list, plot_dict):
+    """
+    Inputs:
+      country_list - List of strings that are country names
+      plot_dict    - Dictionary returned by build_plot_dict for country_list
+
+    Output:
+      Returns the chart spec dictionary (see render_pool) describing the
+      XY plot of the countries in country_list.
+    """
+    return {'type': 'xy',
+            'series': [(country, plot_dict[country]) for country in country_list]}
+
+
+def render_xy_plots(gdpinfo, country_lists, plot_files, processes=None):
+    """
+    Inputs:
+      gdpinfo       - GDP data information dictionary
+      country_lists - List of lists of country names, one list per plot
+      plot_files    - List of output plot file names, one per plot
+      processes     - Number of rendering processes
+
+    Output:
+      Returns a list of render_pool.RenderResults, one per plot in order.
+
+    Action:
+      Creates an SVG image of an XY plot for each country list, as
+      render_xy_plot does.  The plots are rendered in parallel by the
+      given number of worker processes (None for one per CPU, 1 for no
+      worker processes).
+    """
+    jobs = [(xy_plot_spec(country_list, build_plot_dict(gdpinfo, country_list)), plot_file)
+            for country_list, plot_file in zip(country_lists, plot_files)]
+    return render_pool.render_charts(jobs, processes)
+
+
 def test_render_xy_plot():
     """
     Code to exercise render_xy_plot and generate plots from
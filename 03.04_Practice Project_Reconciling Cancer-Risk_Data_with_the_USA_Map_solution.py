@@ -6,6 +6,10 @@ Analyze both data sources for anamolous FIPS codes
 
 import csv
 
+import bulk_csv
+import incremental_join
+import instrument
+import table_join
 
 
 #########################################################
@@ -39,12 +43,10 @@ def write_csv_file(csv_table, file_name):
     """
     Input: Nested list csv_table and a string file_name
     Action: Write fields in csv_table into a comma-separated CSV file with the name file_name
+    The rows are written in large batches, and the file only replaces any existing file once it is complete
     """
     
-    with open(file_name, 'w', newline='') as csv_file:
-        csv_writer = csv.writer(csv_file, delimiter=',', quoting=csv.QUOTE_MINIMAL)
-        for row in csv_table:
-            csv_writer.writerow(row)
+    bulk_csv.write_rows(csv_table, file_name)
 
 
 
@@ -85,46 +87,71 @@ def test_make_dict():
 CANCER_RISK_FIPS_COL = 2
 CENTER_FIPS_COL = 0
 
-def merge_csv_files(cancer_csv_file, center_csv_file, joined_csv_file):
+@instrument.traced()
+def merge_csv_files(cancer_csv_file, center_csv_file, joined_csv_file, incremental = False):
     """
     Read two specified CSV files as tables
     Join the these tables by shared FIPS codes
     Write the resulting joined table as the specified file
     Analyze for problematic FIPS codes
+    If incremental is True, only the rows of FIPS codes added, removed or modified since the last
+    incremental run are rebuilt, using a manifest kept next to the joined file
     """
     
     # Read in both CSV files
-    risk_table = read_csv_file(cancer_csv_file)
+    with instrument.span('read_risk', 'parse'):
+        risk_table = read_csv_file(cancer_csv_file)
+    instrument.count('rows_read', len(risk_table))
     print("Read risk table of length", len(risk_table))
     
-    center_table = read_csv_file(center_csv_file)
+    with instrument.span('read_centers', 'parse'):
+        center_table = read_csv_file(center_csv_file)
+    instrument.count('rows_read', len(center_table))
     print("Read center table of length", len(center_table))
 
-    center_dict = make_dict(center_table, CENTER_FIPS_COL)
-    
-    # Compute joined table, print warning about cancer-risk FIPS codes that are not in USA map
-    joined_table =[]
-    for row in risk_table:
-        FIPS_code = row[2]
-        if FIPS_code in center_dict:
-            joined_table.append(row + center_dict[FIPS_code])
+    if incremental:
+        # Bring the joined table up to date, patching in only the changed FIPS codes
+        with instrument.span('update_join', 'reconcile'):
+            update = incremental_join.update_join(risk_table, center_table, CANCER_RISK_FIPS_COL, CENTER_FIPS_COL,
+                                                  joined_csv_file, last = True)
+        if update.full:
+            print("Rebuilt joined table of length", update.num_rows)
+        elif update.rewritten:
+            print("Patched joined table of length", update.num_rows, "-", len(update.added), "added,",
+                  len(update.removed), "removed,", len(update.modified), "modified codes")
         else:
-            print("Row", row, "in cancer risk table not present in USA map")
-
-    # Write joined table
-    print("Wrote joined table of length", len(joined_table))
-    write_csv_file(joined_table, joined_csv_file)
+            print("Joined table of length", update.num_rows, "is up to date")
+        left_unmatched, right_unmatched = update.left_unmatched, update.right_unmatched
+    else:
+        # Join tables on FIPS codes, keeping only rows present in both tables
+        # As with make_dict, only the last center row of a FIPS code is used
+        # Joined rows are only built as they are written, the tables are not copied
+        with instrument.span('join', 'reconcile'):
+            joined = table_join.hash_join(risk_table, center_table, CANCER_RISK_FIPS_COL, CENTER_FIPS_COL,
+                                          last = True)
+
+        # Write joined table
+        print("Wrote joined table of length", len(joined))
+        with instrument.span('write', 'write'):
+            write_csv_file(joined, joined_csv_file)
+        left_unmatched, right_unmatched = joined.left_unmatched, joined.right_unmatched
     
+    # Print warning about cancer-risk FIPS codes that are not in USA map
+    print()
+    print(len(left_unmatched), "codes in cancer risk table not present in USA map")
+    for risk_code in sorted(left_unmatched):
+        print("Code", risk_code, "in cancer risk table not present in USA map")
+
     # Print warning about FIPS codes in USA map that are missing from cancer risk data
     print()
-    risk_codes =[risk_table[idx][2] for idx in range(len(risk_table))]
-    for center_code in center_dict:
-        if center_code not in risk_codes:
-            print("Code", center_code, "in center table not present in cancer risk table")
+    print(len(right_unmatched), "codes in center table not present in cancer risk table")
+    for center_code in sorted(right_unmatched):
+        print("Code", center_code, "in center table not present in cancer risk table")
 
 
 
-merge_csv_files("cancer_risk_trimmed_solution.csv", "USA_Counties_with_FIPS_and_centers.csv", "cancer_risk_joined.csv")
+if __name__ == '__main__':
+    merge_csv_files("cancer_risk_trimmed_solution.csv", "USA_Counties_with_FIPS_and_centers.csv", "cancer_risk_joined.csv")
 
 
 
@@ -7,9 +7,22 @@ about the expected behavior of the program.
 """
 
 import csv
-import math
+import os
+import sys
 import pygal
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import country_names
+import gdp_table
+import instrument
+import parse_cache
+import render_pool
+
+
+# Name indexes of GDP files, shared by every caller in the process
+NAME_INDEX_CACHE = parse_cache.ParseCache(maxsize=4)
+
 
 def pygal_country_dict():
     '''
@@ -80,6 +93,69 @@ def reconcile_countries_by_name(plot_countries, gdp_countries):
             plot_cc_not_in_gdp.add(plot_cc)
     return (plot_to_gdp_countries, plot_cc_not_in_gdp)
 
+def load_gdp_name_index(gdpinfo, cache=NAME_INDEX_CACHE):
+    """
+    Inputs:
+      gdpinfo - A GDP information dictionary
+      cache   - ParseCache to build the index through, or None
+    Output:
+      Returns the country_names.NameIndex of the country names of the
+      GDP file, built once per version of the file.  The index is
+      shared between callers and must not be modified.
+    """
+    options = (gdpinfo['country_name'], gdpinfo['separator'], gdpinfo['quote'])
+    if cache is None:
+        return read_gdp_name_index(gdpinfo['gdpfile'], *options)
+    return cache.get(gdpinfo['gdpfile'], read_gdp_name_index, *options)
+
+
+def read_gdp_name_index(gdpfile, country_name, separator, quote):
+    """
+    Returns a new country_names.NameIndex of the country names of a GDP
+    file, read through gdp_table.load_gdp_table.
+    """
+    table = gdp_table.load_gdp_table({'gdpfile': gdpfile,
+                                      'country_name': country_name,
+                                      'separator': separator,
+                                      'quote': quote}, ('country_name',))
+    return country_names.build_name_index(table.index(country_name))
+
+
+def reconcile_countries_by_fuzzy_name(plot_countries, gdp_countries,
+                                      threshold=country_names.DEFAULT_THRESHOLD,
+                                      overrides=None, index=None):
+    """
+    Inputs:
+      plot_countries - Dictionary whose keys are plot library country codes
+                       and values are the corresponding country name
+      gdp_countries  - Dictionary whose keys are country names used in GDP data
+      threshold      - Lowest score (0 to 1) of a name accepted as a match
+      overrides      - Dictionary mapping plot library country names to the
+                       GDP country name they must match (None for no match),
+                       or None
+      index          - country_names.NameIndex of the keys of gdp_countries
+                       (see load_gdp_name_index), or None to build one
+
+    Output:
+      The same tuple as reconcile_countries_by_name, except that names
+      spelled differently in the two dictionaries (e.g. "Korea, Republic
+      of" and "Korea, Rep.") are matched as well; see country_names.
+    """
+    if index is None:
+        index = country_names.build_name_index(gdp_countries)
+    matches = country_names.match_names(plot_countries.values(), index, threshold, overrides)
+
+    plot_to_gdp_countries = {}
+    plot_cc_not_in_gdp = set()
+
+    for plot_cc in plot_countries:
+        if plot_countries[plot_cc] in matches:
+            plot_to_gdp_countries[plot_cc] = matches[plot_countries[plot_cc]]
+        else:
+            plot_cc_not_in_gdp.add(plot_cc)
+    return (plot_to_gdp_countries, plot_cc_not_in_gdp)
+
+
 ### Test reconcile_countries_by_name ###
 
 #~ pygal_countries = pygal_country_dict()
@@ -108,26 +184,46 @@ def build_map_dict_by_name(gdpinfo, plot_countries, year):
       3. The second set contains the country codes from plot_countries that were found 
       in the GDP data file, but have no GDP data for the specified year.
     """
-    gdp_data_dict = read_csv_as_nested_dict(gdpinfo['gdpfile'], gdpinfo['country_name'],\
-                                        gdpinfo['separator'], gdpinfo['quote'])
-    
-    plot_cc_to_gdp_countries = reconcile_countries_by_name(plot_countries, gdp_data_dict)
-    
-    map_dict = {}
-    plot_cc_not_in_gdpdata = plot_cc_to_gdp_countries[1]
-    plot_cc_no_gdp = set()
-    
-    for plot_cc in plot_cc_to_gdp_countries[0]:
-        key = plot_cc_to_gdp_countries[0][plot_cc]
-        if gdp_data_dict[key][year] == '':
-            plot_cc_no_gdp.add(plot_cc)
-            #~ print('No GDP data for year', year)
+    return build_map_dicts_by_name(gdpinfo, plot_countries, [year])[year]
+
+
+def build_map_dicts_by_name(gdpinfo, plot_countries, years):
+    """
+    Inputs:
+      gdpinfo        - A GDP information dictionary
+      plot_countries - Dictionary whose keys are plot library country codes
+                       and values are the corresponding country name
+      years          - List (or range) of years to create GDP mappings for
+
+    Output:
+      A dictionary mapping each year in years to the tuple that
+      build_map_dict_by_name returns for that year.  The GDP file is
+      loaded and the countries are reconciled only once for all years.
+
+      If gdpinfo has a "name_threshold" entry, country names are matched
+      by reconcile_countries_by_fuzzy_name with that threshold, and with
+      the overrides in the JSON file named by its "name_overrides" entry
+      if it has one.  The name index of the GDP file is built once per
+      process.
+    """
+    with instrument.span('load_table', 'parse'):
+        table = gdp_table.load_gdp_table(gdpinfo, ('country_name',))
+        gdp_rows = table.index(gdpinfo['country_name'])
+
+    with instrument.span('reconcile', 'reconcile'):
+        if 'name_threshold' in gdpinfo:
+            overrides = None
+            if gdpinfo.get('name_overrides'):
+                overrides = country_names.read_overrides(gdpinfo['name_overrides'])
+            plot_cc_to_gdp_countries = reconcile_countries_by_fuzzy_name(
+                plot_countries, gdp_rows, gdpinfo['name_threshold'], overrides,
+                load_gdp_name_index(gdpinfo))
         else:
-            gdp_year_log = math.log10(float(gdp_data_dict[key][year]))
-            map_dict[plot_cc] = gdp_year_log
-            #~ print('Country code: {}; GDP: {:.5f}'.format(plot_cc, gdp_year_log))
-            
-    return (map_dict, plot_cc_not_in_gdpdata, plot_cc_no_gdp)
+            plot_cc_to_gdp_countries = reconcile_countries_by_name(plot_countries, gdp_rows)
+    
+    with instrument.span('compute', 'compute'):
+        return gdp_table.build_map_dicts(table, gdpinfo['country_name'],
+                                         plot_cc_to_gdp_countries, list(years))
     
     
 ### Test build_map_dict_by_name ###
@@ -140,7 +236,9 @@ def build_map_dict_by_name(gdpinfo, plot_countries, year):
 #############################
 
 
-def render_world_map(gdpinfo, plot_countries, year, map_file):
+@instrument.traced()
+def render_world_map(gdpinfo, plot_countries, year, map_file,
+                     mode=render_pool.RENDER_FILE, colors=None):
     """
     Inputs:
       gdpinfo        - A GDP information dictionary
@@ -148,25 +246,75 @@ def render_world_map(gdpinfo, plot_countries, year, map_file):
                        and values are the corresponding country name
       year           - String year to create GDP mapping for
       map_file       - Name of output file to create
+      mode           - render_pool.RENDER_FILE (the default) to only write
+                       map_file, RENDER_BYTES to write nothing, or
+                       RENDER_BROWSER to open the map in a web browser
+      colors         - color_lut.ColorLUT used to color each country by its
+                       log GDP, or None to shade the series color
 
     Output:
-      Returns None.
+      Returns the rendered SVG as bytes (None for RENDER_BROWSER).
 
     Action:
       Creates a world map plot of the GDP data for the given year and
-      writes it to a file named by map_file.
+      writes it to a file named by map_file.  The map is rendered only once.
     """
     gdp_map_data = build_map_dict_by_name(gdpinfo, plot_countries, year)
 
-    world_gdp_chart = pygal.maps.world.World()
-    world_gdp_chart.title = 'GDP as Log10() per Country in the Year '+ year
-    world_gdp_chart.add('GDP for '+ year, gdp_map_data[0])
-    world_gdp_chart.add('Missing from\nBank GDP Data', gdp_map_data[1])
-    world_gdp_chart.add('No GDP Reported', gdp_map_data[2])
-    world_gdp_chart.render()
-    world_gdp_chart.render_to_file(map_file)
-    world_gdp_chart.render_in_browser()
-    return
+    with instrument.span('render', 'render'):
+        world_gdp_chart = render_pool.build_chart(world_chart_spec(year, gdp_map_data, colors))
+        return render_pool.output_chart(world_gdp_chart, map_file, mode)
+
+
+def world_chart_spec(year, gdp_map_data, colors=None):
+    """
+    Inputs:
+      year           - String year to create GDP mapping for
+      gdp_map_data   - Tuple returned by build_map_dict_by_name for year
+      colors         - color_lut.ColorLUT, or None
+
+    Output:
+      Returns the chart spec dictionary (see render_pool) describing the
+      world map plot of gdp_map_data.  With colors, each country is
+      filled with the color of its log GDP from the lookup table.
+    """
+    gdp_values = gdp_map_data[0]
+    if colors is not None:
+        gdp_values = colors.pygal_values(gdp_values)
+    return {'type': 'world',
+            'title': 'GDP as Log10() per Country in the Year '+ year,
+            'series': [('GDP for '+ year, gdp_values),
+                       ('Missing from\nBank GDP Data', gdp_map_data[1]),
+                       ('No GDP Reported', gdp_map_data[2])]}
+
+
+def render_world_maps(gdpinfo, plot_countries, years, map_file, processes=None,
+                      colors=None):
+    """
+    Inputs:
+      gdpinfo        - A GDP information dictionary
+      plot_countries - Dictionary whose keys are plot library country codes
+                       and values are the corresponding country name
+      years          - List (or range) of years to create GDP mappings for
+      map_file       - Name of output files to create, containing "{}"
+                       which is replaced by each year
+      processes      - Number of rendering processes
+      colors         - color_lut.ColorLUT, or None
+
+    Output:
+      Returns a list of render_pool.RenderResults, one per year in order.
+
+    Action:
+      Creates one world map plot per year, loading and reconciling the
+      GDP data only once, and writes each to the file named by map_file.
+      The maps are rendered in parallel by the given number of worker
+      processes (None for one per CPU, 1 for no worker processes).
+    """
+    gdp_map_dicts = build_map_dicts_by_name(gdpinfo, plot_countries, years)
+
+    jobs = [(world_chart_spec(str(year), gdp_map_data, colors), map_file.format(year))
+            for year, gdp_map_data in gdp_map_dicts.items()]
+    return render_pool.render_charts(jobs, processes)
 
 
 def test_render_world_map():
@@ -194,4 +342,5 @@ def test_render_world_map():
 # Make sure the following call to test_render_world_map is commented
 # out when submitting to OwlTest/CourseraTest.
 
-test_render_world_map()
+if __name__ == '__main__':
+    test_render_world_map()
@@ -5,9 +5,20 @@ Load a county-level PNG map of the USA and plot cancer-risk data at county cente
 
 import math
 import csv
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 
+import atomic_file
+import basemap
+import choropleth
+import color_lut
+import county_index
+import instrument
+import polygon_store
+import typed_csv
+import figure_export
+
 
 # Size of SVG image of USA
 USA_SVG_SIZE = [555, 352]
@@ -35,7 +46,7 @@ SCATTER_SCALE = math.pi / (200.0 ** 2)
 
 def compute_county_cirle(county_population):
     """
-    Given county population as integer,
+    Given county population as integer (or array of integers),
     Compute area of circle proportional to population for use as option to scatter() in matplotlib
     """
     return  SCATTER_SCALE * county_population
@@ -50,28 +61,45 @@ def create_riskmap(colormap):
     """
     Initialize the colormap "jet" from matplotlib,
     Return function that takes risk and returns RGB color for use with scatter() in matplotlib
+    The function also takes an array of risks and returns an array of RGBA colors, one row per risk
+    Colors come from a lookup table of the colormap computed once, risks outside the table are clamped
     """
     
-    # Note that this code is tricky - remember to return a lambda expression
-    risk_norm = mpl.colors.Normalize(vmin = MIN_LOG_RISK, vmax = MAX_LOG_RISK)
-    color_mapper = mpl.cm.ScalarMappable(norm = risk_norm, cmap = colormap)
-    return lambda risk : color_mapper.to_rgba(math.log(risk, 10))
+    return color_lut.ColorLUT(colormap, MIN_LOG_RISK, MAX_LOG_RISK, bins = colormap.N, transform = np.log10)
 
 
 
 # Part 3 - load CSV file and PNG image of USA and then draw cancer-risk ata county centers
 
 RISK_COLUMN = 4
-
-def draw_cancer_risk_map(joined_csv_name, map_name, num_counties = None):
+FIPS_COLUMN = 2
+POPULATION_COLUMN = 3
+XCENTER_COLUMN = 5
+YCENTER_COLUMN = 6
+
+# Columns of the joined table used for drawing, each converted once as the table is read
+JOINED_SCHEMA = [typed_csv.Column('fips', FIPS_COLUMN, typed_csv.FIPS),
+                 typed_csv.Column('population', POPULATION_COLUMN, typed_csv.INT),
+                 typed_csv.Column('risk', RISK_COLUMN, typed_csv.FLOAT),
+                 typed_csv.Column('xcenter', XCENTER_COLUMN, typed_csv.FLOAT),
+                 typed_csv.Column('ycenter', YCENTER_COLUMN, typed_csv.FLOAT)]
+
+@instrument.traced()
+def draw_cancer_risk_map(joined_csv_name, map_name, num_counties = None, output_file = None, image_format = None,
+                         bbox = None):
     """
     Given names of joined CSV file and PNG map of USA, draw cancer-risk data for counties overlaid on USA map
     The optional argument num_counties specifies the number of counties to be drawn
+    The optional argument bbox = (xmin, ymin, xmax, ymax) in SVG coordinates zooms the map to that region,
+    only counties whose centers lie inside it are drawn
+    If output_file (a file name or binary buffer) is given, the map is rendered headless and written there
+    as PNG or SVG (image_format, or the file extension) instead of being shown in a window
     """
      
-    # Load map image, note that using 'rb'option in open() is critical since png files are binary
-    with open(map_name, 'rb') as map_file:        # using 'r' causes Python to crash :(
-        map_img = plt.imread(map_file)
+    # Load map image - decoded only once per process and shared by later calls
+    with instrument.span('load_basemap', 'parse'):
+        usa_map = basemap.load_basemap(map_name, USA_SVG_SIZE)
+    map_img = usa_map.image
         
     #  Get dimensions of USA map image
     ypixels, xpixels, bands = map_img.shape
@@ -81,31 +109,89 @@ def draw_cancer_risk_map(joined_csv_name, map_name, num_counties = None):
     DPI = 80.0                  # adjust this constant to resize your plot
     xinch = xpixels / DPI
     yinch = ypixels / DPI
-    plt.figure(figsize=(xinch,yinch))
-
-    # Plot USA map
-    implot = plt.imshow(map_img)
+    with instrument.span('new_figure', 'render'):
+        if output_file is None:
+            fig = plt.figure(figsize=(xinch,yinch))
+        else:
+            fig = figure_export.new_figure(figsize=(xinch,yinch))      # not tracked by pyplot, no display needed
+        axes = fig.add_subplot()
+
+        # Plot USA map
+        implot = axes.imshow(map_img)
     
-    # Load joined cancer risk data from CSV file - note that rows of input table are already sorted by cancer-risk
-    joined_cancer_risk_table = read_csv_file(joined_csv_name)
-##    joined_cancer_risk_table.sort(key = lambda row: float(row[RISK_COLUMN]), reverse = True)     # Code for sorting by risk if table is not already sorted
+    # Load joined cancer risk data from CSV file as typed columns - note that rows of input table are already sorted by cancer-risk
+    with instrument.span('load_table', 'parse'):
+        joined_cancer_risk_table = typed_csv.load_typed_csv(joined_csv_name, JOINED_SCHEMA)
+##    joined_cancer_risk_table = joined_cancer_risk_table.take(np.argsort(-joined_cancer_risk_table['risk'], kind = 'stable'))     # Code for sorting by risk if table is not already sorted
     
-    # Compute function that maps cancer risk to RGB colors
-    risk_map = create_riskmap(mpl.cm.jet)
+    with instrument.span('compute', 'compute'):
+        # Compute function that maps cancer risk to RGB colors
+        risk_map = create_riskmap(mpl.cm.jet)
+        
+        # Select the counties to draw, their data is already in arrays so they can be drawn with a single call to scatter()
+        county_rows = joined_cancer_risk_table.head(num_counties)
+        if bbox is not None:
+            # Look up visible counties in a spatial index of the table, built once per file
+            centers = county_index.load_county_index(joined_csv_name, FIPS_COLUMN, XCENTER_COLUMN, YCENTER_COLUMN)
+            visible = centers.in_bbox(*bbox)
+            county_rows = county_rows.take(visible[visible < len(county_rows)])
+        county_populations = county_rows['population']
+        county_cancer_risks = county_rows['risk']
+        county_xcenters = county_rows['xcenter']
+        county_ycenters = county_rows['ycenter']
+        
+        # Rescale county centers from SVG coordinates to map pixels
+        county_xpixels, county_ypixels = usa_map.svg_to_pixels(county_xcenters, county_ycenters)
     
-    # Draw cancer-risk data for counties as circles whose color indicates risk and area indicates population
-    for row in joined_cancer_risk_table[: num_counties]:
-        county_population = int(row[3])
-        county_cancer_risk = float(row[4])
-        county_xcenter = float(row[5])
-        county_ycenter = float(row[6])
-        plt.scatter(x = county_xcenter * xpixels / USA_SVG_SIZE[0],
-                    y = county_ycenter * ypixels / USA_SVG_SIZE[1],
-                    s = compute_county_cirle(county_population),
-                    c = risk_map(county_cancer_risk))
+    with instrument.span('render', 'render'):
+        # Draw cancer-risk data for counties as circles whose color indicates risk and area indicates population
+        axes.scatter(x = county_xpixels,
+                     y = county_ypixels,
+                     s = compute_county_cirle(county_populations),
+                     c = risk_map(county_cancer_risks))
+        instrument.count('points_drawn', len(county_xpixels))
         
-    plt.show()
+        if bbox is not None:
+            xmin, ymin = usa_map.svg_to_pixels(bbox[0], bbox[1])
+            xmax, ymax = usa_map.svg_to_pixels(bbox[2], bbox[3])
+            axes.set_xlim(xmin, xmax)
+            axes.set_ylim(ymax, ymin)                   # image rows run downwards
+            
+        if output_file is None:
+            plt.show()
+        else:
+            figure_export.save_figure(fig, output_file, image_format)
+
+
+def draw_cancer_risk_choropleth(joined_csv_name, svg_name, output_file, image_format = None, store_dir = None):
+    """
+    Given names of joined CSV file and SVG map of USA counties, fill each county on the map with the color of its cancer risk
+    The map is written to output_file as SVG if image_format (or the file extension) is svg, otherwise as a raster image
+    Raster images are drawn from the polygon store in store_dir (built there if needed), or from the SVG if store_dir is None
+    """
+    
+    # Map FIPS codes to cancer risks
+    joined_cancer_risk_table = typed_csv.load_typed_csv(joined_csv_name, JOINED_SCHEMA)
+    county_risks = dict(zip(joined_cancer_risk_table['fips'].tolist(), joined_cancer_risk_table['risk'].tolist()))
+    
+    risk_map = create_riskmap(mpl.cm.jet)
+    template = choropleth.load_template(svg_name)
+    if image_format is None:
+        image_format = output_file.rpartition('.')[2].lower()
+    
+    if image_format == 'svg':
+        with atomic_file.atomic_write(output_file, encoding = 'utf-8') as svg_file:
+            svg_file.write(template.render_values(county_risks, risk_map))
+    else:
+        if store_dir is None:
+            polygons = polygon_store.read_polygon_store(svg_name)
+        else:
+            polygons = polygon_store.load_polygon_store(svg_name, store_dir)
+        choropleth.render_raster(county_risks, polygons, risk_map, output_file, image_format,
+                                 defaults = template.default_fills(), svg_size = USA_SVG_SIZE)
+
 
 ##draw_cancer_risk_map("cancer_risk_joined_solution.csv", "USA_Counties_555x352.png", 200)
-draw_cancer_risk_map("cancer_risk_joined_solution.csv", "USA_Counties_1000x634.png", 200) 
+if __name__ == '__main__':
+    draw_cancer_risk_map("cancer_risk_joined_solution.csv", "USA_Counties_1000x634.png", 200) 
 
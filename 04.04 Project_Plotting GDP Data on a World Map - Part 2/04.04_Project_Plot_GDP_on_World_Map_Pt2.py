@@ -7,9 +7,17 @@ about the expected behavior of the program.
 """
 
 import csv
-import math
+import os
+import sys
 import pygal
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import country_crosswalk
+import gdp_table
+import instrument
+import render_pool
+
 def pygal_country_dict():
     '''
     Returns Pygal country code dictionary
@@ -70,6 +78,21 @@ def read_csv_as_nested_dict(filename, keyfield, separator, quote):
     return table
 
 
+def load_code_crosswalk(codeinfo):
+    """
+    Input:
+      codeinfo - A country code information dictionary
+    Output:
+      Returns the country_crosswalk.Crosswalk of the code file, read
+      once per process.  If codeinfo has a "crosswalk_file" entry the
+      crosswalk is also kept in that file, so later runs skip reading
+      the code file.
+    """
+    return country_crosswalk.load_crosswalk(codeinfo['codefile'], codeinfo['separator'],
+                                            codeinfo['quote'],
+                                            index_file_name=codeinfo.get('crosswalk_file'))
+
+
 def build_country_code_converter(codeinfo):
     """
     Inputs:
@@ -81,15 +104,8 @@ def build_country_code_converter(codeinfo):
       code file are specified in codeinfo dictionary.
     """
 
-    isp_code_dict = read_csv_as_nested_dict(codeinfo['codefile'], codeinfo['plot_codes'],\
-                                        codeinfo['separator'], codeinfo['quote'])
-    plot_to_isp_codes = {}
-    
-    for plot_cc in isp_code_dict:
-        plot_to_isp_codes[isp_code_dict[plot_cc][codeinfo['plot_codes']]] \
-        = isp_code_dict[plot_cc][codeinfo['data_codes']]
-    
-    return plot_to_isp_codes
+    crosswalk = load_code_crosswalk(codeinfo)
+    return crosswalk.mapping(codeinfo['plot_codes'], codeinfo['data_codes'])
 
 ### Test build_country_code_converter() ###
 
@@ -124,34 +140,18 @@ def reconcile_countries_by_code(codeinfo, plot_countries, gdp_countries):
     """
     plot_to_gdp_countries = {}
     plot_cc_not_in_gdp = set()
-    
-    plot_to_isp_dict = build_country_code_converter(codeinfo)
-    
-    plot_to_isp_keys_dict = {key.lower():key for key in plot_to_isp_dict} 
-    gdp_keys_dict = {key.lower():key for key in gdp_countries}
-    
-    #~ print('Plot to ISP dict:', plot_to_isp_dict)
-    #~ print()
-    #~ print('Plot to ISP keys dict:', plot_to_isp_keys_dict)
-    #~ print()
-    #~ print('GDP Countries dict:', gdp_countries)
-    #~ print()
-    #~ print('GDP keys dict:', gdp_keys_dict)
-    #~ print()
-    #~ print('Plot countries:', plot_countries)
-    #~ print()    
-    
+
+    # Maps casefolded plot codes to data codes, built once per code file
+    plot_to_data_codes = load_code_crosswalk(codeinfo).converter(codeinfo['plot_codes'],
+                                                                 codeinfo['data_codes'])
+    gdp_keys_dict = country_crosswalk.casefold_keys(gdp_countries)
+
     for plot_cc in plot_countries:
-        try:
-            # This is rather easy to get lost.  The goal is to test case insensitive country
-            # codes from the plot code to the world code to the gdp code.  This makes use
-            # of intermediate dictionaries which maps the lower case key to original case key,
-            # for both the plot to isp and the gdp country dictionaries.
-            if plot_to_isp_dict[plot_to_isp_keys_dict[plot_cc.lower()]].lower() in gdp_keys_dict:
-                plot_to_gdp_countries[plot_cc] = gdp_keys_dict[plot_to_isp_dict[plot_to_isp_keys_dict[plot_cc.lower()]].lower()]
-            else:
-                plot_cc_not_in_gdp.add(plot_cc)
-        except:
+        data_cc = plot_to_data_codes.get(plot_cc.casefold())
+        gdp_cc = gdp_keys_dict.get(data_cc.casefold()) if data_cc is not None else None
+        if gdp_cc is not None:
+            plot_to_gdp_countries[plot_cc] = gdp_cc
+        else:
             plot_cc_not_in_gdp.add(plot_cc)
 
     return (plot_to_gdp_countries, plot_cc_not_in_gdp)
@@ -187,25 +187,32 @@ def build_map_dict_by_code(gdpinfo, codeinfo, plot_countries, year):
       3. The second set contains the country codes from plot_countries that were found 
       in the GDP data file, but have no GDP data for the specified year.
     """
-    gdp_data_dict = read_csv_as_nested_dict(gdpinfo['gdpfile'], gdpinfo['country_code'],\
-                                        gdpinfo['separator'], gdpinfo['quote']) 
+    return build_map_dicts_by_code(gdpinfo, codeinfo, plot_countries, [year])[year]
 
-    plot_cc_to_gdp_countries = reconcile_countries_by_code(codeinfo, plot_countries, gdp_data_dict)
-    
-    map_dict = {}
-    plot_cc_not_in_gdpdata = plot_cc_to_gdp_countries[1]
-    plot_cc_no_gdp = set()
-    
-    for plot_cc in plot_cc_to_gdp_countries[0]:
-        key = plot_cc_to_gdp_countries[0][plot_cc]
-        if gdp_data_dict[key][year] == '':
-            plot_cc_no_gdp.add(plot_cc)
 
-        else:
-            gdp_year_log = math.log10(float(gdp_data_dict[key][year]))
-            map_dict[plot_cc] = gdp_year_log
-            
-    return (map_dict, plot_cc_not_in_gdpdata, plot_cc_no_gdp)
+def build_map_dicts_by_code(gdpinfo, codeinfo, plot_countries, years):
+    """
+    Inputs:
+      gdpinfo        - A GDP information dictionary
+      codeinfo       - A country code information dictionary
+      plot_countries - Dictionary mapping plot library country codes to country names
+      years          - List (or range) of years for which to create GDP mappings
+
+    Output:
+      A dictionary mapping each year in years to the tuple that
+      build_map_dict_by_code returns for that year.  The GDP file is
+      loaded and the countries are reconciled only once for all years.
+    """
+    with instrument.span('load_table', 'parse'):
+        table = gdp_table.load_gdp_table(gdpinfo, ('country_code',))
+        gdp_rows = table.index(gdpinfo['country_code'])
+
+    with instrument.span('reconcile', 'reconcile'):
+        plot_cc_to_gdp_countries = reconcile_countries_by_code(codeinfo, plot_countries, gdp_rows)
+
+    with instrument.span('compute', 'compute'):
+        return gdp_table.build_map_dicts(table, gdpinfo['country_code'],
+                                         plot_cc_to_gdp_countries, list(years))
     
 ### Test build_map_dict_by_code ###
 
@@ -219,7 +226,9 @@ def build_map_dict_by_code(gdpinfo, codeinfo, plot_countries, year):
 
 #############################
 
-def render_world_map(gdpinfo, codeinfo, plot_countries, year, map_file):
+@instrument.traced()
+def render_world_map(gdpinfo, codeinfo, plot_countries, year, map_file,
+                     mode=render_pool.RENDER_FILE, colors=None):
     """
     Inputs:
       gdpinfo        - A GDP information dictionary
@@ -227,25 +236,75 @@ def render_world_map(gdpinfo, codeinfo, plot_countries, year, map_file):
       plot_countries - Dictionary mapping plot library country codes to country names
       year           - String year of data
       map_file       - String that is the output map file name
+      mode           - render_pool.RENDER_FILE (the default) to only write
+                       map_file, RENDER_BYTES to write nothing, or
+                       RENDER_BROWSER to open the map in a web browser
+      colors         - color_lut.ColorLUT used to color each country by its
+                       log GDP, or None to shade the series color
 
     Output:
-      Returns None.
+      Returns the rendered SVG as bytes (None for RENDER_BROWSER).
 
     Action:
       Creates a world map plot of the GDP data in gdp_mapping and outputs
-      it to a file named by svg_filename.
+      it to a file named by svg_filename.  The map is rendered only once.
     """
     gdp_map_data = build_map_dict_by_code(gdpinfo, codeinfo, plot_countries, year)
 
-    world_gdp_chart = pygal.maps.world.World()
-    world_gdp_chart.title = 'GDP as Log10() per Country in the Year '+ year
-    world_gdp_chart.add('GDP for '+ year, gdp_map_data[0])
-    world_gdp_chart.add('Missing from\nBank GDP Data', gdp_map_data[1])
-    world_gdp_chart.add('No GDP Reported', gdp_map_data[2])
-    world_gdp_chart.render()
-    world_gdp_chart.render_to_file(map_file)
-    world_gdp_chart.render_in_browser()
-    return
+    with instrument.span('render', 'render'):
+        world_gdp_chart = render_pool.build_chart(world_chart_spec(year, gdp_map_data, colors))
+        return render_pool.output_chart(world_gdp_chart, map_file, mode)
+
+
+def world_chart_spec(year, gdp_map_data, colors=None):
+    """
+    Inputs:
+      year           - String year of data
+      gdp_map_data   - Tuple returned by build_map_dict_by_code for year
+      colors         - color_lut.ColorLUT, or None
+
+    Output:
+      Returns the chart spec dictionary (see render_pool) describing the
+      world map plot of gdp_map_data.  With colors, each country is
+      filled with the color of its log GDP from the lookup table.
+    """
+    gdp_values = gdp_map_data[0]
+    if colors is not None:
+        gdp_values = colors.pygal_values(gdp_values)
+    return {'type': 'world',
+            'title': 'GDP as Log10() per Country in the Year '+ year,
+            'series': [('GDP for '+ year, gdp_values),
+                       ('Missing from\nBank GDP Data', gdp_map_data[1]),
+                       ('No GDP Reported', gdp_map_data[2])]}
+
+
+def render_world_maps(gdpinfo, codeinfo, plot_countries, years, map_file, processes=None,
+                      colors=None):
+    """
+    Inputs:
+      gdpinfo        - A GDP information dictionary
+      codeinfo       - A country code information dictionary
+      plot_countries - Dictionary mapping plot library country codes to country names
+      years          - List (or range) of years of data
+      map_file       - String output map file name containing "{}",
+                       which is replaced by each year
+      processes      - Number of rendering processes
+      colors         - color_lut.ColorLUT, or None
+
+    Output:
+      Returns a list of render_pool.RenderResults, one per year in order.
+
+    Action:
+      Creates one world map plot per year, loading and reconciling the
+      GDP data only once, and writes each to the file named by map_file.
+      The maps are rendered in parallel by the given number of worker
+      processes (None for one per CPU, 1 for no worker processes).
+    """
+    gdp_map_dicts = build_map_dicts_by_code(gdpinfo, codeinfo, plot_countries, years)
+
+    jobs = [(world_chart_spec(str(year), gdp_map_data, colors), map_file.format(year))
+            for year, gdp_map_data in gdp_map_dicts.items()]
+    return render_pool.render_charts(jobs, processes)
 
 
 
@@ -270,4 +329,5 @@ def test_render_world_map():
     render_world_map(gdpinfo, codeinfo, pygal_countries, "2010", "isp_gdp_world_code_2010.svg")
 
 
-test_render_world_map()
+if __name__ == '__main__':
+    test_render_world_map()
@@ -0,0 +1,49 @@
+"""
+Atomic replacement of output files.
+
+atomic_write opens a temporary file next to the target, named after the
+target and the process id, and renames it over the target only once the
+block writing it has finished.  Readers, and other processes writing the
+same file, never see a partly written file: the target holds either its
+old contents or the complete new ones.  If the block raises, the
+temporary file is removed and the target is left untouched.
+"""
+
+import contextlib
+import os
+
+
+def temp_name(file_name):
+    """
+    Returns the name of the temporary file atomic_write writes file_name
+    through in this process.
+    """
+    return '{}.{}.tmp'.format(file_name, os.getpid())
+
+
+@contextlib.contextmanager
+def atomic_write(file_name, mode='w', buffering=-1, encoding=None, newline=None):
+    """
+    Inputs:
+      file_name - name of the file to write
+      mode      - 'w' for text or 'wb' for binary
+      buffering, encoding, newline - passed on to open()
+    Output:
+      Context manager giving the temporary file object open for writing.
+      file_name is replaced when the block ends, or left as it was if
+      the block raises.
+    """
+    if mode not in ('w', 'wb'):
+        raise ValueError('atomic_write mode must be w or wb, not {!r}'.format(mode))
+    writing_name = temp_name(file_name)
+    try:
+        with open(writing_name, mode, buffering=buffering, encoding=encoding,
+                  newline=newline) as output_file:
+            yield output_file
+        os.replace(writing_name, file_name)
+    except BaseException:
+        try:
+            os.remove(writing_name)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,136 @@
+"""
+Cached background images for maps drawn over USA_Counties_*.png.
+
+Each PNG is decoded once per process and kept in a bounded cache, so
+drawing many overlays on the same map skips image decoding entirely.
+Decoded images can also be stored on disk as raw .npy arrays and
+memory-mapped by later processes instead of being decoded again.
+
+A Basemap also carries the affine transform from the coordinates of the
+SVG the map was drawn from (e.g. the county centers computed from
+USA_Counties_2014.svg) to pixel coordinates in the image.
+"""
+
+import os
+
+import numpy as np
+import matplotlib.image as mpimg
+
+import atomic_file
+import parse_cache
+
+
+# Size of SVG image of USA
+USA_SVG_SIZE = (555, 352)
+
+# Basemaps loaded by load_basemap, shared by every caller in the process
+BASEMAP_CACHE = parse_cache.ParseCache(maxsize=4)
+
+
+class Basemap:
+    """
+    A decoded map image and the transform from SVG to pixel coordinates.
+
+    Attributes:
+      image    - array of shape (ypixels, xpixels, bands)
+      xpixels  - width of the image in pixels
+      ypixels  - height of the image in pixels
+      bands    - number of color bands
+      affine   - 3 x 3 matrix taking homogeneous SVG coordinates to pixels
+    """
+
+    def __init__(self, image, svg_size=USA_SVG_SIZE):
+        self.image = image
+        self.ypixels, self.xpixels, self.bands = image.shape
+        self.affine = np.array([[self.xpixels / svg_size[0], 0.0, 0.0],
+                                [0.0, self.ypixels / svg_size[1], 0.0],
+                                [0.0, 0.0, 1.0]])
+
+    def svg_to_pixels(self, xcoords, ycoords):
+        """
+        Inputs:
+          xcoords - number or array of x coordinates in the SVG
+          ycoords - number or array of y coordinates in the SVG
+        Output:
+          Returns a tuple (x pixels, y pixels) of arrays of the same shape.
+        """
+        xcoords = np.asarray(xcoords, dtype=np.float64)
+        ycoords = np.asarray(ycoords, dtype=np.float64)
+        xpixels = self.affine[0, 0] * xcoords + self.affine[0, 1] * ycoords + self.affine[0, 2]
+        ypixels = self.affine[1, 0] * xcoords + self.affine[1, 1] * ycoords + self.affine[1, 2]
+        return xpixels, ypixels
+
+    def pixels_to_svg(self, xpixels, ypixels):
+        """
+        Inputs:
+          xpixels - number or array of x pixel coordinates in the image
+          ypixels - number or array of y pixel coordinates in the image
+        Output:
+          Returns a tuple (x coordinates, y coordinates) in the SVG, e.g.
+          for looking up the county under the mouse in a county_index.
+        """
+        inverse = np.linalg.inv(self.affine)
+        xpixels = np.asarray(xpixels, dtype=np.float64)
+        ypixels = np.asarray(ypixels, dtype=np.float64)
+        xcoords = inverse[0, 0] * xpixels + inverse[0, 1] * ypixels + inverse[0, 2]
+        ycoords = inverse[1, 0] * xpixels + inverse[1, 1] * ypixels + inverse[1, 2]
+        return xcoords, ycoords
+
+
+def decode_image(map_name, cache_dir=None):
+    """
+    Inputs:
+      map_name  - name of a PNG file
+      cache_dir - directory of raw decoded images, or None
+    Output:
+      Returns the decoded image as an array.  With a cache_dir the
+      image is memory-mapped from a raw copy there, which is written on
+      first use and named after the PNG's size and modification time so
+      that a changed PNG is decoded again.
+    """
+    if cache_dir is None:
+        with open(map_name, 'rb') as map_file:
+            return mpimg.imread(map_file)
+
+    stat = os.stat(map_name)
+    stem = os.path.splitext(os.path.basename(map_name))[0]
+    raw_name = os.path.join(cache_dir, '{}-{}-{}.npy'.format(stem, stat.st_size, stat.st_mtime_ns))
+    if not os.path.exists(raw_name):
+        with open(map_name, 'rb') as map_file:
+            image = mpimg.imread(map_file)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Other processes never map a partly written file
+        with atomic_file.atomic_write(raw_name, 'wb') as raw_file:
+            np.save(raw_file, image)
+    return np.load(raw_name, mmap_mode='r')
+
+
+def read_basemap(map_name, svg_size=USA_SVG_SIZE, cache_dir=None):
+    """
+    Inputs:
+      map_name  - name of a PNG file
+      svg_size  - (width, height) of the SVG the map was drawn from
+      cache_dir - directory of raw decoded images, or None
+    Output:
+      Returns a new Basemap for the PNG file, with a read-only image.
+    """
+    image = decode_image(map_name, cache_dir)
+    image.flags.writeable = False
+    return Basemap(image, svg_size)
+
+
+def load_basemap(map_name, svg_size=USA_SVG_SIZE, cache_dir=None, cache=BASEMAP_CACHE):
+    """
+    Inputs:
+      map_name  - name of a PNG file
+      svg_size  - (width, height) of the SVG the map was drawn from
+      cache_dir - directory of raw decoded images, or None
+      cache     - ParseCache to read the basemap through, or None
+    Output:
+      Returns the Basemap for the PNG file, decoding it only if it is
+      not already cached.  The image is shared between callers and must
+      not be modified.
+    """
+    if cache is None:
+        return read_basemap(map_name, tuple(svg_size), cache_dir)
+    return cache.get(map_name, read_basemap, tuple(svg_size), cache_dir)
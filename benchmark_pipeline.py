@@ -0,0 +1,519 @@
+"""
+End-to-end benchmark of the stages of the course pipelines.
+
+Each stage times one step of the course scripts on inputs at several
+multiples of the size of the bundled data files (1x, 10x and 100x by
+default):
+
+  get_county_attributes   - 02.06: read the paths of the county SVG
+  compute_county_centers  - 02.06: process_county_attributes, i.e. read
+                            the county SVG and write the centers file
+  merge_csv_files         - 03.04: join the cancer-risk and county center
+                            CSV files and write the joined file
+  load_gdp_table          - 03.05: read the GDP CSV file keyed by country
+                            name with gdp_table.load_gdp_table
+  build_plot_dict         - 02.07: XY plot values of every country
+  build_map_dict_by_code  - 04.04: reconcile the countries by code and
+                            compute their log GDP for one year
+  render_xy_plot          - 02.07: pygal XY plot of 10 countries per 1x
+  render_world_map        - 04.04: pygal world map of one year
+  draw_cancer_risk_map    - 04.03: matplotlib map of every county
+
+The inputs at scale N are synthetic files (see synthetic_data) N times
+the size of the bundled ones, made from a fixed seed; the GDP table
+starts with the countries of isp_country_codes.csv so the world map has
+data to draw.  Inputs are written once per scale and seed to a work
+directory.
+
+Every stage runs once to warm up and then repeat times at each scale.
+The parse caches are cleared before each run, so every run reads its
+inputs, and the output of the scripts is discarded.  The results hold
+the statistics of the perf_counter times of each stage at each scale.
+
+The results are compared with a baseline file of earlier results: a
+stage whose median time is more than threshold (a fraction, 0.25 by
+default) above its baseline median is a regression, and the run exits
+with status 1.  If there is no baseline yet, the results become it and
+nothing is compared.  The default baseline, benchmark_baseline.json in
+the course directory, is machine-specific and is not version controlled.
+
+With --trace, the spans and counters of the timed runs (see instrument)
+are recorded, each run as a span named after its stage and scale, and
+written to a file; the latency histogram of every span is printed.
+Recording slows the runs slightly.
+
+  python benchmark_pipeline.py [--scales 1 10 100] [--repeat 5]
+      [--stages NAME ...] [--seed 0] [--baseline FILE] [--threshold 0.25]
+      [--update-baseline] [--work-dir DIR] [--output FILE] [--trace FILE]
+"""
+
+import argparse
+import contextlib
+import csv
+import gc
+import importlib.util
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import atomic_file
+import basemap
+import choropleth
+import country_crosswalk
+import county_index
+import gdp_table
+import instrument
+import synthetic_data
+import typed_csv
+
+
+COURSE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SCALES = (1, 10, 100)
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_BASELINE = os.path.join(COURSE_DIR, 'benchmark_baseline.json')
+
+RESULTS_VERSION = 1
+
+# Course scripts holding the benchmarked functions
+SCRIPTS = {
+    'svg': '02.06_Practice_Project_Extracting_Data_from_an_SVG_File_solution.py',
+    'xy': os.path.join('02.07 Project_Creating GDP Line Plots', '02.07_Project_GDP_plot.py'),
+    'merge': '03.04_Practice Project_Reconciling Cancer-Risk_Data_with_the_USA_Map_solution.py',
+    'world_name': os.path.join('03.05 Project_Plotting GDP Data on a World Map - Part 1',
+                               '03.05_Project_Plot_GDP_on_World_Map_Pt1.py'),
+    'risk_map': '04.03_Practice_Project_Visualizing_Cancer-risk_Data_on_the_USA_Map_solution.py',
+    'world_code': os.path.join('04.04 Project_Plotting GDP Data on a World Map - Part 2',
+                               '04.04_Project_Plot_GDP_on_World_Map_Pt2.py'),
+}
+
+# Bundled input files used at every scale
+CODE_FILE = os.path.join('04.04 Project_Plotting GDP Data on a World Map - Part 2',
+                         'isp_country_codes.csv')
+MAP_FILE = 'USA_Counties_1000x634.png'
+
+# Countries drawn by render_xy_plot per 1x of scale
+XY_PLOT_COUNTRIES = 10
+
+GDP_YEAR = '2000'
+
+# Caches of parsed files, cleared before each run
+PARSE_CACHES = (basemap.BASEMAP_CACHE, choropleth.TEMPLATE_CACHE,
+                country_crosswalk.CROSSWALK_CACHE, county_index.INDEX_CACHE,
+                gdp_table.TABLE_CACHE, typed_csv.TABLE_CACHE)
+
+def load_script(file_name, module_name):
+    """
+    Inputs:
+      file_name   - name of a course script, relative to the course directory
+      module_name - name to give the module
+    Output:
+      Returns the script imported as a module.
+    """
+    spec = importlib.util.spec_from_file_location(module_name,
+                                                  os.path.join(COURSE_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_scripts():
+    """
+    Returns a dictionary mapping each key of SCRIPTS to its imported script.
+    """
+    return {key: load_script(file_name, 'benchmark_' + key)
+            for key, file_name in SCRIPTS.items()}
+
+
+def make_inputs(scale, seed, work_dir):
+    """
+    Inputs:
+      scale    - multiple of the size of the bundled files
+      seed     - seed of the synthetic files
+      work_dir - directory to write the synthetic files to
+    Output:
+      Returns a dictionary mapping each key of synthetic_data.INPUT_NAMES,
+      and 'codes' and 'map', to the name of the input file.  Files
+      already written to work_dir are reused.
+    """
+    input_dir = os.path.join(work_dir, 'x{}-seed{}'.format(scale, seed))
+    done_name = os.path.join(input_dir, 'done')
+    code_file_name = os.path.join(COURSE_DIR, CODE_FILE)
+    if os.path.exists(done_name):
+        inputs = {key: os.path.join(input_dir, name)
+                  for key, name in synthetic_data.INPUT_NAMES.items()}
+    else:
+        with open(code_file_name, newline='') as csv_file:
+            countries = [(row['name'], row['ISO3166-1-Alpha-3']) for row in csv.DictReader(csv_file)]
+        inputs = synthetic_data.write_inputs(input_dir, scale, seed, countries)
+        with open(done_name, 'w'):
+            pass
+    inputs['codes'] = code_file_name
+    inputs['map'] = os.path.join(COURSE_DIR, MAP_FILE)
+    return inputs
+
+
+def gdpinfo_for(inputs):
+    """
+    Returns the GDP information dictionary of the GDP file of inputs.
+    """
+    return {'gdpfile': inputs['gdp'],
+            'separator': ',',
+            'quote': '"',
+            'min_year': 1960,
+            'max_year': 2015,
+            'country_name': 'Country Name',
+            'country_code': 'Country Code'}
+
+
+def codeinfo_for(inputs):
+    """
+    Returns the country code information dictionary of inputs.
+    """
+    return {'codefile': inputs['codes'],
+            'separator': ',',
+            'quote': '"',
+            'plot_codes': 'ISO3166-1-Alpha-2',
+            'data_codes': 'ISO3166-1-Alpha-3'}
+
+
+def gdp_country_names(inputs):
+    """
+    Returns the list of country names of the GDP file of inputs.
+    """
+    with open(inputs['gdp'], newline='') as csv_file:
+        return [row['Country Name'] for row in csv.DictReader(csv_file)]
+
+
+# Each stage is a function called as stage(scripts, inputs, scale, work_dir)
+# that prepares a run of the stage and returns a function doing the run
+
+def stage_get_county_attributes(scripts, inputs, scale, work_dir):
+    """
+    Reads the county paths of the SVG.
+    """
+    return lambda: scripts['svg'].get_county_attributes(inputs['svg'])
+
+
+def stage_compute_county_centers(scripts, inputs, scale, work_dir):
+    """
+    Computes the center of every county of the SVG and writes the centers file.
+    """
+    centers_name = os.path.join(work_dir, 'centers_x{}.csv'.format(scale))
+    return lambda: scripts['svg'].process_county_attributes(inputs['svg'], centers_name)
+
+
+def stage_merge_csv_files(scripts, inputs, scale, work_dir):
+    """
+    Joins the cancer-risk and county center files.
+    """
+    joined_name = os.path.join(work_dir, 'joined_x{}.csv'.format(scale))
+    return lambda: scripts['merge'].merge_csv_files(inputs['risk'], inputs['centers'],
+                                                    joined_name)
+
+
+def stage_load_gdp_table(scripts, inputs, scale, work_dir):
+    """
+    Reads the GDP file keyed by country name, as build_map_dicts_by_name does.
+    """
+    gdpinfo = gdpinfo_for(inputs)
+    return lambda: gdp_table.load_gdp_table(gdpinfo, ('country_name',))
+
+
+def stage_build_plot_dict(scripts, inputs, scale, work_dir):
+    """
+    Builds the XY plot values of every country of the GDP file.
+    """
+    gdpinfo = gdpinfo_for(inputs)
+    names = gdp_country_names(inputs)
+    return lambda: scripts['xy'].build_plot_dict(gdpinfo, names)
+
+
+def stage_build_map_dict_by_code(scripts, inputs, scale, work_dir):
+    """
+    Builds the world map values of one year.
+    """
+    script = scripts['world_code']
+    gdpinfo = gdpinfo_for(inputs)
+    codeinfo = codeinfo_for(inputs)
+    plot_countries = script.pygal_country_dict()
+    return lambda: script.build_map_dict_by_code(gdpinfo, codeinfo, plot_countries, GDP_YEAR)
+
+
+def stage_render_xy_plot(scripts, inputs, scale, work_dir):
+    """
+    Renders an XY plot of XY_PLOT_COUNTRIES countries per 1x of scale.
+    """
+    gdpinfo = gdpinfo_for(inputs)
+    names = gdp_country_names(inputs)[:XY_PLOT_COUNTRIES * scale]
+    plot_name = os.path.join(work_dir, 'xy_x{}.svg'.format(scale))
+    return lambda: scripts['xy'].render_xy_plot(gdpinfo, names, plot_name)
+
+
+def stage_render_world_map(scripts, inputs, scale, work_dir):
+    """
+    Renders the world map of one year to bytes.
+    """
+    script = scripts['world_code']
+    gdpinfo = gdpinfo_for(inputs)
+    codeinfo = codeinfo_for(inputs)
+    plot_countries = script.pygal_country_dict()
+    render_bytes = script.render_pool.RENDER_BYTES
+    return lambda: script.render_world_map(gdpinfo, codeinfo, plot_countries, GDP_YEAR, None,
+                                           mode=render_bytes)
+
+
+def stage_draw_cancer_risk_map(scripts, inputs, scale, work_dir):
+    """
+    Draws every county of the joined file to an in-memory PNG.
+    """
+    return lambda: scripts['risk_map'].draw_cancer_risk_map(inputs['joined'], inputs['map'],
+                                                            output_file=io.BytesIO(),
+                                                            image_format='png')
+
+
+STAGES = {
+    'get_county_attributes': stage_get_county_attributes,
+    'compute_county_centers': stage_compute_county_centers,
+    'merge_csv_files': stage_merge_csv_files,
+    'load_gdp_table': stage_load_gdp_table,
+    'build_plot_dict': stage_build_plot_dict,
+    'build_map_dict_by_code': stage_build_map_dict_by_code,
+    'render_xy_plot': stage_render_xy_plot,
+    'render_world_map': stage_render_world_map,
+    'draw_cancer_risk_map': stage_draw_cancer_risk_map,
+}
+
+
+def clear_caches():
+    """
+    Empties every parse cache, so the next run reads its files again.
+    """
+    for cache in PARSE_CACHES:
+        cache.clear()
+
+
+def time_runs(run, repeat, recorder=None, span_name='run'):
+    """
+    Inputs:
+      run       - function doing one run of a stage
+      repeat    - number of timed runs
+      recorder  - instrument.Recorder to record the timed runs in, or None
+      span_name - name of the span of each recorded run
+    Output:
+      Returns the list of perf_counter times of the runs, in seconds,
+      after one untimed warm-up run.
+    """
+    times = []
+    for count in range(repeat + 1):
+        clear_caches()
+        gc.collect()
+        recording = contextlib.nullcontext()
+        if recorder is not None and count > 0:
+            recording = instrument.recording(recorder)
+        with recording, instrument.span(span_name, 'stage'):
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+        if count > 0:
+            times.append(elapsed)
+    return times
+
+
+def summarize(times):
+    """
+    Input:
+      times - list of run times in seconds
+    Output:
+      Returns a dictionary of statistics of the times.
+    """
+    return {'runs': len(times),
+            'min': min(times),
+            'median': statistics.median(times),
+            'mean': statistics.mean(times),
+            'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+            'max': max(times)}
+
+
+def run_benchmarks(stage_names, scales, repeat, work_dir, seed=synthetic_data.DEFAULT_SEED,
+                   log=sys.stderr, recorder=None):
+    """
+    Inputs:
+      stage_names - list of names of the stages to run
+      scales      - list of input scales
+      repeat      - number of timed runs of each stage at each scale
+      work_dir    - directory for the scaled inputs and outputs
+      seed        - seed of the synthetic inputs
+      log         - file progress is written to, or None
+      recorder    - instrument.Recorder to record the timed runs in, or None
+    Output:
+      Returns a results dictionary; its "stages" entry maps each stage
+      name to a dictionary mapping each scale (as a string) to the
+      statistics of its run times.
+    """
+    scripts = load_scripts()
+    stages = {name: {} for name in stage_names}
+    for scale in scales:
+        inputs = make_inputs(scale, seed, work_dir)
+        for name in stage_names:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                run = STAGES[name](scripts, inputs, scale, work_dir)
+                times = time_runs(run, repeat, recorder, '{}@{}x'.format(name, scale))
+            stages[name][str(scale)] = summarize(times)
+            if log is not None:
+                print('{:>5}x {:<24} {:10.4f} s'.format(scale, name, stages[name][str(scale)]['median']),
+                      file=log)
+    return {'version': RESULTS_VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'seed': seed,
+            'stages': stages}
+
+
+def find_regressions(results, baseline, threshold):
+    """
+    Inputs:
+      results   - results dictionary of run_benchmarks
+      baseline  - results dictionary of an earlier run
+      threshold - largest accepted increase of a median, as a fraction
+    Output:
+      Returns a list of (stage name, scale, baseline median, median)
+      tuples, one per stage and scale slower than the baseline by more
+      than threshold.  Stages and scales not in the baseline are skipped.
+    """
+    regressions = []
+    for name, scales in results['stages'].items():
+        baseline_scales = baseline.get('stages', {}).get(name, {})
+        for scale, stats in scales.items():
+            if scale not in baseline_scales:
+                continue
+            baseline_median = baseline_scales[scale]['median']
+            if stats['median'] > baseline_median * (1 + threshold):
+                regressions.append((name, scale, baseline_median, stats['median']))
+    return regressions
+
+
+def format_report(results):
+    """
+    Returns a table of the median time of each stage at each scale, in
+    milliseconds, with its ratio to the time at the smallest scale.
+    """
+    scales = sorted({int(scale) for stats in results['stages'].values() for scale in stats})
+    lines = ['{:<24}'.format('stage') + ''.join('{:>20}'.format('{}x ms'.format(scale))
+                                                for scale in scales)]
+    for name, stats in results['stages'].items():
+        first = stats[str(scales[0])]['median'] if str(scales[0]) in stats else None
+        cells = []
+        for scale in scales:
+            if str(scale) not in stats:
+                cells.append('{:>20}'.format('-'))
+                continue
+            median = stats[str(scale)]['median']
+            cell = '{:.1f}'.format(median * 1000)
+            if first and scale != scales[0]:
+                cell += ' (x{:.1f})'.format(median / first)
+            cells.append('{:>20}'.format(cell))
+        lines.append('{:<24}'.format(name) + ''.join(cells))
+    return '\n'.join(lines)
+
+
+def read_results(file_name):
+    """
+    Returns the results saved in file_name, or None if it does not exist.
+    """
+    try:
+        with open(file_name) as results_file:
+            results = json.load(results_file)
+    except FileNotFoundError:
+        return None
+    if results.get('version') != RESULTS_VERSION:
+        raise ValueError('{} holds results of another version'.format(file_name))
+    return results
+
+
+def write_results(results, file_name):
+    """
+    Writes results to file_name as JSON, replacing it atomically.
+    """
+    with atomic_file.atomic_write(file_name) as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+        results_file.write('\n')
+
+
+def main(argv=None):
+    """
+    Runs the benchmarks as the command line argv asks and returns the
+    exit status: 1 if a stage regressed against the baseline, else 0.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the stages of the course pipelines.')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES),
+                        help='multiples of the bundled input sizes (default: 1 10 100)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='timed runs per stage and scale (default: %(default)s)')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help='stages to run (default: all)')
+    parser.add_argument('--seed', type=int, default=synthetic_data.DEFAULT_SEED,
+                        help='seed of the synthetic inputs (default: %(default)s)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='baseline results file (default: %(default)s)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='largest accepted slowdown of a median, as a fraction '
+                             '(default: %(default)s)')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='save the results as the new baseline')
+    parser.add_argument('--work-dir',
+                        help='directory to keep the scaled inputs in (default: a temporary one)')
+    parser.add_argument('--output', help='file to save the results to')
+    parser.add_argument('--trace',
+                        help='file to save the spans and counters of the timed runs to, '
+                             'as JSON lines if it ends in .jsonl, else as a Chrome trace')
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir
+    if work_dir is None:
+        work_dir = tempfile.mkdtemp(prefix='benchmark_')
+    else:
+        os.makedirs(work_dir, exist_ok=True)
+    recorder = instrument.Recorder() if args.trace else None
+    try:
+        results = run_benchmarks(args.stages, args.scales, args.repeat, work_dir, args.seed,
+                                 recorder=recorder)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(format_report(results))
+    if recorder is not None:
+        instrument.write_recording(recorder, args.trace)
+        print(instrument.format_summaries(recorder))
+    if args.output:
+        write_results(results, args.output)
+
+    baseline = read_results(args.baseline)
+    if baseline is None or args.update_baseline:
+        write_results(results, args.baseline)
+        if baseline is None:
+            print('No baseline at {}: saved these results as the new baseline, '
+                  'nothing was compared'.format(args.baseline))
+        else:
+            print('Saved these results as the new baseline at {}, '
+                  'nothing was compared'.format(args.baseline))
+        return 0
+
+    regressions = find_regressions(results, baseline, args.threshold)
+    for name, scale, baseline_median, median in regressions:
+        print('Regression: {} at {}x took {:.1f} ms, baseline {:.1f} ms (+{:.0%})'.format(
+            name, scale, median * 1000, baseline_median * 1000, median / baseline_median - 1))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Bulk writing of CSV files.
+
+Rows are handed to csv.writer.writerows in large batches through a big
+output buffer, rather than one writerow call and one small write per
+row.  Tables can be given as rows or as columns (lists or NumPy
+arrays).  Options:
+
+  float_precision - write floats with a fixed number of decimals
+                    instead of repr precision
+  buffer_size     - size in bytes of the output buffer
+  compress        - gzip the output (the default for names ending .gz)
+  atomic          - write to a temporary file and rename it over the
+                    target when done, so a killed job never leaves a
+                    partly written file behind
+
+With the default options the output is byte-for-byte what writing each
+row with csv.writer.writerow produces.
+"""
+
+import contextlib
+import csv
+import gzip
+import io
+import itertools
+import os
+
+import numpy as np
+
+import atomic_file
+
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+# Rows handed to writerows at a time
+BATCH_ROWS = 4096
+
+
+class BulkWriter:
+    """
+    Writes rows to a CSV file in batches.  Made by open_csv.
+
+    Attributes:
+      rows_written - number of rows written so far
+    """
+
+    def __init__(self, text_file, float_precision=None, delimiter=','):
+        self._writer = csv.writer(text_file, delimiter=delimiter, quoting=csv.QUOTE_MINIMAL)
+        self.float_format = None
+        if float_precision is not None:
+            self.float_format = '.{}f'.format(float_precision)
+        self.rows_written = 0
+
+    def format_row(self, row):
+        """
+        Returns row with its floats formatted to the fixed precision.
+        """
+        float_format = self.float_format
+        return [format(field, float_format) if isinstance(field, float) else field
+                for field in row]
+
+    def format_column(self, column):
+        """
+        Input:
+          column - list or NumPy array of the fields of one column
+        Output:
+          Returns the column as a list of fields ready for csv.writer.
+        """
+        if isinstance(column, np.ndarray):
+            if self.float_format is not None and column.dtype.kind == 'f':
+                return np.char.mod('%' + self.float_format, column).tolist()
+            return column.tolist()
+        if self.float_format is not None:
+            return self.format_row(column)
+        return column
+
+    def writerow(self, row):
+        """
+        Writes a single row.
+        """
+        if self.float_format is not None:
+            row = self.format_row(row)
+        self._writer.writerow(row)
+        self.rows_written += 1
+
+    def writerows(self, rows):
+        """
+        Input:
+          rows - iterable of rows, each a sequence of fields
+        Action:
+          Writes the rows in batches of BATCH_ROWS.
+        """
+        if self.float_format is not None:
+            rows = map(self.format_row, rows)
+        self._write_batches(rows)
+
+    def write_columns(self, columns):
+        """
+        Input:
+          columns - list of columns of equal length, each a list or
+                    NumPy array
+        Action:
+          Writes one row per position in the columns.
+        """
+        self._write_batches(zip(*[self.format_column(column) for column in columns]))
+
+    def _write_batches(self, rows):
+        """
+        Writes already formatted rows in batches of BATCH_ROWS.
+        """
+        rows = iter(rows)
+        batch = list(itertools.islice(rows, BATCH_ROWS))
+        while batch:
+            self._writer.writerows(batch)
+            self.rows_written += len(batch)
+            batch = list(itertools.islice(rows, BATCH_ROWS))
+
+
+@contextlib.contextmanager
+def open_csv(file_name, float_precision=None, buffer_size=DEFAULT_BUFFER_SIZE,
+             compress=None, atomic=True, delimiter=','):
+    """
+    Inputs:
+      file_name       - name of the CSV file to write
+      float_precision - number of decimals of floats, or None for repr precision
+      buffer_size     - size in bytes of the output buffer
+      compress        - True to gzip the file, None to gzip names ending .gz
+      atomic          - True to only replace file_name once writing is done
+      delimiter       - field separator
+    Output:
+      Context manager giving a BulkWriter for the file.  If the block
+      raises, the temporary file is removed and file_name is untouched.
+    """
+    if compress is None:
+        compress = file_name.endswith('.gz')
+    opener = atomic_file.atomic_write if atomic else open
+    with opener(file_name, 'wb', buffering=buffer_size) as binary_file:
+        if compress:
+            # Name the uncompressed file after the target rather than the temporary
+            # file, and leave out the timestamp, so equal tables give equal files
+            inner_name = os.path.basename(file_name)
+            if inner_name.endswith('.gz'):
+                inner_name = inner_name[:-len('.gz')]
+            gzip_file = gzip.GzipFile(filename=inner_name, mode='wb', fileobj=binary_file, mtime=0)
+            text_file = io.TextIOWrapper(io.BufferedWriter(gzip_file, buffer_size), newline='')
+        else:
+            text_file = io.TextIOWrapper(binary_file, newline='')
+        with text_file:
+            yield BulkWriter(text_file, float_precision, delimiter)
+
+
+def write_rows(rows, file_name, **options):
+    """
+    Inputs:
+      rows      - iterable of rows, each a sequence of fields
+      file_name - name of the CSV file to write
+      options   - keyword options of open_csv
+    Output:
+      Returns the number of rows written.
+    """
+    with open_csv(file_name, **options) as csv_writer:
+        csv_writer.writerows(rows)
+    return csv_writer.rows_written
+
+
+def write_columns(columns, file_name, **options):
+    """
+    Inputs:
+      columns   - list of columns of equal length, each a list or NumPy array
+      file_name - name of the CSV file to write
+      options   - keyword options of open_csv
+    Output:
+      Returns the number of rows written.
+    """
+    with open_csv(file_name, **options) as csv_writer:
+        csv_writer.write_columns(columns)
+    return csv_writer.rows_written
@@ -0,0 +1,227 @@
+"""
+Choropleth maps: SVG maps such as USA_Counties_2014.svg with each path
+filled by the color of a value, e.g. the cancer risk of each county
+keyed by FIPS code.
+
+An SVG map is compiled once into a ChoroplethTemplate: the text of the
+file split around the fill color of every <path> element that has an
+id.  Rendering a map only joins those pieces with the new fill colors,
+without parsing any XML, so one template can produce many maps quickly
+and the output stays exact at any zoom.
+
+Raster images are drawn with matplotlib from a polygon_store.PolygonStore
+of the same map.
+"""
+
+import math
+import re
+
+import numpy as np
+import matplotlib as mpl
+from matplotlib.collections import PolyCollection
+
+import atomic_file
+import figure_export
+import parse_cache
+
+
+# Size of SVG image of USA
+USA_SVG_SIZE = (555, 352)
+
+# Resolution of raster figures; scale sets their size in pixels
+RASTER_DPI = 100.0
+
+# Templates compiled by load_template, shared by every caller in the process
+TEMPLATE_CACHE = parse_cache.ParseCache(maxsize=4)
+
+_PATH_TAG = re.compile(r'<path\b[^>]*>')
+_ATTRIBUTE = re.compile(r'''\s(id|style|fill)\s*=\s*(["'])(.*?)\2''', re.DOTALL)
+_STYLE_FILL = re.compile(r'(?<![-\w])fill\s*:\s*([^;]*?)\s*(?:;|$)')
+
+
+class ChoroplethTemplate:
+    """
+    An SVG map split around the fill colors of its paths.
+
+    Attributes:
+      literals - the text of the map between fill colors, one more than slot_ids
+      slot_ids - the id of the path owning each fill color, in document order
+      defaults - the original fill color of each path
+
+    Use compile_template to make a ChoroplethTemplate.
+    """
+
+    def __init__(self, literals, slot_ids, defaults):
+        self.literals = literals
+        self.slot_ids = slot_ids
+        self.defaults = defaults
+
+    def render(self, fills):
+        """
+        Input:
+          fills - dictionary mapping path ids to SVG colors
+        Output:
+          Returns the text of the map with each path in fills given its
+          fill color; other paths keep their original fill.
+        """
+        pieces = [self.literals[0]]
+        for slot_id, default, literal in zip(self.slot_ids, self.defaults, self.literals[1:]):
+            pieces.append(fills.get(slot_id, default))
+            pieces.append(literal)
+        return ''.join(pieces)
+
+    def render_values(self, values, colors, missing=None):
+        """
+        Inputs:
+          values  - dictionary mapping path ids (e.g. FIPS codes) to values
+          colors  - color_lut.ColorLUT giving the color of each value
+          missing - fill color of paths with no value, or None to keep
+                    their original fill
+        Output:
+          Returns the text of the map with each path filled by the color
+          of its value.
+        """
+        fills = {}
+        if missing is not None:
+            fills = dict.fromkeys(self.slot_ids, missing)
+        slot_ids = [slot_id for slot_id in self.slot_ids if slot_id in values]
+        fills.update(zip(slot_ids, colors.to_hex(values[slot_id] for slot_id in slot_ids)))
+        return self.render(fills)
+
+    def default_fills(self):
+        """
+        Returns a dictionary mapping each path id to its original fill color.
+        """
+        return dict(zip(self.slot_ids, self.defaults))
+
+
+def compile_template(svg_file_name):
+    """
+    Input:
+      svg_file_name - name of an SVG file
+    Output:
+      Returns a new ChoroplethTemplate for the SVG file.  The fill of a
+      path is taken from the fill property in its style attribute, else
+      from its fill attribute; paths with neither get a fill attribute.
+    """
+    with open(svg_file_name, encoding='utf-8') as svg_file:
+        text = svg_file.read()
+
+    literals = []
+    slot_ids = []
+    defaults = []
+    last = 0
+    closing = ''            # closes a fill attribute added in the previous slot
+    for tag in _PATH_TAG.finditer(text):
+        attributes = {}
+        for attribute in _ATTRIBUTE.finditer(tag.group()):
+            attributes[attribute.group(1)] = (tag.start() + attribute.start(3), attribute.group(3))
+        if 'id' not in attributes:
+            continue
+
+        style_fill = None
+        if 'style' in attributes:
+            style_start, style = attributes['style']
+            style_fill = _STYLE_FILL.search(style)
+        if style_fill is not None:
+            start = style_start + style_fill.start(1)
+            end = style_start + style_fill.end(1)
+            literals.append(closing + text[last:start])
+            defaults.append(style_fill.group(1))
+            closing = ''
+        elif 'fill' in attributes:
+            start, fill = attributes['fill']
+            end = start + len(fill)
+            literals.append(closing + text[last:start])
+            defaults.append(fill)
+            closing = ''
+        else:
+            start = end = tag.start() + len('<path')
+            literals.append(closing + text[last:start] + ' fill="')
+            defaults.append('black')            # the SVG default fill
+            closing = '"'
+        slot_ids.append(attributes['id'][1])
+        last = end
+    literals.append(closing + text[last:])
+    return ChoroplethTemplate(literals, slot_ids, defaults)
+
+
+def load_template(svg_file_name, cache=TEMPLATE_CACHE):
+    """
+    Inputs:
+      svg_file_name - name of an SVG file
+      cache         - ParseCache to read the template through, or None
+    Output:
+      Returns the ChoroplethTemplate for the SVG file, compiling it only
+      if it is not already cached.
+    """
+    if cache is None:
+        return compile_template(svg_file_name)
+    return cache.get(svg_file_name, compile_template)
+
+
+def render_svg_maps(svg_file_name, value_maps, colors, output_files, missing=None):
+    """
+    Inputs:
+      svg_file_name - name of an SVG map
+      value_maps    - list of dictionaries mapping path ids to values
+      colors        - color_lut.ColorLUT giving the color of each value
+      output_files  - list of names of the SVG files to write, one per value map
+      missing       - fill color of paths with no value, or None to keep
+                      their original fill
+    Action:
+      Writes one choropleth map per value map, compiling the template once.
+    """
+    template = load_template(svg_file_name)
+    for values, output_file in zip(value_maps, output_files):
+        with atomic_file.atomic_write(output_file, encoding='utf-8') as svg_file:
+            svg_file.write(template.render_values(values, colors, missing))
+
+
+def render_raster(values, store, colors, output_file, image_format=None, missing=None,
+                  defaults=None, svg_size=USA_SVG_SIZE, scale=1.0):
+    """
+    Inputs:
+      values       - dictionary mapping path ids (e.g. FIPS codes) to values
+      store        - polygon_store.PolygonStore of the map
+      colors       - color_lut.ColorLUT giving the color of each value
+      output_file  - file name, or binary file object
+      image_format - 'png', ... or None to use the file name's extension
+      missing      - fill color of paths with no value, or None to use
+                     their color in defaults
+      defaults     - dictionary mapping path ids to their original fill
+                     colors, as returned by ChoroplethTemplate.default_fills;
+                     paths in neither values nor defaults are only outlined
+      svg_size     - (width, height) of the SVG the store was built from
+      scale        - pixels per SVG unit of raster output
+    Action:
+      Draws every path of the store filled by the color of its value and
+      writes the image to output_file.
+    """
+    polygons = []
+    path_of_polygon = []
+    for idx in range(len(store)):
+        rings = store.rings(idx)
+        polygons.extend(rings)
+        path_of_polygon.extend([idx] * len(rings))
+
+    path_ids = store.ids.tolist()
+    path_values = np.array([values.get(path_id, math.nan) for path_id in path_ids])
+    path_colors = colors(path_values)
+    if defaults is None:
+        defaults = {}
+    for idx in np.flatnonzero(np.isnan(path_values)):
+        fill = missing if missing is not None else defaults.get(path_ids[idx], 'none')
+        path_colors[idx] = mpl.colors.to_rgba(fill)
+
+    fig = figure_export.new_figure(figsize=(svg_size[0] * scale / RASTER_DPI,
+                                            svg_size[1] * scale / RASTER_DPI), dpi=RASTER_DPI)
+    axes = fig.add_axes((0, 0, 1, 1))
+    # County outlines are 0.1 SVG units wide, as in USA_Counties_2014.svg
+    axes.add_collection(PolyCollection(polygons, facecolors=path_colors[path_of_polygon],
+                                       edgecolors='black',
+                                       linewidths=0.1 * scale * 72 / RASTER_DPI))
+    axes.set_xlim(0, svg_size[0])
+    axes.set_ylim(svg_size[1], 0)           # SVG y coordinates run downwards
+    axes.set_axis_off()
+    figure_export.save_figure(fig, output_file, image_format)
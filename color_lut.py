@@ -0,0 +1,124 @@
+"""
+Colormap lookup tables for coloring many values at once.
+
+A ColorLUT samples a matplotlib colormap once into a table of RGBA
+colors over a fixed range of values.  Coloring an array of values is
+then a single vectorized index computation and table lookup, instead of
+a call to ScalarMappable.to_rgba per value.  The same table can produce
+hex colors for pygal, so the county maps drawn with matplotlib and the
+world maps drawn with pygal color their data the same way.
+"""
+
+import numpy as np
+import matplotlib as mpl
+
+
+class ColorLUT:
+    """
+    Maps values in [vmin, vmax] to the colors of a colormap through a
+    table of bins colors.
+
+    Attributes:
+      table     - (bins, 4) float array of RGBA colors, one per bin
+      hex_table - list of the same colors as '#rrggbb' strings
+      vmin      - value mapped to the first bin
+      vmax      - value mapped to the last bin
+      transform - function applied to values before binning, or None
+      clamp     - whether values outside [vmin, vmax] get the end colors
+      bad       - RGBA color of NaN values (and of values out of range
+                  when clamp is False)
+    """
+
+    def __init__(self, colormap, vmin, vmax, bins=256, transform=None, clamp=True):
+        """
+        Inputs:
+          colormap  - matplotlib Colormap, or the name of one
+          vmin      - value given the first color of the colormap
+          vmax      - value given the last color of the colormap
+          bins      - number of colors sampled from the colormap
+          transform - function applied to values before they are
+                      compared to vmin and vmax (e.g. np.log10), or None
+          clamp     - True to give values outside [vmin, vmax] the end
+                      colors, False to give them the colormap's bad color
+        """
+        if isinstance(colormap, str):
+            colormap = mpl.colormaps[colormap]
+        if bins < 1:
+            raise ValueError('bins must be positive')
+        if not vmax > vmin:
+            raise ValueError('vmax must be greater than vmin')
+        # Sample the middle of each bin - with bins == colormap.N this is
+        # exactly the colormap's own table, so colors match to_rgba
+        self.table = colormap((np.arange(bins) + 0.5) / bins)
+        self.vmin = vmin
+        self.vmax = vmax
+        self.transform = transform
+        self.clamp = clamp
+        self.bad = colormap.get_bad()
+        self.hex_table = [mpl.colors.to_hex(color) for color in self.table]
+
+    def bin_indices(self, values):
+        """
+        Input:
+          values - number or array of values
+        Output:
+          Returns a tuple (indices, valid) of arrays the shape of values:
+          the index into table of each value, and whether it is colored
+          from the table at all (False for NaN, and for values out of
+          range when clamp is False).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if self.transform is not None:
+            values = self.transform(values)
+        bins = len(self.table)
+        with np.errstate(invalid='ignore'):
+            scaled = (values - self.vmin) * (bins / (self.vmax - self.vmin))
+            valid = ~np.isnan(scaled)
+            if not self.clamp:
+                valid &= (scaled >= 0) & (scaled <= bins)
+        indices = np.clip(np.floor(np.where(valid, scaled, 0)), 0, bins - 1).astype(np.intp)
+        return indices, valid
+
+    def __call__(self, values):
+        """
+        Input:
+          values - number or array of values
+        Output:
+          Returns the RGBA color of a single value as a tuple of four
+          floats, or for an array of n values an (n, 4) float array.
+        """
+        indices, valid = self.bin_indices(values)
+        # A scalar index would make a view of the table, not a copy
+        colors = np.where(valid[..., np.newaxis], self.table[indices], self.bad)
+        if colors.ndim == 1:
+            return tuple(float(channel) for channel in colors)
+        return colors
+
+    def to_hex(self, values):
+        """
+        Input:
+          values - iterable of values
+        Output:
+          Returns a list of '#rrggbb' color strings, one per value, for
+          use in SVG styles (e.g. with pygal).
+        """
+        indices, valid = self.bin_indices(np.fromiter(values, dtype=np.float64))
+        hex_table = self.hex_table
+        bad = mpl.colors.to_hex(self.bad)
+        return [hex_table[index] if is_valid else bad
+                for index, is_valid in zip(indices.tolist(), valid.tolist())]
+
+    def pygal_values(self, value_dict):
+        """
+        Input:
+          value_dict - dictionary mapping pygal area codes to values
+        Output:
+          Returns a list of pygal value dictionaries, one per area, that
+          fill each area with the color of its value instead of pygal's
+          default shading of the series color.
+        """
+        codes = list(value_dict)
+        fills = self.to_hex(value_dict[code] for code in codes)
+        return [{'value': (code, value_dict[code]),
+                 'node': {'style': 'fill: {}; fill-opacity: 1'.format(fill)}}
+                for code, fill in zip(codes, fills)]
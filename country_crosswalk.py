@@ -0,0 +1,268 @@
+"""
+Crosswalk between the country code systems of a code table such as
+isp_country_codes.csv.
+
+The code table has one row per country and one column per code system
+(ISO 3166-1 alpha-2, alpha-3 and numeric, ITU, FIPS, IOC, FIFA, ...).
+read_crosswalk reads it once into a Crosswalk holding, for every code
+column, the codes of each country as written in the file and a
+dictionary from each casefolded code to its country's row.  Converting
+a code from one system to another is then two dictionary lookups,
+whatever the pair of systems, and the code comes back in the casing of
+the file.
+
+A Crosswalk can be saved as JSON with the size and modification time of
+the code table it was read from; load_crosswalk reuses a saved index
+while the code table is unchanged, so later processes skip reading it.
+
+Some systems give one code to more than one country (or none to some
+countries).  Blank codes are not indexed, and a code shared by several
+countries converts as the code of the last of them in the file, as a
+dictionary built from the rows in order would have it.
+"""
+
+import csv
+import json
+import os
+
+import atomic_file
+import parse_cache
+
+
+INDEX_VERSION = 2
+
+# Crosswalks read by load_crosswalk, shared by every caller in the process
+CROSSWALK_CACHE = parse_cache.ParseCache(maxsize=4)
+
+
+class Crosswalk:
+    """
+    Country codes of several code systems, indexed for conversion.
+
+    Attributes:
+      codes - dictionary mapping each code column to the list of the
+              codes of every country, in file order, as written
+      index - dictionary mapping each code column to a dictionary from
+              casefolded code to the position of its country in codes
+    """
+
+    def __init__(self, codes, index):
+        self.codes = codes
+        self.index = index
+        self._converters = {}
+
+    def __len__(self):
+        for column_codes in self.codes.values():
+            return len(column_codes)
+        return 0
+
+    @property
+    def columns(self):
+        """
+        Returns the list of indexed code columns.
+        """
+        return list(self.codes)
+
+    def converter(self, from_column, to_column):
+        """
+        Inputs:
+          from_column - code column to convert from
+          to_column   - code column to convert to
+        Output:
+          Returns a dictionary mapping each casefolded code of from_column
+          to the code of the same country in to_column, as written.
+          Countries with no code in to_column are left out.  The
+          dictionary is built on first use and shared, so it must not be
+          modified.
+        """
+        key = (from_column, to_column)
+        if key not in self._converters:
+            from_index = self._column_index(from_column)
+            to_codes = self.codes[self._check_column(to_column)]
+            self._converters[key] = {code: to_codes[row] for code, row in from_index.items()
+                                     if to_codes[row]}
+        return self._converters[key]
+
+    def convert(self, code, from_column, to_column):
+        """
+        Inputs:
+          code        - a code of from_column, in any case
+          from_column - code column of code
+          to_column   - code column to convert to
+        Output:
+          Returns the code in to_column of the country with that code,
+          or None if there is no such country or it has no code in
+          to_column.
+        """
+        return self.converter(from_column, to_column).get(code.casefold())
+
+    def mapping(self, from_column, to_column):
+        """
+        Returns a dictionary mapping every code of from_column, as written,
+        to the code of the same country in to_column, as written.  Where
+        a code appears more than once the last country is kept.
+        """
+        return dict(zip(self.codes[self._check_column(from_column)],
+                        self.codes[self._check_column(to_column)]))
+
+    def _check_column(self, column):
+        """
+        Returns column, or raises ValueError if it is not indexed.
+        """
+        if column not in self.codes:
+            raise ValueError('code column not indexed: {!r}'.format(column))
+        return column
+
+    def _column_index(self, column):
+        """
+        Returns the casefolded code index of column.
+        """
+        return self.index[self._check_column(column)]
+
+
+def casefold_keys(codes):
+    """
+    Input:
+      codes - iterable of codes (e.g. the keys of a dictionary)
+    Output:
+      Returns a dictionary mapping each casefolded code to the code as given.
+    """
+    return {code.casefold(): code for code in codes}
+
+
+def index_codes(column_codes):
+    """
+    Input:
+      column_codes - list of the codes of one column, in file order
+    Output:
+      Returns a dictionary mapping each casefolded code to the position
+      of its last country, as mapping keeps it.  Blank codes are left out.
+    """
+    index = {}
+    for row, code in enumerate(column_codes):
+        if code:
+            index[code.casefold()] = row
+    return index
+
+
+def read_crosswalk(code_file_name, separator=',', quote='"', columns=None):
+    """
+    Inputs:
+      code_file_name - name of a CSV file with a header, one row per country
+      separator      - character that separates fields
+      quote          - character used to optionally quote fields
+      columns        - sequence of the code columns to index, or None for
+                       every column of the file
+    Output:
+      Returns a new Crosswalk of the given columns of the file.
+    """
+    with open(code_file_name, newline='') as csv_file:
+        csv_reader = csv.reader(csv_file, delimiter=separator, quotechar=quote)
+        header = next(csv_reader)
+        if columns is None:
+            columns = header
+        missing = [column for column in columns if column not in header]
+        if missing:
+            raise ValueError('{} has no column {}'.format(code_file_name,
+                                                          ', '.join(map(repr, missing))))
+        positions = [header.index(column) for column in columns]
+        codes = {column: [] for column in columns}
+        for row in csv_reader:
+            for column, position in zip(columns, positions):
+                codes[column].append(row[position] if position < len(row) else '')
+    return Crosswalk(codes, {column: index_codes(codes[column]) for column in columns})
+
+
+def save_crosswalk(crosswalk, index_file_name, code_file_name=None, options=()):
+    """
+    Inputs:
+      crosswalk       - a Crosswalk
+      index_file_name - name of the JSON file to write
+      code_file_name  - name of the code table it was read from, or None
+      options         - the separator, quote and columns it was read with
+    Action:
+      Writes the crosswalk to index_file_name, replacing it atomically.
+      When code_file_name is given, the size and modification time of
+      the code table are saved with it for load_crosswalk to check.
+    """
+    source = None
+    if code_file_name is not None:
+        source = _source_stamp(code_file_name)
+    text = json.dumps({'version': INDEX_VERSION,
+                       'source': source,
+                       'options': list(options),
+                       'codes': crosswalk.codes,
+                       'index': crosswalk.index}, separators=(',', ':'))
+    with atomic_file.atomic_write(index_file_name, encoding='utf-8') as index_file:
+        index_file.write(text)
+
+
+def open_crosswalk(index_file_name, code_file_name=None, options=()):
+    """
+    Inputs:
+      index_file_name - name of a JSON file written by save_crosswalk
+      code_file_name  - name of the code table it must have been read
+                        from, or None to skip the check
+      options         - the separator, quote and columns it must have
+                        been read with
+    Output:
+      Returns the saved Crosswalk, or None if the file is missing,
+      unreadable, or was saved from another version of the code table
+      or with other options.
+    """
+    try:
+        with open(index_file_name, encoding='utf-8') as index_file:
+            saved = json.load(index_file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(saved, dict) or saved.get('version') != INDEX_VERSION:
+        return None
+    if code_file_name is not None:
+        if saved['source'] != _source_stamp(code_file_name) or saved['options'] != list(options):
+            return None
+    return Crosswalk(saved['codes'], saved['index'])
+
+
+def load_crosswalk(code_file_name, separator=',', quote='"', columns=None,
+                   index_file_name=None, cache=CROSSWALK_CACHE):
+    """
+    Inputs:
+      as read_crosswalk, plus
+      index_file_name - name of a JSON file to keep the crosswalk in, or None
+      cache           - ParseCache to read the crosswalk through, or None
+    Output:
+      Returns the Crosswalk of the code table.  It is taken from the
+      cache, else from index_file_name if that was saved from the
+      current code table, else read from the code table (and then saved
+      to index_file_name).  The crosswalk is shared between callers and
+      must not be modified.
+    """
+    if columns is not None:
+        columns = tuple(columns)
+    if cache is None:
+        return _load_crosswalk(code_file_name, separator, quote, columns, index_file_name)
+    return cache.get(code_file_name, _load_crosswalk, separator, quote, columns, index_file_name)
+
+
+def _load_crosswalk(code_file_name, separator, quote, columns, index_file_name):
+    """
+    Returns the crosswalk saved in index_file_name if it is current, else
+    reads it from the code table and saves it.
+    """
+    options = [separator, quote, columns if columns is None else list(columns)]
+    if index_file_name is not None:
+        crosswalk = open_crosswalk(index_file_name, code_file_name, options)
+        if crosswalk is not None:
+            return crosswalk
+    crosswalk = read_crosswalk(code_file_name, separator, quote, columns)
+    if index_file_name is not None:
+        save_crosswalk(crosswalk, index_file_name, code_file_name, options)
+    return crosswalk
+
+
+def _source_stamp(file_name):
+    """
+    Returns a dictionary identifying the current version of a file.
+    """
+    stat = os.stat(file_name)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
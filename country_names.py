@@ -0,0 +1,285 @@
+"""
+Fuzzy matching of country names spelled differently by different data
+sources, e.g. "Korea, Republic of" (pygal) and "Korea, Rep." (World Bank).
+
+Names are first normalized: accents are dropped, case is folded,
+punctuation is removed, common abbreviations ("Rep.", "Dem.", "St.",
+"PDR", ...) are spelled out and "the", "of" and "and" are dropped.
+
+A NameIndex keeps an inverted index from each character trigram of the
+normalized names to the names containing it, so a query only scores the
+names sharing a trigram with it instead of every name.  The score of two
+names, from 0 to 1, is the mean of the Dice coefficients of the trigrams
+of their normalized names and of their normalized names without generic
+words such as "Republic" or "State"; so "Moldova, Republic of" is closer
+to "Moldova" than to "Korea, Rep.".
+
+match_names pairs names with the names of an index one to one: first
+by override, then by equal name, then by equal normalized name, and
+then the remaining pairs in order of score, down to a threshold.  The
+override table is a JSON object mapping names to the name they must
+match, or to null for names that must not match at all.
+"""
+
+import itertools
+import json
+import re
+import unicodedata
+from collections import Counter
+
+import atomic_file
+
+
+# Lowest score accepted as a match by default
+DEFAULT_THRESHOLD = 0.5
+
+# Candidates considered per name when matching
+DEFAULT_LIMIT = 5
+
+ABBREVIATIONS = {
+    'dem': 'democratic',
+    'fed': 'federated',
+    'fyr': 'former yugoslav republic',
+    'is': 'islands',
+    'pdr': 'peoples democratic republic',
+    'rb': 'bolivarian republic',
+    'rep': 'republic',
+    'st': 'saint',
+    'sts': 'states',
+}
+
+STOP_WORDS = frozenset(['the', 'of', 'and'])
+
+# Words describing a country's government or status rather than naming it
+GENERIC_WORDS = frozenset([
+    'arab', 'bolivarian', 'democratic', 'federated', 'federation', 'former',
+    'islamic', 'kingdom', 'peoples', 'plurinational', 'province', 'republic',
+    'sar', 'state', 'states', 'united', 'yugoslav',
+])
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def normalize_name(name):
+    """
+    Input:
+      name - a country name
+    Output:
+      Returns the normalized name: lower case words without accents or
+      punctuation, abbreviations spelled out and stop words dropped.
+    """
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(char for char in name if not unicodedata.combining(char)).casefold()
+    name = name.replace("'", '').replace('\u2019', '').replace('&', ' and ')
+    words = [ABBREVIATIONS.get(word, word) for word in _WORD.findall(name)]
+    return ' '.join(word for word in ' '.join(words).split() if word not in STOP_WORDS)
+
+
+def core_name(key):
+    """
+    Input:
+      key - a normalized name
+    Output:
+      Returns key without its generic words, or key itself if it has
+      nothing else.
+    """
+    words = [word for word in key.split() if word not in GENERIC_WORDS]
+    return ' '.join(words) if words else key
+
+
+def name_trigrams(key):
+    """
+    Input:
+      key - a normalized name
+    Output:
+      Returns the set of character trigrams of key, padded by a space
+      at either end.
+    """
+    padded = ' ' + key + ' '
+    return {padded[idx:idx + 3] for idx in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Trigram index of a list of names.
+
+    Attributes:
+      names         - list of the indexed names
+      keys          - normalized name of each name
+      postings      - dictionary mapping each trigram to the list of
+                      positions of the names whose key contains it
+      core_postings - as postings, for the keys without generic words
+      sizes         - number of trigrams of each key
+      core_sizes    - number of trigrams of each key without generic words
+      positions     - dictionary mapping each name to its first position
+      key_positions - dictionary mapping each key to the list of its positions
+
+    Use build_name_index to make a NameIndex.
+    """
+
+    def __init__(self, names, keys, postings, core_postings, sizes, core_sizes):
+        self.names = names
+        self.keys = keys
+        self.postings = postings
+        self.core_postings = core_postings
+        self.sizes = sizes
+        self.core_sizes = core_sizes
+        self.positions = {}
+        self.key_positions = {}
+        for position, (name, key) in enumerate(zip(names, keys)):
+            self.positions.setdefault(name, position)
+            self.key_positions.setdefault(key, []).append(position)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.positions
+
+    def scores(self, name):
+        """
+        Input:
+          name - a country name
+        Output:
+          Returns a dictionary mapping the position of every indexed name
+          sharing a trigram with name to its score.
+        """
+        key = normalize_name(name)
+        grams = name_trigrams(key)
+        core_grams = name_trigrams(core_name(key))
+        shared = Counter(itertools.chain.from_iterable(
+            self.postings[gram] for gram in grams if gram in self.postings))
+        core_shared = Counter(itertools.chain.from_iterable(
+            self.core_postings[gram] for gram in core_grams if gram in self.core_postings))
+
+        sizes = self.sizes
+        core_sizes = self.core_sizes
+        return {position: (shared[position] / (len(grams) + sizes[position]) +
+                           core_shared[position] / (len(core_grams) + core_sizes[position]))
+                for position in shared.keys() | core_shared.keys()}
+
+    def candidates(self, name, limit=DEFAULT_LIMIT, threshold=0.0):
+        """
+        Inputs:
+          name      - a country name
+          limit     - largest number of candidates to return, or None for all
+          threshold - lowest score of a candidate
+        Output:
+          Returns a list of (indexed name, score) pairs, best first.
+          Equal scores are in index order.
+        """
+        ranked = sorted((-score, position) for position, score in self.scores(name).items()
+                        if score >= threshold)
+        return [(self.names[position], -score) for score, position in ranked[:limit]]
+
+
+def build_name_index(names):
+    """
+    Input:
+      names - iterable of country names
+    Output:
+      Returns a new NameIndex of the names.
+    """
+    names = list(names)
+    keys = [normalize_name(name) for name in names]
+    postings = {}
+    core_postings = {}
+    sizes = []
+    core_sizes = []
+    for position, key in enumerate(keys):
+        grams = name_trigrams(key)
+        core_grams = name_trigrams(core_name(key))
+        for gram in grams:
+            postings.setdefault(gram, []).append(position)
+        for gram in core_grams:
+            core_postings.setdefault(gram, []).append(position)
+        sizes.append(len(grams))
+        core_sizes.append(len(core_grams))
+    return NameIndex(names, keys, postings, core_postings, sizes, core_sizes)
+
+
+def match_names(names, index, threshold=DEFAULT_THRESHOLD, overrides=None,
+                limit=DEFAULT_LIMIT):
+    """
+    Inputs:
+      names     - iterable of country names to match
+      index     - NameIndex of the names to match them with
+      threshold - lowest score accepted as a match
+      overrides - dictionary mapping names to the indexed name they must
+                  match, or to None if they must not match; overrides
+                  naming a name that is not in the index are ignored
+      limit     - number of candidates considered per name
+    Output:
+      Returns a dictionary mapping each matched name to its indexed
+      name.  No two names are matched with the same indexed name.
+    """
+    if overrides is None:
+        overrides = {}
+    matches = {}
+    used = set()
+
+    def match(name, position):
+        matches[name] = index.names[position]
+        used.add(position)
+
+    names = list(dict.fromkeys(names))
+    for name in names:
+        position = index.positions.get(overrides.get(name))
+        if position is not None and position not in used:
+            match(name, position)
+    # Names overridden to None are never matched
+    unmatched = [name for name in names
+                 if name not in matches and not (name in overrides and overrides[name] is None)]
+    for name in unmatched:
+        position = index.positions.get(name)
+        if position is not None and position not in used:
+            match(name, position)
+    unmatched = [name for name in unmatched if name not in matches]
+
+    fuzzy = []
+    for order, name in enumerate(unmatched):
+        positions = index.key_positions.get(normalize_name(name), ())
+        position = next((position for position in positions if position not in used), None)
+        if position is not None:
+            match(name, position)
+        else:
+            fuzzy.extend((-score, order, index.positions[candidate], name)
+                         for candidate, score in index.candidates(name, limit, threshold))
+
+    # Best pairs first, each name and indexed name taking part in one pair only
+    for _, _, position, name in sorted(fuzzy):
+        if name not in matches and position not in used:
+            match(name, position)
+    return matches
+
+
+def read_overrides(file_name):
+    """
+    Input:
+      file_name - name of a JSON override table
+    Output:
+      Returns the override dictionary, or an empty dictionary if the
+      file does not exist.
+    """
+    try:
+        with open(file_name, encoding='utf-8') as override_file:
+            overrides = json.load(override_file)
+    except FileNotFoundError:
+        return {}
+    if not isinstance(overrides, dict):
+        raise ValueError('{} does not hold a JSON object'.format(file_name))
+    return overrides
+
+
+def write_overrides(overrides, file_name):
+    """
+    Inputs:
+      overrides - dictionary mapping names to names, or to None
+      file_name - name of the JSON file to write
+    Action:
+      Writes the override table sorted by name, one entry per line so it
+      is easy to edit by hand, replacing file_name atomically.
+    """
+    with atomic_file.atomic_write(file_name, encoding='utf-8') as override_file:
+        json.dump(overrides, override_file, indent=2, sort_keys=True, ensure_ascii=False)
+        override_file.write('\n')
@@ -0,0 +1,254 @@
+"""
+Spatial index over county centers.
+
+The centers (e.g. those in USA_Counties_with_FIPS_and_centers.csv, or in
+columns 5 and 6 of the joined cancer-risk table) are bucketed into a
+uniform grid of square cells.  The points of each cell are stored
+contiguously, cells in row-major order, so the points of a run of cells
+along a grid row form a single slice.  Queries only look at the cells
+near the query:
+
+  in_bbox    - counties whose center lies in a rectangle, e.g. the part
+               of the map shown by a zoomed render
+  nearest    - the county closest to a point, e.g. under the mouse
+  k_nearest  - the k counties closest to a point
+
+Queries return row indices into the table the index was built from.
+An index can be written to an .npz file and read back without
+rebuilding it.
+"""
+
+import csv
+import math
+
+import numpy as np
+
+import parse_cache
+
+
+# Average number of centers per grid cell when no cell size is given
+POINTS_PER_CELL = 4
+
+# Indexes read by load_county_index, shared by every caller in the process
+INDEX_CACHE = parse_cache.ParseCache(maxsize=4)
+
+
+class CountyIndex:
+    """
+    A grid index over points.
+
+    Attributes:
+      keys        - array of the key (e.g. FIPS code) of each point
+      coords      - (n, 2) float array of the points
+      cell_size   - width and height of a grid cell
+      origin      - (x, y) of the corner of cell (0, 0)
+      shape       - (columns, rows) of the grid
+      order       - point indices sorted by cell
+      cell_starts - array of columns * rows + 1 offsets into order; the
+                    points of cell c are order[cell_starts[c]:cell_starts[c + 1]]
+
+    Use build_county_index to make a CountyIndex.
+    """
+
+    def __init__(self, keys, coords, cell_size, origin, shape, order, cell_starts):
+        self.keys = keys
+        self.coords = coords
+        self.cell_size = cell_size
+        self.origin = origin
+        self.shape = shape
+        self.order = order
+        self.cell_starts = cell_starts
+
+    def __len__(self):
+        return len(self.coords)
+
+    def cell_of(self, x, y):
+        """
+        Inputs:
+          x, y - coordinates of a point
+        Output:
+          Returns the (column, row) of the cell holding the point.  These
+          are outside the grid for points outside it.
+        """
+        return (math.floor((x - self.origin[0]) / self.cell_size),
+                math.floor((y - self.origin[1]) / self.cell_size))
+
+    def points_in_cells(self, col_min, row_min, col_max, row_max):
+        """
+        Inputs:
+          col_min, row_min, col_max, row_max - inclusive range of cells,
+                                               which may extend past the grid
+        Output:
+          Returns an array of the indices of the points in those cells.
+        """
+        columns, rows = self.shape
+        col_min = max(col_min, 0)
+        col_max = min(col_max, columns - 1)
+        row_min = max(row_min, 0)
+        row_max = min(row_max, rows - 1)
+        if col_min > col_max or row_min > row_max:
+            return np.zeros(0, dtype=np.intp)
+        slices = [self.order[self.cell_starts[row * columns + col_min]:
+                             self.cell_starts[row * columns + col_max + 1]]
+                  for row in range(row_min, row_max + 1)]
+        return np.concatenate(slices)
+
+    def in_bbox(self, xmin, ymin, xmax, ymax):
+        """
+        Inputs:
+          xmin, ymin, xmax, ymax - corners of a rectangle
+        Output:
+          Returns a sorted array of the indices of the points inside the
+          rectangle (boundary included), so selecting them keeps the
+          order of the original table.
+        """
+        col_min, row_min = self.cell_of(xmin, ymin)
+        col_max, row_max = self.cell_of(xmax, ymax)
+        candidates = self.points_in_cells(col_min, row_min, col_max, row_max)
+        xcoords = self.coords[candidates, 0]
+        ycoords = self.coords[candidates, 1]
+        inside = (xcoords >= xmin) & (xcoords <= xmax) & (ycoords >= ymin) & (ycoords <= ymax)
+        return np.sort(candidates[inside])
+
+    def k_nearest(self, x, y, k):
+        """
+        Inputs:
+          x, y - coordinates of a point
+          k    - number of neighbors
+        Output:
+          Returns an array of the indices of the (up to) k points closest
+          to (x, y), closest first.  Ties are broken by index.
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return np.zeros(0, dtype=np.intp)
+        col, row = self.cell_of(x, y)
+        columns, rows = self.shape
+        # Rings of cells closer than this can hold no points
+        radius = max(-col, col - columns + 1, -row, row - rows + 1, 0)
+        while True:
+            candidates = self.points_in_cells(col - radius, row - radius,
+                                              col + radius, row + radius)
+            if len(candidates) >= k:
+                distances = np.hypot(self.coords[candidates, 0] - x,
+                                     self.coords[candidates, 1] - y)
+                nearest = np.lexsort((candidates, distances))[:k]
+                # Every point within radius cells of the query's cell has been seen
+                reach = radius * self.cell_size
+                if distances[nearest[-1]] <= reach:
+                    return candidates[nearest]
+                radius = max(radius + 1, math.ceil(distances[nearest[-1]] / self.cell_size))
+            else:
+                radius += 1
+
+    def nearest(self, x, y):
+        """
+        Inputs:
+          x, y - coordinates of a point
+        Output:
+          Returns the index of the point closest to (x, y), or None if
+          the index is empty.
+        """
+        nearest = self.k_nearest(x, y, 1)
+        return int(nearest[0]) if len(nearest) else None
+
+
+def build_county_index(keys, xcoords, ycoords, cell_size=None):
+    """
+    Inputs:
+      keys      - sequence of the key of each point
+      xcoords   - sequence of the x coordinate of each point
+      ycoords   - sequence of the y coordinate of each point
+      cell_size - width and height of a grid cell, or None to choose one
+                  giving about POINTS_PER_CELL points per cell
+    Output:
+      Returns a new CountyIndex over the points.
+    """
+    coords = np.column_stack([np.asarray(xcoords, dtype=np.float64),
+                              np.asarray(ycoords, dtype=np.float64)]).reshape(-1, 2)
+    if len(coords):
+        origin = coords.min(axis=0)
+        extent = coords.max(axis=0) - origin
+    else:
+        origin = np.zeros(2)
+        extent = np.zeros(2)
+    if cell_size is None:
+        area = max(extent[0], 1.0) * max(extent[1], 1.0)
+        cell_size = math.sqrt(area * POINTS_PER_CELL / max(len(coords), 1))
+    if not cell_size > 0:
+        raise ValueError('cell_size must be positive')
+
+    columns = int(extent[0] // cell_size) + 1
+    rows = int(extent[1] // cell_size) + 1
+    cells = np.floor((coords - origin) / cell_size).astype(np.intp)
+    cell_ids = np.minimum(cells[:, 1], rows - 1) * columns + np.minimum(cells[:, 0], columns - 1)
+    order = np.argsort(cell_ids, kind='stable')
+    cell_starts = np.searchsorted(cell_ids[order], np.arange(columns * rows + 1))
+    return CountyIndex(np.asarray(keys, dtype=str), coords, float(cell_size),
+                       (float(origin[0]), float(origin[1])), (columns, rows),
+                       order, cell_starts)
+
+
+def read_county_index(csv_file_name, key_col=0, x_col=1, y_col=2, cell_size=None):
+    """
+    Inputs:
+      csv_file_name - name of a CSV file of county centers without a header
+      key_col       - column of the county key
+      x_col         - column of the x coordinate of the center
+      y_col         - column of the y coordinate of the center
+      cell_size     - grid cell size, or None to choose one
+    Output:
+      Returns a new CountyIndex whose point indices are the rows of the file.
+    """
+    keys = []
+    xcoords = []
+    ycoords = []
+    with open(csv_file_name, newline='') as csv_file:
+        for row in csv.reader(csv_file, delimiter=','):
+            keys.append(row[key_col])
+            xcoords.append(float(row[x_col]))
+            ycoords.append(float(row[y_col]))
+    return build_county_index(keys, xcoords, ycoords, cell_size)
+
+
+def load_county_index(csv_file_name, key_col=0, x_col=1, y_col=2, cell_size=None,
+                      cache=INDEX_CACHE):
+    """
+    Inputs:
+      as read_county_index, plus
+      cache - ParseCache to read the index through, or None
+    Output:
+      Returns the CountyIndex for the file, building it only if it is not
+      already cached.  The index is shared between callers.
+    """
+    if cache is None:
+        return read_county_index(csv_file_name, key_col, x_col, y_col, cell_size)
+    return cache.get(csv_file_name, read_county_index, key_col, x_col, y_col, cell_size)
+
+
+def write_index_file(index, file_name):
+    """
+    Inputs:
+      index     - CountyIndex
+      file_name - name of (or open binary file for) an .npz file
+    Action:
+      Writes the index, including its grid, to the file.
+    """
+    np.savez(file_name, keys=index.keys, coords=index.coords,
+             cell_size=index.cell_size, origin=index.origin, shape=index.shape,
+             order=index.order, cell_starts=index.cell_starts)
+
+
+def read_index_file(file_name):
+    """
+    Input:
+      file_name - name of (or open binary file for) an .npz file written
+                  by write_index_file
+    Output:
+      Returns the CountyIndex stored in the file.
+    """
+    with np.load(file_name) as arrays:
+        return CountyIndex(arrays['keys'], arrays['coords'], float(arrays['cell_size']),
+                           tuple(float(value) for value in arrays['origin']),
+                           tuple(int(value) for value in arrays['shape']),
+                           arrays['order'], arrays['cell_starts'])
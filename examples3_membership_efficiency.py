@@ -7,6 +7,8 @@ import time
 import random
 import csv
 
+import typed_csv
+
 
 def read_csv_file(file_name):
     """
@@ -34,13 +36,13 @@ def test_CSV_join_efficiency(cancer_csv_file, center_csv_file):
     Measure running time to determine whether FIPS codes in cancer-risk set are in county center set
     """
     
-    # Read in both CSV files
-    risk_table = read_csv_file(cancer_csv_file)
-    risk_FIPS_list = [risk_table[idx][CANCER_RISK_FIPS_COL] for idx in range(len(risk_table))]
+    # Read only the FIPS column of both CSV files
+    risk_table = typed_csv.read_typed_csv(cancer_csv_file, [typed_csv.Column('fips', CANCER_RISK_FIPS_COL, typed_csv.FIPS)])
+    risk_FIPS_list = risk_table['fips'].tolist()
     print("Read", len(risk_FIPS_list), "cancer-risk FIPS codes")
        
-    center_table = read_csv_file(center_csv_file)
-    center_FIPS_list = [center_table[idx][CENTER_FIPS_COL] for idx in range(len(center_table))]
+    center_table = typed_csv.read_typed_csv(center_csv_file, [typed_csv.Column('fips', CENTER_FIPS_COL, typed_csv.FIPS)])
+    center_FIPS_list = center_table['fips'].tolist()
     print("Read", len(center_FIPS_list), "county center FIPS codes")
     
     start_time = time.time()
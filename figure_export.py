@@ -0,0 +1,54 @@
+"""
+Headless matplotlib figures for batch rendering.
+
+Figures made by new_figure are drawn on their own Agg canvas and are
+never registered with pyplot, so no GUI backend or display is needed
+and nothing is left behind in pyplot's global state.  save_figure writes
+the image and releases the figure's contents, so a process can render
+any number of maps without its memory growing.
+"""
+
+import os
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import atomic_file
+
+
+def new_figure(figsize=None, dpi=None):
+    """
+    Inputs:
+      figsize - (width, height) of the figure in inches, or None for the default
+      dpi     - dots per inch of the figure, or None for the default
+    Output:
+      Returns a new Figure attached to an Agg canvas.
+    """
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def save_figure(fig, output_file, image_format=None, dpi=None):
+    """
+    Inputs:
+      fig          - Figure made by new_figure
+      output_file  - file name, or binary file object (e.g. io.BytesIO)
+      image_format - 'png', 'svg', ... or None to use the file name's extension
+      dpi          - resolution of raster output, or None for the figure's own
+    Action:
+      Writes the figure to output_file, replacing a named file
+      atomically, then clears it so its artists and image data can be
+      freed, even if writing fails.
+    """
+    try:
+        if isinstance(output_file, (str, os.PathLike)):
+            if image_format is None:
+                # savefig only guesses the format from a name, not a file object
+                image_format = os.path.splitext(output_file)[1][1:].lower() or None
+            with atomic_file.atomic_write(output_file, 'wb') as image_file:
+                fig.savefig(image_file, format=image_format, dpi=dpi)
+        else:
+            fig.savefig(output_file, format=image_format, dpi=dpi)
+    finally:
+        fig.clear()
@@ -0,0 +1,228 @@
+"""
+Columnar loader for World Bank style GDP tables (e.g. isp_gdp.csv).
+
+The year columns are parsed once into a float64 matrix (country x year)
+with NaN for blank cells.  Rows can be looked up by any of the key
+fields given when the table was read (e.g. country name or country code)
+and columns by year.
+"""
+
+import csv
+import math
+from array import array
+
+import numpy as np
+
+import instrument
+import parse_cache
+
+# Tables parsed by load_gdp_table, shared by every caller in the process
+TABLE_CACHE = parse_cache.ParseCache(maxsize=8)
+
+
+def parse_cell(cell):
+    """
+    Input:
+      cell - string taken from a year column
+    Output:
+      Returns the cell as a float, or NaN if it is blank or not a number.
+    """
+    if not cell:
+        return math.nan
+    try:
+        return float(cell)
+    except ValueError:
+        return math.nan
+
+
+class GDPTable:
+    """
+    GDP data for many countries and years held as a single float matrix.
+
+    Attributes:
+      years   - list of the integer years, one per matrix column
+      values  - float64 array of shape (rows, years), NaN where no data
+      keys    - dictionary mapping each key field name to the list of
+                that field's values, one per matrix row
+      indexes - dictionary mapping each key field name to a dictionary
+                from field value to matrix row
+    """
+
+    def __init__(self, years, values, keys):
+        self.years = years
+        self.values = values
+        self.keys = keys
+        self.year_index = {year: col for col, year in enumerate(years)}
+        self.indexes = {}
+        for keyfield, key_values in keys.items():
+            # Later rows win on duplicate keys, as with read_csv_as_nested_dict
+            self.indexes[keyfield] = {key: row for row, key in enumerate(key_values)}
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def index(self, keyfield):
+        """
+        Input:
+          keyfield - name of a key field the table was read with
+        Output:
+          Returns the dictionary mapping that field's values to rows.
+          It can stand in for the nested dictionaries of
+          read_csv_as_nested_dict wherever only the keys are used.
+        """
+        return self.indexes[keyfield]
+
+    def row(self, keyfield, key):
+        """
+        Inputs:
+          keyfield - name of a key field the table was read with
+          key      - value of that field to look up
+        Output:
+          Returns the matrix row for key, or None if it is not present.
+        """
+        return self.indexes[keyfield].get(key)
+
+    def column(self, year):
+        """
+        Input:
+          year - year as an integer or a string
+        Output:
+          Returns the matrix column for year, or None if it is not present.
+        """
+        try:
+            return self.year_index.get(int(year))
+        except ValueError:
+            return None
+
+    def year_columns(self, min_year, max_year):
+        """
+        Inputs:
+          min_year - first year, inclusive
+          max_year - last year, inclusive
+        Output:
+          Returns a list of the matrix columns whose years lie between
+          min_year and max_year, in increasing order of year.
+        """
+        min_year = int(min_year)
+        max_year = int(max_year)
+        cols = [col for col, year in enumerate(self.years) if min_year <= year <= max_year]
+        cols.sort(key=lambda col: self.years[col])
+        return cols
+
+    def plot_values(self, row, min_year, max_year):
+        """
+        Inputs:
+          row      - matrix row of a single country
+          min_year - first year, inclusive
+          max_year - last year, inclusive
+        Output:
+          Returns a list of (year, GDP) tuples, as build_plot_values does,
+          for the years between min_year and max_year that have data.
+        """
+        cols = self.year_columns(min_year, max_year)
+        gdp = self.values[row, cols]
+        return [(self.years[col], float(value))
+                for col, value in zip(cols, gdp) if not math.isnan(value)]
+
+
+def read_gdp_table(filename, keyfields, separator, quote):
+    """
+    Inputs:
+      filename  - name of CSV file
+      keyfields - list of fields to index rows by (e.g. name and code)
+      separator - character that separates fields
+      quote     - character used to optionally quote fields
+    Output:
+      Returns a GDPTable holding every column whose header is a year.
+      All other columns except the key fields are dropped.
+    """
+    with open(filename, newline='') as csvfile:
+        csvreader = csv.reader(csvfile, delimiter=separator, quotechar=quote)
+        header = next(csvreader)
+        year_cols = [col for col, field in enumerate(header) if field.strip().isdecimal()]
+        key_cols = [header.index(keyfield) for keyfield in keyfields]
+
+        keys = [[] for _ in keyfields]
+        cells = array('d')
+        for row in csvreader:
+            if not row:
+                continue
+            for key_list, col in zip(keys, key_cols):
+                key_list.append(row[col])
+            # Short rows are padded with blanks, as csv.DictReader does
+            cells.extend(parse_cell(row[col]) if col < len(row) else math.nan
+                         for col in year_cols)
+
+    instrument.count('rows_read', len(keys[0]))
+    instrument.count('cells_parsed', len(cells))
+    years = [int(header[col]) for col in year_cols]
+    values = np.frombuffer(cells, dtype=np.float64).reshape(len(keys[0]), len(years))
+    # Tables are shared through TABLE_CACHE, so callers must not modify them
+    values.flags.writeable = False
+    return GDPTable(years, values, dict(zip(keyfields, keys)))
+
+
+def load_gdp_table(gdpinfo, keys, cache=TABLE_CACHE):
+    """
+    Inputs:
+      gdpinfo - GDP data information dictionary
+      keys    - entries of gdpinfo naming the key fields to index rows
+                by, e.g. ('country_name',) or ('country_code',)
+      cache   - ParseCache to read the table through, or None to
+                always parse the file
+    Output:
+      Returns the GDPTable for gdpinfo's file, indexed by the given key
+      fields only, so the file needs no other key columns.  Repeated
+      calls for an unchanged file and the same keys return the same
+      cached table.
+    """
+    keyfields = tuple(gdpinfo[key] for key in keys)
+    if cache is None:
+        return read_gdp_table(gdpinfo['gdpfile'], keyfields,
+                              gdpinfo['separator'], gdpinfo['quote'])
+    return cache.get(gdpinfo['gdpfile'], read_gdp_table, keyfields,
+                     gdpinfo['separator'], gdpinfo['quote'])
+
+
+def build_map_dicts(table, keyfield, reconciled, years):
+    """
+    Inputs:
+      table      - GDPTable holding the GDP data
+      keyfield   - key field whose values the reconciled countries map to
+      reconciled - tuple (plot_to_gdp_countries, plot_cc_not_in_gdp) as
+                   returned by reconcile_countries_by_name/_by_code
+      years      - list of years (integers or strings)
+    Output:
+      Returns a dictionary mapping each year in years to the tuple
+      (map_dict, plot_cc_not_in_gdpdata, plot_cc_no_gdp) that
+      build_map_dict_by_name/_by_code return for that year.  The log10
+      GDP values for all years are computed in a single array operation.
+    """
+    plot_to_gdp_countries, plot_cc_not_in_gdp = reconciled
+    gdp_rows = table.index(keyfield)
+    plot_ccs = list(plot_to_gdp_countries)
+    rows = np.array([gdp_rows[plot_to_gdp_countries[plot_cc]] for plot_cc in plot_ccs],
+                    dtype=np.intp)
+
+    # A year missing from the file has no GDP data for any country
+    cols = [table.column(year) for year in years]
+    present_cols = [col for col in cols if col is not None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gdp_logs = np.log10(table.values[np.ix_(rows, present_cols)])
+
+    map_dicts = {}
+    present = 0
+    for year, col in zip(years, cols):
+        map_dict = {}
+        plot_cc_no_gdp = set()
+        if col is None:
+            plot_cc_no_gdp.update(plot_ccs)
+        else:
+            for plot_cc, gdp_log in zip(plot_ccs, gdp_logs[:, present].tolist()):
+                if math.isnan(gdp_log):
+                    plot_cc_no_gdp.add(plot_cc)
+                else:
+                    map_dict[plot_cc] = gdp_log
+            present += 1
+        map_dicts[year] = (map_dict, set(plot_cc_not_in_gdp), plot_cc_no_gdp)
+    return map_dicts
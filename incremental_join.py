@@ -0,0 +1,516 @@
+"""
+Incremental re-joins of tables that change a little between runs.
+
+update_join joins two tables like table_join.hash_join and writes the
+result as a CSV file, like merge_csv_files, but also writes a sidecar
+manifest recording:
+
+  - the join's schema: key columns, join mode, fill and row widths
+  - a digest of each whole input table
+  - the key and a content hash of each row of each input table
+  - the length of the output text of each left row and of each key
+    found only in the right table, and the output file's size and
+    modification time
+
+On the next run, if both tables still have their digests and the output
+file is untouched, nothing else is done.  Otherwise the rows of a table
+that changed are hashed again, and its common prefix and suffix with
+the rows of the last run are trimmed off; the keys whose rows differ in
+what is left are the keys that were added, removed or modified.  Only
+the output rows of changed left rows and of changed keys are joined and
+formatted; the rest are sliced out of the previous output file at the
+offsets given by the lengths in the manifest, runs of them in one piece.
+
+A full join is done instead when there is no manifest, when the schema
+has changed, or when the output file is not the one the manifest
+describes.
+
+The manifest is two lines of JSON: a short header that is all the
+up-to-date check reads, and the row hashes and lengths.
+"""
+
+import csv
+import hashlib
+import json
+import os
+from collections import Counter
+
+import atomic_file
+import table_join
+
+
+MANIFEST_VERSION = 2
+
+class JoinUpdate:
+    """
+    The outcome of update_join.
+
+    Attributes:
+      num_rows        - number of rows of the output file
+      left_unmatched  - set of keys of the left table not found in the right table
+      right_unmatched - set of keys of the right table not found in the left table
+      added           - set of keys found in an input table only on this run
+      removed         - set of keys found in an input table only on the last run
+      modified        - set of keys whose rows changed in either table
+      full            - True if every output row was rebuilt
+      rewritten       - True if the output file was written
+
+    The rows themselves are not joined unless the joined property is used.
+    """
+
+    def __init__(self, num_rows, left_unmatched, right_unmatched, added, removed, modified,
+                 full, rewritten, join_args):
+        self.num_rows = num_rows
+        self.left_unmatched = left_unmatched
+        self.right_unmatched = right_unmatched
+        self.added = added
+        self.removed = removed
+        self.modified = modified
+        self.full = full
+        self.rewritten = rewritten
+        self._join_args = join_args
+        self._joined = None
+
+    @property
+    def changed(self):
+        """
+        Returns the set of keys whose output rows were rebuilt.
+        """
+        return self.added | self.removed | self.modified
+
+    @property
+    def joined(self):
+        """
+        Returns the table_join.JoinResult of the inputs, joining them in
+        full on first use.
+        """
+        if self._joined is None:
+            self._joined = table_join.hash_join(*self._join_args)
+        return self._joined
+
+
+def manifest_name(output_file):
+    """
+    Returns the name of the manifest written alongside output_file.
+    """
+    return output_file + '.manifest.json'
+
+
+def row_hash(row):
+    """
+    Returns a short hex hash of the fields of a row.
+    """
+    return text_hash('\x1f'.join(row))
+
+
+def text_hash(text):
+    """
+    Returns a short hex hash of a string.
+    """
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+def row_texts(table):
+    """
+    Input:
+      table - nested list, each list a row
+    Output:
+      Returns a list of the fields of each row joined into one string,
+      the text row_hash hashes.
+    """
+    return ['\x1f'.join(row) for row in table]
+
+
+def row_hashes(texts):
+    """
+    Input:
+      texts - list of the texts of the rows of a table (see row_texts)
+    Output:
+      Returns a list of the hashes of the rows, as row_hash returns them.
+    """
+    return [hashlib.blake2b(text.encode(), digest_size=8).hexdigest() for text in texts]
+
+
+def table_digest(texts):
+    """
+    Input:
+      texts - list of the texts of the rows of a table (see row_texts)
+    Output:
+      Returns a hex hash of every row of the table, in order.
+    """
+    return hashlib.blake2b('\x1e'.join(texts).encode(), digest_size=16).hexdigest()
+
+
+def table_schema(left_table, right_table, left_key, right_key, how, fill, last):
+    """
+    Returns a dictionary describing everything other than the row
+    contents that the joined rows depend on.
+    """
+    return {'left_key': list(table_join.key_columns(left_key)),
+            'right_key': list(table_join.key_columns(right_key)),
+            'how': how,
+            'fill': fill,
+            'last': last,
+            'left_widths': sorted({len(row) for row in left_table}),
+            'right_widths': sorted({len(row) for row in right_table})}
+
+
+def update_join(left_table, right_table, left_key, right_key, output_file,
+                how=table_join.INNER, fill='', last=False):
+    """
+    Inputs:
+      left_table  - nested list, each list a row
+      right_table - nested list, each list a row
+      left_key    - key column (or tuple of columns) of left_table
+      right_key   - key column (or tuple of columns) of right_table
+      output_file - name of the joined CSV file to bring up to date
+      how         - join mode, as for table_join.hash_join
+      fill        - value used for the columns of a missing row
+      last        - if True, only the last right row of each key is joined
+    Output:
+      Returns a JoinUpdate.
+
+    Action:
+      Leaves output_file holding the same rows a full join of the tables
+      would write, and its manifest describing them.  Both files are
+      replaced atomically.
+    """
+    if how not in (table_join.INNER, table_join.LEFT, table_join.RIGHT, table_join.OUTER):
+        raise ValueError('unknown join mode: {!r}'.format(how))
+    left_cols = table_join.key_columns(left_key)
+    if len(left_cols) != len(table_join.key_columns(right_key)):
+        raise ValueError('left and right keys have different numbers of columns')
+    join_args = (left_table, right_table, left_key, right_key, how, fill, last)
+
+    schema = table_schema(left_table, right_table, left_key, right_key, how, fill, last)
+    left_texts = row_texts(left_table)
+    right_texts = row_texts(right_table)
+    digests = [table_digest(left_texts), table_digest(right_texts)]
+    stamp = _file_stamp(output_file)
+    header = _read_manifest_header(output_file)
+    if header is not None and (header['schema'] != schema or header['stamp'] != stamp):
+        header = None
+    if header is not None and header['digests'] == digests:
+        return JoinUpdate(header['rows'], _decode_keys(header['left_unmatched']),
+                          _decode_keys(header['right_unmatched']), set(), set(), set(),
+                          False, False, join_args)
+
+    body = _read_manifest_body(output_file) if header is not None else None
+    old_text = _read_output_text(output_file, stamp) if body is not None else None
+    full = old_text is None
+
+    left_row_key = table_join.make_key_function(left_key)
+    left_keys = [left_row_key(row) for row in left_table]
+    right_row_key = table_join.make_key_function(right_key)
+    right_keys = [right_row_key(row) for row in right_table]
+    left_key_set = set(left_keys)
+    # Number of right rows joined to each key, in right table order
+    right_counts = dict.fromkeys(right_keys, 1) if last else Counter(right_keys)
+    left_unmatched = left_key_set - right_counts.keys()
+    right_unmatched = right_counts.keys() - left_key_set
+    keep_unmatched = how in (table_join.LEFT, table_join.OUTER)
+    if how in (table_join.RIGHT, table_join.OUTER):
+        right_only_keys = [key for key in right_counts if key in right_unmatched]
+    else:
+        right_only_keys = []
+    num_rows = 0
+    for key in left_keys:
+        num_rows += right_counts.get(key, 1 if keep_unmatched else 0)
+    for key in right_only_keys:
+        num_rows += right_counts[key]
+
+    # A table with its old digest has its old row hashes
+    if full or header['digests'][0] != digests[0]:
+        left_hashes = row_hashes(left_texts)
+    else:
+        left_hashes = body['left_hashes']
+    if full or header['digests'][1] != digests[1]:
+        right_hashes = row_hashes(right_texts)
+    else:
+        right_hashes = body['right_hashes']
+
+    if full:
+        added = left_key_set | right_counts.keys()
+        removed = set()
+        modified = set()
+        # Old left row whose output rows each left row reuses, if any
+        left_sources = [None] * len(left_table)
+        old_offsets = []
+        old_right_only = {}
+    else:
+        old_left_keys = _decode_keys(body['left_keys'], list)
+        old_right_keys = _decode_keys(body['right_keys'], list)
+        old_left_hashes = body['left_hashes']
+        old_right_hashes = body['right_hashes']
+        # Rows outside the windows are the same on both runs
+        start, old_stop, stop = _changed_window(old_left_hashes, left_hashes)
+        left_changed = _changed_keys(old_left_keys[start:old_stop], old_left_hashes[start:old_stop],
+                                     left_keys[start:stop], left_hashes[start:stop])
+        right_start, right_old_stop, right_stop = _changed_window(old_right_hashes, right_hashes)
+        right_changed = _changed_keys(old_right_keys[right_start:right_old_stop],
+                                      old_right_hashes[right_start:right_old_stop],
+                                      right_keys[right_start:right_stop],
+                                      right_hashes[right_start:right_stop])
+        old_left_key_set = set(old_left_keys)
+        old_right_key_set = set(old_right_keys)
+        added = {key for key in left_changed if key not in old_left_key_set}
+        added.update(key for key in right_changed if key not in old_right_key_set)
+        removed = {key for key in left_changed if key not in left_key_set}
+        removed.update(key for key in right_changed if key not in right_counts)
+        modified = (left_changed | right_changed) - added - removed
+
+        # A left row reuses the output rows of the same row in the prefix
+        # or suffix, or of a row with the same text in the window, unless
+        # the right rows of its key changed
+        window = {}
+        for old_idx in range(start, old_stop):
+            window[old_left_hashes[old_idx]] = old_idx
+        left_sources = list(range(start))
+        for left_idx in range(start, stop):
+            left_sources.append(window.get(left_hashes[left_idx]))
+        left_sources.extend(range(old_stop, len(old_left_hashes)))
+        for left_idx, key in enumerate(left_keys):
+            if key in right_changed:
+                left_sources[left_idx] = None
+
+        # Output rows of old segment i are old_text[old_offsets[i]:old_offsets[i + 1]]
+        old_offsets = [0]
+        for length in body['left_lengths'] + body['right_only_lengths']:
+            old_offsets.append(old_offsets[-1] + length)
+        old_right_only = {}
+        segment_idx = len(old_left_keys)
+        for key in _decode_keys(body['right_only_keys'], list):
+            if key not in right_changed:
+                old_right_only[key] = segment_idx
+            segment_idx += 1
+
+    # Right rows of the keys whose output rows are built on this run
+    wanted = set()
+    for left_idx, source in enumerate(left_sources):
+        if source is None:
+            wanted.add(left_keys[left_idx])
+    for key in right_only_keys:
+        if key not in old_right_only:
+            wanted.add(key)
+    right_rows = {}
+    for right_idx, key in enumerate(right_keys):
+        if key in wanted:
+            if last:
+                # The last row of a key replaces the earlier ones
+                right_rows[key] = [right_idx]
+            else:
+                right_rows.setdefault(key, []).append(right_idx)
+    builder = table_join.JoinResult(left_table,
+                                    table_join.KeyedTable(right_table, right_key, right_rows),
+                                    left_cols, [], left_unmatched, right_unmatched, fill,
+                                    table_join.table_width(left_table, left_cols))
+    splice = _Splice(old_text)
+    csv_writer = csv.writer(splice, delimiter=',', quoting=csv.QUOTE_MINIMAL)
+
+    # The output rows of each left row, then of each right-only key
+    unmatched = [None] if keep_unmatched else []
+    left_lengths = []
+    for left_idx, source in enumerate(left_sources):
+        if source is None:
+            written = splice.written
+            for right_idx in right_rows.get(left_keys[left_idx], unmatched):
+                csv_writer.writerow(builder.build_row(left_idx, right_idx))
+            left_lengths.append(splice.written - written)
+        else:
+            splice.copy(old_offsets[source], old_offsets[source + 1])
+            left_lengths.append(old_offsets[source + 1] - old_offsets[source])
+    right_only_lengths = []
+    for key in right_only_keys:
+        if key in old_right_only:
+            segment_idx = old_right_only[key]
+            splice.copy(old_offsets[segment_idx], old_offsets[segment_idx + 1])
+            right_only_lengths.append(old_offsets[segment_idx + 1] - old_offsets[segment_idx])
+        else:
+            written = splice.written
+            for right_idx in right_rows[key]:
+                csv_writer.writerow(builder.build_row(None, right_idx))
+            right_only_lengths.append(splice.written - written)
+    splice.flush()
+
+    with atomic_file.atomic_write(output_file, newline='') as csv_file:
+        csv_file.writelines(splice)
+
+    _write_manifest(output_file, {
+        'version': MANIFEST_VERSION,
+        'schema': schema,
+        'digests': digests,
+        'stamp': _file_stamp(output_file),
+        'rows': num_rows,
+        'left_unmatched': _encode_keys(left_unmatched),
+        'right_unmatched': _encode_keys(right_unmatched)}, {
+        'left_keys': _encode_keys(left_keys),
+        'left_hashes': left_hashes,
+        'left_lengths': left_lengths,
+        'right_keys': _encode_keys(right_keys),
+        'right_hashes': right_hashes,
+        'right_only_keys': _encode_keys(right_only_keys),
+        'right_only_lengths': right_only_lengths})
+    return JoinUpdate(num_rows, left_unmatched, right_unmatched, added, removed, modified,
+                      full, True, join_args)
+
+
+def _changed_window(old, new):
+    """
+    Inputs:
+      old - list of the row hashes of a table on the last run
+      new - list of the row hashes of the table on this run
+    Output:
+      Returns (start, old_stop, new_stop) such that the lists differ only
+      in old[start:old_stop] and new[start:new_stop], found by trimming
+      their common prefix and suffix.
+    """
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old[-1 - end] == new[-1 - end]:
+        end += 1
+    return start, len(old) - end, len(new) - end
+
+
+def _changed_keys(old_keys, old_hashes, new_keys, new_hashes):
+    """
+    Returns the set of keys whose rows have different hashes, in order,
+    in the old rows than in the new rows.
+    """
+    old_rows = {}
+    for key, row_hash in zip(old_keys, old_hashes):
+        old_rows.setdefault(key, []).append(row_hash)
+    new_rows = {}
+    for key, row_hash in zip(new_keys, new_hashes):
+        new_rows.setdefault(key, []).append(row_hash)
+    return {key for key in old_rows.keys() | new_rows.keys()
+            if old_rows.get(key) != new_rows.get(key)}
+
+
+class _Splice(list):
+    """
+    The text of a new output file, as a list of pieces: rows written by
+    a csv.writer, and slices of the old output text.  Adjacent slices are
+    taken in one piece.
+    """
+
+    def __init__(self, old_text):
+        super().__init__()
+        self.old_text = old_text
+        self.start = self.stop = 0
+        # Length of the text written, not counting the slices
+        self.written = 0
+
+    def write(self, text):
+        """
+        Adds a row written by a csv.writer.
+        """
+        self.flush()
+        self.append(text)
+        self.written += len(text)
+
+    def copy(self, start, stop):
+        """
+        Adds old_text[start:stop].
+        """
+        if start != self.stop:
+            self.flush()
+            self.start = start
+        self.stop = stop
+
+    def flush(self):
+        """
+        Adds the pending slice of the old output text, if any.
+        """
+        if self.stop > self.start:
+            self.append(self.old_text[self.start:self.stop])
+        self.start = self.stop = 0
+
+
+def _read_manifest_header(output_file):
+    """
+    Returns the header of the manifest of output_file, or None if it is
+    missing, unreadable or of another version.
+    """
+    try:
+        with open(manifest_name(output_file), encoding='utf-8') as manifest_file:
+            header = json.loads(manifest_file.readline())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(header, dict) or header.get('version') != MANIFEST_VERSION:
+        return None
+    return header
+
+
+def _read_manifest_body(output_file):
+    """
+    Returns the key hashes and segments of the manifest of output_file,
+    or None if they cannot be read.
+    """
+    try:
+        with open(manifest_name(output_file), encoding='utf-8') as manifest_file:
+            manifest_file.readline()
+            body = json.loads(manifest_file.readline())
+    except (OSError, ValueError):
+        return None
+    return body if isinstance(body, dict) else None
+
+
+def _write_manifest(output_file, header, body):
+    """
+    Writes the manifest of output_file atomically, as a header line and
+    a body line.
+    """
+    with atomic_file.atomic_write(manifest_name(output_file), encoding='utf-8') as manifest_file:
+        manifest_file.write(json.dumps(header, separators=(',', ':')))
+        manifest_file.write('\n')
+        manifest_file.write(json.dumps(body, separators=(',', ':')))
+        manifest_file.write('\n')
+
+
+def _read_output_text(output_file, stamp):
+    """
+    Returns the whole text of output_file, or None if it is missing or
+    no longer has the given stamp.
+    """
+    try:
+        with open(output_file, newline='') as csv_file:
+            text = csv_file.read()
+    except OSError:
+        return None
+    if _file_stamp(output_file) != stamp:
+        return None
+    return text
+
+
+def _file_stamp(file_name):
+    """
+    Returns [size, modification time] of a file, or None if it is missing.
+    """
+    try:
+        stat = os.stat(file_name)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _encode_keys(keys):
+    """
+    Returns a list of keys in a form that can be stored in JSON.  The
+    keys of a table are either all tuples or all strings.
+    """
+    keys = list(keys)
+    if keys and isinstance(keys[0], tuple):
+        return [list(key) for key in keys]
+    return keys
+
+
+def _decode_keys(keys, container=set):
+    """
+    Returns keys stored by _encode_keys, in the given container.
+    """
+    if keys and isinstance(keys[0], list):
+        return container(tuple(key) for key in keys)
+    return container(keys)
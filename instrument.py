@@ -0,0 +1,491 @@
+"""
+Stage timing and counters for the parse, reconcile, compute and render
+stages of the pipelines.
+
+Code marks its stages with spans and counts its work with counters:
+
+  with instrument.span('parse', 'parse'):
+      table = read_table(...)
+  instrument.count('rows_read', len(table))
+
+  @instrument.traced('render_world_map')
+  def render_world_map(...):
+
+Nothing is recorded until a Recorder is enabled.  While none is, span
+returns a shared do-nothing context manager, count returns at once and
+traced functions only test one global before calling the function, so
+instrumented code runs at nearly full speed.
+
+Spans nest: each span is recorded under its path, the names of the
+enclosing spans of the same thread joined by '/' (e.g.
+'merge_csv_files/parse').  The Recorder keeps a latency histogram per
+path, with power-of-two buckets so it needs little memory however long a
+batch job runs, and optionally every span as an event.  Recordings can
+be written as JSON lines (write_jsonl) or as a Chrome trace
+(write_chrome_trace) to open in chrome://tracing or Perfetto.
+
+Setting the PIPELINE_TRACE environment variable to a file name records
+the whole run of a script and writes the recording there on exit, as
+JSON lines if the name ends in .jsonl and as a Chrome trace otherwise.
+Only the calling process is recorded, not pool worker processes.
+"""
+
+import atexit
+import contextlib
+import functools
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import namedtuple
+
+import atomic_file
+
+
+# Environment variable naming the file to record the whole run to
+TRACE_VARIABLE = 'PIPELINE_TRACE'
+
+# Span events kept by default before further events are dropped (histograms keep counting)
+DEFAULT_MAX_EVENTS = 1000000
+
+# Percentiles reported by LatencyHistogram.summary
+PERCENTILES = (50, 90, 99)
+
+# One recorded span: times are in nanoseconds from the start of the recording
+SpanEvent = namedtuple('SpanEvent', ['path', 'name', 'category', 'start_ns', 'duration_ns',
+                                     'thread', 'args'])
+
+
+class LatencyHistogram:
+    """
+    Histogram of span durations in power-of-two nanosecond buckets.
+
+    Attributes:
+      buckets  - dictionary mapping bucket b to the number of durations
+                 d with d.bit_length() == b, i.e. 2**(b-1) <= d < 2**b
+      count    - number of durations
+      total_ns - sum of the durations
+      min_ns   - shortest duration, or None
+      max_ns   - longest duration, or None
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = None
+
+    def add(self, duration_ns):
+        """
+        Input:
+          duration_ns - duration in nanoseconds
+        Action:
+          Adds the duration to the histogram.
+        """
+        bucket = duration_ns.bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if self.min_ns is None or duration_ns < self.min_ns:
+            self.min_ns = duration_ns
+        if self.max_ns is None or duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def quantile(self, fraction):
+        """
+        Input:
+          fraction - number from 0 to 1
+        Output:
+          Returns an upper bound in nanoseconds of the given quantile of
+          the durations: the top of its bucket, or the longest duration
+          if that is less.  Returns None for an empty histogram.
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(2 ** bucket - 1, self.max_ns)
+        return self.max_ns
+
+    def summary(self):
+        """
+        Returns a dictionary of the count and of the total, mean, minimum,
+        quantiles and maximum of the durations in milliseconds.
+        """
+        if not self.count:
+            return {'count': 0}
+        summary = {'count': self.count,
+                   'total_ms': self.total_ns / 1e6,
+                   'mean_ms': self.total_ns / self.count / 1e6,
+                   'min_ms': self.min_ns / 1e6}
+        for percentile in PERCENTILES:
+            summary['p{}_ms'.format(percentile)] = self.quantile(percentile / 100) / 1e6
+        summary['max_ms'] = self.max_ns / 1e6
+        return summary
+
+
+class Recorder:
+    """
+    Spans and counters recorded while enabled.
+
+    Attributes:
+      counters   - dictionary mapping each counter name to its total
+      histograms - dictionary mapping each span path to its LatencyHistogram
+      events     - list of SpanEvents, in the order the spans ended
+      dropped    - number of spans not kept as events
+      max_events - most events kept (0 keeps histograms only)
+      start_ns   - time.perf_counter_ns() when the recording started
+      pid        - id of the recording process
+    """
+
+    def __init__(self, max_events=DEFAULT_MAX_EVENTS):
+        self.counters = {}
+        self.histograms = {}
+        self.events = []
+        self.dropped = 0
+        self.max_events = max_events
+        self.start_ns = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def count(self, name, value=1):
+        """
+        Adds value to the counter name.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def span(self, name, category=None, **args):
+        """
+        Returns a context manager recording a span called name (see span).
+        """
+        return _Span(self, name, category, args)
+
+    def stack(self):
+        """
+        Returns the list of the paths of the open spans of this thread.
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def add_span(self, path, name, category, start_ns, end_ns, args):
+        """
+        Inputs:
+          path     - path of the span
+          name     - name of the span
+          category - category of the span, or None
+          start_ns - time.perf_counter_ns() when the span started
+          end_ns   - time.perf_counter_ns() when the span ended
+          args     - dictionary of values noted on the span
+        Action:
+          Adds the span to the histogram of its path and to the events.
+        """
+        duration_ns = end_ns - start_ns
+        with self._lock:
+            histogram = self.histograms.get(path)
+            if histogram is None:
+                histogram = self.histograms[path] = LatencyHistogram()
+            histogram.add(duration_ns)
+            if len(self.events) < self.max_events:
+                self.events.append(SpanEvent(path, name, category, start_ns - self.start_ns,
+                                             duration_ns, threading.get_ident(), args))
+            else:
+                self.dropped += 1
+
+    def summaries(self):
+        """
+        Returns a dictionary mapping each span path, sorted, to the
+        summary of its histogram.
+        """
+        return {path: self.histograms[path].summary() for path in sorted(self.histograms)}
+
+
+class _Span:
+    """
+    Context manager recording one span in a Recorder.
+    """
+
+    __slots__ = ('recorder', 'name', 'category', 'args', 'path', 'start_ns')
+
+    def __init__(self, recorder, name, category, args):
+        self.recorder = recorder
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        stack = self.recorder.stack()
+        self.path = stack[-1] + '/' + self.name if stack else self.name
+        stack.append(self.path)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end_ns = time.perf_counter_ns()
+        self.recorder.stack().pop()
+        self.recorder.add_span(self.path, self.name, self.category, self.start_ns, end_ns,
+                               self.args)
+        return False
+
+    def note(self, **args):
+        """
+        Records the given values with the span (e.g. the number of rows).
+        """
+        self.args.update(args)
+
+
+class _NullSpan:
+    """
+    Context manager standing in for a span while recording is disabled.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def note(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+# The enabled Recorder, or None
+_recorder = None
+
+
+def enabled():
+    """
+    Returns True if a Recorder is enabled.
+    """
+    return _recorder is not None
+
+
+def current():
+    """
+    Returns the enabled Recorder, or None.
+    """
+    return _recorder
+
+
+def enable(recorder=None):
+    """
+    Input:
+      recorder - Recorder to record to, or None for a new one
+    Output:
+      Returns the Recorder, now recording every span and counter.
+    """
+    global _recorder
+    _recorder = recorder if recorder is not None else Recorder()
+    return _recorder
+
+
+def disable():
+    """
+    Stops recording.  Returns the Recorder that was enabled, or None.
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    return recorder
+
+
+@contextlib.contextmanager
+def recording(recorder=None):
+    """
+    Input:
+      recorder - Recorder to record to, or None for a new one
+    Output:
+      Returns a context manager enabling the Recorder for the duration
+      of a with block, and restoring the previously enabled one (if any)
+      after it:
+
+        with instrument.recording() as recorder:
+            ...
+    """
+    global _recorder
+    previous = _recorder
+    try:
+        yield enable(recorder)
+    finally:
+        _recorder = previous
+
+
+def span(name, category=None, **args):
+    """
+    Inputs:
+      name     - name of the stage, e.g. 'parse' or 'render_world_map'
+      category - kind of stage ('parse', 'reconcile', 'compute', 'render',
+                 'write'), or None
+      args     - values to record with the span
+    Output:
+      Returns a context manager timing the with block it guards as a
+      span.  It has a note(**args) method to record more values from
+      inside the block.
+    """
+    if _recorder is None:
+        return _NULL_SPAN
+    return _Span(_recorder, name, category, args)
+
+
+def count(name, value=1):
+    """
+    Adds value to the counter name, if recording.
+    """
+    if _recorder is not None:
+        _recorder.count(name, value)
+
+
+def traced(name=None, category=None):
+    """
+    Inputs:
+      name     - name of the span, or None for the name of the function
+      category - category of the span, or None
+    Output:
+      Returns a decorator making every call of a function a span.
+    """
+    def decorator(function):
+        span_name = name if name is not None else function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return function(*args, **kwargs)
+            with _Span(_recorder, span_name, category, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def jsonl_records(recorder):
+    """
+    Input:
+      recorder - a Recorder
+    Output:
+      Yields one dictionary per span event, then per counter, then per
+      span path with its histogram.
+    """
+    for event in recorder.events:
+        yield {'type': 'span', 'path': event.path, 'name': event.name,
+               'category': event.category, 'start_ms': event.start_ns / 1e6,
+               'duration_ms': event.duration_ns / 1e6, 'thread': event.thread,
+               'args': event.args}
+    for name in sorted(recorder.counters):
+        yield {'type': 'counter', 'name': name, 'value': recorder.counters[name]}
+    for path, summary in recorder.summaries().items():
+        record = {'type': 'histogram', 'path': path}
+        record.update(summary)
+        # Bucket b holds durations below 2**b ns
+        record['buckets'] = {str(2 ** bucket): number for bucket, number
+                             in sorted(recorder.histograms[path].buckets.items())}
+        yield record
+    if recorder.dropped:
+        yield {'type': 'dropped', 'spans': recorder.dropped}
+
+
+def chrome_trace(recorder):
+    """
+    Input:
+      recorder - a Recorder
+    Output:
+      Returns the recording as a dictionary in the Chrome trace event
+      format: a complete event per span, a counter event per counter at
+      the end of the recording, and the histogram summaries.
+    """
+    pid = recorder.pid
+    events = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+               'args': {'name': 'pid {}'.format(pid)}}]
+    end_us = 0.0
+    for event in recorder.events:
+        start_us = event.start_ns / 1e3
+        duration_us = event.duration_ns / 1e3
+        events.append({'name': event.name, 'cat': event.category or 'span', 'ph': 'X',
+                       'ts': start_us, 'dur': duration_us, 'pid': pid, 'tid': event.thread,
+                       'args': dict(event.args, path=event.path)})
+        end_us = max(end_us, start_us + duration_us)
+    for name in sorted(recorder.counters):
+        events.append({'name': name, 'ph': 'C', 'ts': end_us, 'pid': pid,
+                       'args': {name: recorder.counters[name]}})
+    return {'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'histograms': recorder.summaries(),
+            'droppedSpans': recorder.dropped}
+
+
+def write_jsonl(recorder, file_name):
+    """
+    Inputs:
+      recorder  - a Recorder
+      file_name - name of the file to write
+    Action:
+      Writes the records of jsonl_records one per line, replacing
+      file_name atomically.
+    """
+    with atomic_file.atomic_write(file_name, encoding='utf-8') as jsonl_file:
+        for record in jsonl_records(recorder):
+            jsonl_file.write(json.dumps(record, default=str))
+            jsonl_file.write('\n')
+
+
+def write_chrome_trace(recorder, file_name):
+    """
+    Inputs:
+      recorder  - a Recorder
+      file_name - name of the file to write
+    Action:
+      Writes the recording as a Chrome trace, replacing file_name atomically.
+    """
+    with atomic_file.atomic_write(file_name, encoding='utf-8') as trace_file:
+        json.dump(chrome_trace(recorder), trace_file, default=str)
+
+
+def write_recording(recorder, file_name):
+    """
+    Writes the recording to file_name as JSON lines if its name ends in
+    .jsonl, else as a Chrome trace.
+    """
+    if file_name.endswith('.jsonl'):
+        write_jsonl(recorder, file_name)
+    else:
+        write_chrome_trace(recorder, file_name)
+
+
+def format_summaries(recorder):
+    """
+    Returns the histogram summaries and counters of the recording as a
+    text table, one line per span path and per counter.
+    """
+    width = max([len('span')] + [len(name) for name in recorder.histograms] +
+                [len(name) for name in recorder.counters])
+    lines = ['{:<{}} {:>9} {:>10} {:>10} {:>10} {:>10}'.format(
+        'span', width, 'count', 'mean ms', 'p50 ms', 'p99 ms', 'max ms')]
+    for path, summary in recorder.summaries().items():
+        lines.append('{:<{}} {:>9} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+            path, width, summary['count'], summary['mean_ms'], summary['p50_ms'],
+            summary['p99_ms'], summary['max_ms']))
+    for name in sorted(recorder.counters):
+        lines.append('{:<{}} {:>9}'.format(name, width, recorder.counters[name]))
+    return '\n'.join(lines)
+
+
+def _record_run(file_name):
+    """
+    Enables a Recorder and writes it to file_name when the process exits.
+    """
+    recorder = enable()
+    atexit.register(write_recording, recorder, file_name)
+
+
+# Worker processes started by spawning re-import this module, they must not overwrite the trace
+if os.environ.get(TRACE_VARIABLE) and multiprocessing.parent_process() is None:
+    _record_run(os.environ[TRACE_VARIABLE])
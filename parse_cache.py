@@ -0,0 +1,89 @@
+"""
+In-memory cache of parsed data files.
+
+Entries are keyed on the file's path, modification time and size plus
+any options that change how the file is parsed (separator, quote,
+key fields, ...).  Editing or replacing a file changes its key, so a
+stale entry is never returned.  The cache holds at most maxsize entries
+and drops the least recently used one when it is full.
+"""
+
+import os
+from collections import OrderedDict
+
+import instrument
+
+
+def file_key(filename, options=()):
+    """
+    Inputs:
+      filename - name of the file
+      options  - tuple of parse options
+    Output:
+      Returns the cache key (path, mtime, size, options) for filename.
+    """
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size, tuple(options))
+
+
+class ParseCache:
+    """
+    Bounded least-recently-used cache of parsed files.
+    """
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, filename, loader, *options):
+        """
+        Inputs:
+          filename - name of the file to parse
+          loader   - function called as loader(filename, *options)
+                     to parse the file on a cache miss
+          options  - parse options, passed on to loader and made
+                     part of the cache key
+        Output:
+          Returns the parsed file, from memory if it has been parsed
+          before and is unchanged on disk.
+        """
+        key = file_key(filename, options)
+        if key in self._entries:
+            self.hits += 1
+            instrument.count('cache_hits')
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        self.misses += 1
+        instrument.count('cache_misses')
+        value = loader(filename, *options)
+        self._entries[key] = value
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, filename):
+        """
+        Input:
+          filename - name of a file
+        Action:
+          Drops every entry parsed from filename, whatever its options.
+        """
+        path = os.path.abspath(filename)
+        for key in [key for key in self._entries if key[0] == path]:
+            del self._entries[key]
+
+    def clear(self):
+        """
+        Action:
+          Drops every entry and resets the hit and miss counts.
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,178 @@
+"""
+Packed binary store of the polygons of an SVG map such as
+USA_Counties_2014.svg.
+
+build_polygon_store parses the <path> elements of the SVG once and
+writes their boundaries to a directory of .npy files:
+
+  coords.npy      - (N, 2) float32 array of every point of every path
+  offsets.npy     - n + 1 int64 offsets; the points of path k are
+                    coords[offsets[k]:offsets[k + 1]]
+  ring_starts.npy - int64 index in coords at which each subpath starts
+  ids.npy         - the id of each path (the FIPS code for a county)
+  source.json     - size and modification time of the SVG it was built
+                    from, written last so a partial store is never used
+
+open_polygon_store memory-maps the arrays, so later runs get every
+boundary without any XML or string parsing.  load_polygon_store does
+both, rebuilding the store only when the SVG has changed.
+"""
+
+import json
+import os
+
+import numpy as np
+
+import atomic_file
+import svg_paths
+
+
+ARRAY_NAMES = ('coords', 'offsets', 'ring_starts', 'ids')
+SOURCE_NAME = 'source.json'
+
+
+class PolygonStore:
+    """
+    The polygons of a store made by build_polygon_store.
+
+    Attributes:
+      coords      - (N, 2) float32 array of the points of all paths
+      offsets     - int64 array of n + 1 path boundaries in coords
+      ring_starts - int64 array of every subpath start in coords
+      ids         - array of the id of each path
+    """
+
+    def __init__(self, coords, offsets, ring_starts, ids):
+        self.coords = coords
+        self.offsets = offsets
+        self.ring_starts = ring_starts
+        self.ids = ids
+        self._id_index = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, path_id):
+        return path_id in self.id_index
+
+    @property
+    def id_index(self):
+        """
+        Returns a dictionary mapping each path id to its index, built
+        on first use.
+        """
+        if self._id_index is None:
+            self._id_index = {path_id: idx for idx, path_id in enumerate(self.ids.tolist())}
+        return self._id_index
+
+    def path(self, idx):
+        """
+        Input:
+          idx - index of a path
+        Output:
+          Returns an (n, 2) float32 array of the points of the path.
+        """
+        return self.coords[self.offsets[idx]:self.offsets[idx + 1]]
+
+    def rings(self, idx):
+        """
+        Input:
+          idx - index of a path
+        Output:
+          Returns a list of (n, 2) float32 arrays, one per subpath.
+        """
+        start = self.offsets[idx]
+        end = self.offsets[idx + 1]
+        first, last = np.searchsorted(self.ring_starts, [start, end])
+        bounds = list(self.ring_starts[first:last]) + [end]
+        return [self.coords[ring_start:ring_end]
+                for ring_start, ring_end in zip(bounds[:-1], bounds[1:])]
+
+    def boundary(self, path_id):
+        """
+        Input:
+          path_id - id of a path, e.g. a FIPS code
+        Output:
+          Returns the list of subpath arrays of the path with that id.
+        """
+        return self.rings(self.id_index[path_id])
+
+
+def read_polygon_store(svg_file_name):
+    """
+    Input:
+      svg_file_name - name of an SVG file
+    Output:
+      Returns a PolygonStore of the paths of the SVG file, held in memory.
+    """
+    ids = []
+    path_data_list = []
+    for path_id, path_data in svg_paths.iter_path_attributes(svg_file_name, ('id', 'd')):
+        ids.append(path_id)
+        path_data_list.append(path_data)
+    coords, offsets, ring_starts = svg_paths.parse_paths(path_data_list)
+    return PolygonStore(coords.astype(np.float32), offsets.astype(np.int64),
+                        ring_starts.astype(np.int64), np.array(ids, dtype=str))
+
+
+def build_polygon_store(svg_file_name, store_dir):
+    """
+    Inputs:
+      svg_file_name - name of an SVG file
+      store_dir     - directory to write the store to
+    Action:
+      Parses the paths of the SVG file and writes them to store_dir.
+      Each file is written under a temporary name and then renamed, so
+      readers never see a partly written file.
+    """
+    store = read_polygon_store(svg_file_name)
+    arrays = {name: getattr(store, name) for name in ARRAY_NAMES}
+
+    os.makedirs(store_dir, exist_ok=True)
+    source_file_name = os.path.join(store_dir, SOURCE_NAME)
+    if os.path.exists(source_file_name):
+        os.remove(source_file_name)
+    for name in ARRAY_NAMES:
+        with atomic_file.atomic_write(os.path.join(store_dir, name + '.npy'), 'wb') as store_file:
+            np.save(store_file, arrays[name])
+    with atomic_file.atomic_write(source_file_name, 'wb') as store_file:
+        store_file.write(json.dumps(_source_stamp(svg_file_name)).encode())
+
+
+def open_polygon_store(store_dir):
+    """
+    Input:
+      store_dir - directory written by build_polygon_store
+    Output:
+      Returns a PolygonStore whose arrays are memory-mapped from the store.
+    """
+    return PolygonStore(*[np.load(os.path.join(store_dir, name + '.npy'), mmap_mode='r')
+                          for name in ARRAY_NAMES])
+
+
+def load_polygon_store(svg_file_name, store_dir):
+    """
+    Inputs:
+      svg_file_name - name of an SVG file
+      store_dir     - directory holding (or to hold) its store
+    Output:
+      Returns a memory-mapped PolygonStore for the SVG file, first
+      building the store if it is missing or was built from a different
+      version of the file.
+    """
+    try:
+        with open(os.path.join(store_dir, SOURCE_NAME)) as source_file:
+            source = json.load(source_file)
+    except (OSError, ValueError):
+        source = None
+    if source != _source_stamp(svg_file_name):
+        build_polygon_store(svg_file_name, store_dir)
+    return open_polygon_store(store_dir)
+
+
+def _source_stamp(svg_file_name):
+    """
+    Returns a dictionary identifying the current version of a file.
+    """
+    stat = os.stat(svg_file_name)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
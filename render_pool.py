@@ -0,0 +1,113 @@
+"""
+Render many pygal charts in parallel with a process pool.
+
+Each job is a (chart spec, output file) pair.  A chart spec is a plain
+dictionary holding the precomputed data for one chart, so it can be sent
+to a worker process cheaply:
+
+  {"type": "world" or "xy",
+   "title": chart title,
+   "series": list of (label, values) pairs passed to chart.add()}
+
+On platforms that start workers by spawning a fresh interpreter
+(Windows, macOS) render_charts must be called from under
+if __name__ == '__main__': in the calling script.
+"""
+
+import multiprocessing
+from collections import namedtuple
+
+import pygal
+
+import atomic_file
+import instrument
+
+
+# Outcome of one job: error is None on success, else a description of the failure
+RenderResult = namedtuple('RenderResult', ['map_file', 'error'])
+
+# Output modes for output_chart
+RENDER_FILE = 'file'          # write the SVG to a file, no browser
+RENDER_BYTES = 'bytes'        # only return the SVG bytes
+RENDER_BROWSER = 'browser'    # open the chart in a web browser
+
+CHART_TYPES = {
+    'world': lambda: pygal.maps.world.World(),
+    'xy': lambda: pygal.XY(),
+}
+
+
+def build_chart(spec):
+    """
+    Input:
+      spec - chart spec dictionary
+    Output:
+      Returns the pygal chart described by spec, ready to be rendered.
+    """
+    chart = CHART_TYPES[spec['type']]()
+    if spec.get('title'):
+        chart.title = spec['title']
+    for label, values in spec['series']:
+        chart.add(label, values)
+    if instrument.enabled():
+        instrument.count('points_drawn', sum(len(values) for _, values in spec['series']))
+    return chart
+
+
+def output_chart(chart, map_file=None, mode=RENDER_FILE):
+    """
+    Inputs:
+      chart    - pygal chart to output
+      map_file - name of the output file (used by RENDER_FILE only)
+      mode     - one of RENDER_FILE, RENDER_BYTES or RENDER_BROWSER
+    Output:
+      Returns the rendered SVG as bytes, or None for RENDER_BROWSER.
+
+    The chart is serialized exactly once whatever the mode, so the
+    returned bytes can be streamed on to a socket or archive without
+    rendering again.
+    """
+    if mode == RENDER_BROWSER:
+        chart.render_in_browser()
+        return None
+
+    svg_bytes = chart.render()
+    if mode == RENDER_FILE:
+        with atomic_file.atomic_write(map_file, 'wb') as svg_file:
+            svg_file.write(svg_bytes)
+    elif mode != RENDER_BYTES:
+        raise ValueError('unknown render mode: {!r}'.format(mode))
+    return svg_bytes
+
+
+def render_job(job):
+    """
+    Input:
+      job - tuple (chart spec, output file name)
+    Output:
+      Returns a RenderResult for the job.  Errors are caught and
+      reported in the result so one bad chart does not stop the rest.
+    """
+    spec, map_file = job
+    try:
+        output_chart(build_chart(spec), map_file)
+    except Exception as err:
+        return RenderResult(map_file, '{}: {}'.format(type(err).__name__, err))
+    return RenderResult(map_file, None)
+
+
+def render_charts(jobs, processes=None):
+    """
+    Inputs:
+      jobs      - list of (chart spec, output file name) tuples
+      processes - number of worker processes; None uses one per CPU
+                  and 1 renders in the calling process
+    Output:
+      Returns a list of RenderResults in the same order as jobs.
+    """
+    jobs = list(jobs)
+    if processes == 1 or len(jobs) <= 1:
+        return [render_job(job) for job in jobs]
+
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(render_job, jobs, chunksize=1)
@@ -0,0 +1,291 @@
+"""
+Fast parsing of SVG path data and computation of path centers.
+
+Path data strings such as the "d" attribute of the county paths in
+USA_Counties_2014.svg are tokenized straight into (N, 2) NumPy arrays of
+coordinates.  Like get_boundary_coordinates, only absolute move-to (M),
+line-to (L) and close-path (z) commands are understood.
+
+The <path> elements of an SVG file can be streamed with
+iter_path_attributes without building a DOM of the whole file.
+
+Two kinds of center are provided:
+  PERIMETER - the perimeter-weighted centroid computed by
+              compute_county_center (the centroid of the boundary)
+  AREA      - the true centroid of the area enclosed by the path
+"""
+
+import itertools
+from xml.etree import ElementTree
+
+import numpy as np
+
+
+PERIMETER = 'perimeter'
+AREA = 'area'
+
+# Path commands and separators are all turned into whitespace before splitting
+_SEPARATORS = str.maketrans({'M': ' ', 'L': ' ', 'z': ' ', 'Z': ' ', ',': ' '})
+
+
+def iter_path_attributes(svg_file_name, attributes=('id', 'd')):
+    """
+    Inputs:
+      svg_file_name - name of (or open binary file for) an SVG file
+      attributes    - names of the attributes to extract from each path
+    Output:
+      Yields, in document order, one tuple per <path> element holding the
+      values of the given attributes ('' for a missing attribute).
+
+    The file is parsed incrementally and every element is discarded once
+    it has been read, so memory use does not grow with the file size.
+    """
+    parents = []
+    for event, elem in ElementTree.iterparse(svg_file_name, events=('start', 'end')):
+        if event == 'start':
+            parents.append(elem)
+            continue
+        parents.pop()
+        if elem.tag.rpartition('}')[2] == 'path':
+            yield tuple(elem.get(name, '') for name in attributes)
+        # Processed elements are always the first remaining child of their parent
+        elem.clear()
+        if parents:
+            parents[-1].remove(elem)
+
+
+def iter_chunks(iterable, chunk_size):
+    """
+    Inputs:
+      iterable   - any iterable
+      chunk_size - maximum number of items per chunk
+    Output:
+      Yields lists of up to chunk_size consecutive items of iterable.
+    """
+    iterator = iter(iterable)
+    chunk = list(itertools.islice(iterator, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, chunk_size))
+
+
+def path_centers(path_attributes):
+    """
+    Input:
+      path_attributes - list of (path id, path data) tuples
+    Output:
+      Returns a list of [path id, x center, y center] rows holding the
+      perimeter centroid of each path, identical to the centers
+      computed by compute_county_center.  Used as the worker function
+      when computing centers with a multiprocessing pool.
+    """
+    return [[path_id] + perimeter_centroid(parse_path_data(path_data))
+            for path_id, path_data in path_attributes]
+
+
+def parse_path_rings(path_data):
+    """
+    Input:
+      path_data - SVG path data string
+    Output:
+      Returns a tuple (coords, ring_starts) where coords is an (N, 2)
+      float array of every point in the path, in order, and ring_starts
+      is an integer array of the index in coords at which each subpath
+      (each "M" command) starts.
+    """
+    tokens = []
+    ring_starts = []
+    for ring in path_data.split('M'):
+        ring_tokens = ring.translate(_SEPARATORS).split()
+        if ring_tokens:
+            ring_starts.append(len(tokens) // 2)
+            tokens.extend(ring_tokens)
+    coords = np.array(tokens, dtype=np.float64).reshape(-1, 2)
+    return coords, np.array(ring_starts, dtype=np.intp)
+
+
+def parse_path_data(path_data):
+    """
+    Input:
+      path_data - SVG path data string
+    Output:
+      Returns an (N, 2) float array with the same coordinates, in the
+      same order, as get_boundary_coordinates returns for path_data.
+    """
+    return np.array(path_data.translate(_SEPARATORS).split(),
+                    dtype=np.float64).reshape(-1, 2)
+
+
+def perimeter_centroid(coords):
+    """
+    Input:
+      coords - (N, 2) float array of points on a closed boundary, with
+               the first point repeated at the end
+    Output:
+      Returns the perimeter-weighted centroid of the boundary as a list
+      of two floats.  The sums are accumulated in the same order as
+      compute_county_center, so the result is identical to it.
+    """
+    starts = coords[:-1]
+    ends = coords[1:]
+    edge_lengths = np.sqrt((starts[:, 0] - ends[:, 0]) ** 2 + (starts[:, 1] - ends[:, 1]) ** 2)
+    weighted = 0.5 * (starts + ends) * edge_lengths[:, np.newaxis]
+    perimeter = np.cumsum(edge_lengths)[-1]
+    centroid = np.cumsum(weighted, axis=0)[-1]
+    return [float(centroid[0] / perimeter), float(centroid[1] / perimeter)]
+
+
+def area_centroid(coords, ring_starts=None):
+    """
+    Inputs:
+      coords      - (N, 2) float array of points on the path
+      ring_starts - integer array of the index at which each subpath
+                    starts, or None if the path has a single subpath
+    Output:
+      Returns the centroid of the area enclosed by the path as a list of
+      two floats.  Each subpath is closed back to its first point, and
+      subpaths wound in opposite directions (holes) subtract area.  A
+      path enclosing no area falls back to its perimeter centroid.
+    """
+    if ring_starts is None:
+        ring_starts = np.zeros(1, dtype=np.intp)
+    next_points = _next_in_ring(len(coords), ring_starts)
+    xcoords = coords[:, 0]
+    ycoords = coords[:, 1]
+    cross = xcoords * ycoords[next_points] - xcoords[next_points] * ycoords
+    area = cross.sum() / 2
+    if area == 0:
+        return perimeter_centroid(coords)
+    xcenter = ((xcoords + xcoords[next_points]) * cross).sum() / (6 * area)
+    ycenter = ((ycoords + ycoords[next_points]) * cross).sum() / (6 * area)
+    return [float(xcenter), float(ycenter)]
+
+
+def compute_center(path_data, mode=PERIMETER):
+    """
+    Inputs:
+      path_data - SVG path data string
+      mode      - PERIMETER or AREA
+    Output:
+      Returns the center of the path as a list of two floats.
+    """
+    if mode == PERIMETER:
+        return perimeter_centroid(parse_path_data(path_data))
+    if mode == AREA:
+        return area_centroid(*parse_path_rings(path_data))
+    raise ValueError('unknown center mode: {!r}'.format(mode))
+
+
+def parse_paths(path_data_list):
+    """
+    Input:
+      path_data_list - list of SVG path data strings
+    Output:
+      Returns a tuple (coords, offsets, ring_starts).  coords is an
+      (N, 2) float array holding the points of every path one after
+      another; the points of path k are coords[offsets[k]:offsets[k + 1]].
+      ring_starts is an integer array of the index in coords at which
+      each subpath of every path starts.
+    """
+    tokens = []
+    offsets = [0]
+    ring_starts = []
+    for path_data in path_data_list:
+        for ring in path_data.split('M'):
+            ring_tokens = ring.translate(_SEPARATORS).split()
+            if ring_tokens:
+                ring_starts.append(len(tokens) // 2)
+                tokens.extend(ring_tokens)
+        offsets.append(len(tokens) // 2)
+    coords = np.array(tokens, dtype=np.float64).reshape(-1, 2)
+    return (coords, np.array(offsets, dtype=np.intp),
+            np.array(ring_starts, dtype=np.intp))
+
+
+def compute_centers(path_data_list, mode=PERIMETER):
+    """
+    Inputs:
+      path_data_list - list of SVG path data strings
+      mode           - PERIMETER or AREA
+    Output:
+      Returns an (n, 2) float array of the center of each path, computed
+      for all paths at once.  PERIMETER centers agree with
+      compute_county_center to within floating-point rounding.  Paths
+      with no extent get NaN centers.
+    """
+    coords, offsets, ring_starts = parse_paths(path_data_list)
+    if mode == PERIMETER:
+        return perimeter_centroids(coords, offsets)
+    if mode == AREA:
+        return area_centroids(coords, offsets, ring_starts)
+    raise ValueError('unknown center mode: {!r}'.format(mode))
+
+
+def perimeter_centroids(coords, offsets):
+    """
+    Inputs:
+      coords  - (N, 2) float array of the points of many paths
+      offsets - integer array of n + 1 path boundaries in coords
+    Output:
+      Returns an (n, 2) float array of the perimeter centroid of each path.
+    """
+    # Edge i joins point i to point i + 1; edges that join two paths get no weight
+    edge_lengths = np.sqrt(((coords[1:] - coords[:-1]) ** 2).sum(axis=1))
+    boundaries = offsets[1:-1]
+    edge_lengths[boundaries[(boundaries > 0) & (boundaries < len(coords))] - 1] = 0
+    midpoints = 0.5 * (coords[1:] + coords[:-1])
+
+    centers = np.full((len(offsets) - 1, 2), np.nan)
+    nonempty = offsets[1:] - offsets[:-1] > 1
+    starts = offsets[:-1][nonempty]
+    if len(starts):
+        perimeters = np.add.reduceat(edge_lengths, starts)
+        weighted = np.add.reduceat(midpoints * edge_lengths[:, np.newaxis], starts)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            centers[nonempty] = weighted / perimeters[:, np.newaxis]
+    return centers
+
+
+def area_centroids(coords, offsets, ring_starts):
+    """
+    Inputs:
+      coords      - (N, 2) float array of the points of many paths
+      offsets     - integer array of n + 1 path boundaries in coords
+      ring_starts - integer array of every subpath start in coords
+    Output:
+      Returns an (n, 2) float array of the area centroid of each path,
+      falling back to the perimeter centroid for paths enclosing no area.
+    """
+    next_points = _next_in_ring(len(coords), ring_starts)
+    xcoords = coords[:, 0]
+    ycoords = coords[:, 1]
+    cross = xcoords * ycoords[next_points] - xcoords[next_points] * ycoords
+    moments = np.column_stack([(xcoords + xcoords[next_points]) * cross,
+                               (ycoords + ycoords[next_points]) * cross])
+
+    centers = perimeter_centroids(coords, offsets)
+    nonempty = offsets[1:] > offsets[:-1]
+    starts = offsets[:-1][nonempty]
+    if len(starts):
+        areas = np.add.reduceat(cross, starts) / 2
+        sums = np.add.reduceat(moments, starts)
+        has_area = areas != 0
+        rows = np.flatnonzero(nonempty)[has_area]
+        centers[rows] = sums[has_area] / (6 * areas[has_area, np.newaxis])
+    return centers
+
+
+def _next_in_ring(num_points, ring_starts):
+    """
+    Inputs:
+      num_points  - number of points
+      ring_starts - integer array of every subpath start
+    Output:
+      Returns an integer array giving, for each point, the index of the
+      following point in its subpath, wrapping the last point of each
+      subpath back to its first.
+    """
+    next_points = np.arange(1, num_points + 1)
+    ring_ends = np.append(ring_starts[1:], num_points) - 1
+    next_points[ring_ends] = ring_starts
+    return next_points
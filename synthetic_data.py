@@ -0,0 +1,349 @@
+"""
+Synthetic data files in the formats of the bundled inputs, at any size.
+
+  write_gdp_csv      - World Bank style wide GDP table (isp_gdp.csv):
+                       one row per country and indicator, one column per
+                       year, with cells left blank at a given rate
+  write_county_files - SVG map of counties (USA_Counties_2014.svg), with
+                       the matching county centers
+                       (USA_Counties_with_FIPS_and_centers.csv, computed
+                       from the paths as process_county_attributes does),
+                       cancer-risk (cancer_risk_trimmed_solution.csv)
+                       and joined (cancer_risk_joined_solution.csv) CSV
+                       files
+
+The counties of the map are the cells of a grid over the map, each a
+closed polygon whose edges are subdivided into several points.  The grid
+vertices and edge points are jittered, and every edge is shared by the
+two counties on either side of it, so the counties tile the map.  Each
+path has a FIPS-like id.  A chosen fraction of the rows of the
+cancer-risk table have the FIPS code of a county on the map; the rest
+have codes that are not on it.
+
+Every file is determined by its arguments and the seed: the same seed
+gives the same files (with the same version of NumPy).
+
+  python synthetic_data.py OUTPUT_DIR [--scale 10] [--seed 0] [--indicators 1]
+"""
+
+import argparse
+import math
+import os
+
+import numpy as np
+
+import atomic_file
+import bulk_csv
+import svg_paths
+
+
+DEFAULT_SEED = 0
+
+# Size of SVG image of USA
+USA_SVG_SIZE = (555, 352)
+
+# Sizes of the bundled files, the inputs of write_inputs at scale 1
+BUNDLED_COUNTIES = 3143
+BUNDLED_RISK_ROWS = 3276
+BUNDLED_COUNTRIES = 264
+BUNDLED_YEARS = range(1960, 2017)
+
+# FIPS-like codes are a two character state code and a three digit
+# county code.  States 1 to 99 are numbered 01 to 99, as real FIPS states
+# are; the states after them, needed above 30 times the bundled map, are
+# A0 to ZZ, which are never FIPS codes, so every code has five characters
+COUNTIES_PER_STATE = 999
+NUMERIC_STATES = 99
+CODE_CHARS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+MAX_COUNTIES = (NUMERIC_STATES + 26 * len(CODE_CHARS)) * COUNTIES_PER_STATE
+
+# Points on each edge of a county between its corners; counties of the
+# bundled map have about 30 points, like a grid cell with 6 per edge
+DEFAULT_EDGE_POINTS = 6
+
+GDP_HEADER = ['Country Name', 'Country Code', 'Indicator Name', 'Indicator Code']
+GDP_INDICATOR = ('GDP (current US$)', 'NY.GDP.MKTP.CD')
+
+# Range of the cancer risks in the bundled table
+MIN_RISK = 8.6E-06
+MAX_RISK = 1.5E-04
+
+COUNTY_STYLE = ('font-size:12px;fill:#d0d0d0;fill-rule:nonzero;stroke:#000000;stroke-opacity:1;'
+                'stroke-width:0.1;stroke-miterlimit:4;stroke-dasharray:none;stroke-linecap:butt;'
+                'marker-start:none;stroke-linejoin:bevel')
+
+SVG_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+            '<svg\n   xmlns="http://www.w3.org/2000/svg"\n   version="1.0"\n'
+            '   width="{width}"\n   height="{height}"\n   id="synthetic">\n')
+SVG_PATH = '  <path\n     style="{style}"\n     d="{d}"\n     id="{id}" />\n'
+SVG_TAIL = '</svg>\n'
+
+# File names written by write_inputs, those of the bundled files
+INPUT_NAMES = {
+    'svg': 'USA_Counties_2014.svg',
+    'centers': 'USA_Counties_with_FIPS_and_centers.csv',
+    'risk': 'cancer_risk_trimmed_solution.csv',
+    'joined': 'cancer_risk_joined_solution.csv',
+    'gdp': 'isp_gdp.csv',
+}
+
+
+def synthetic_name(idx):
+    """
+    Returns the name of synthetic country number idx.
+    """
+    return 'Country {}'.format(idx)
+
+
+def synthetic_code(idx):
+    """
+    Returns the code of synthetic country number idx: 'X' followed by two
+    or more letters.  Codes XAA to XZZ are never assigned by ISO 3166,
+    and longer codes are not codes of it at all.
+    """
+    letters = ''
+    while idx or len(letters) < 2:
+        idx, rem = divmod(idx, 26)
+        letters = chr(ord('A') + rem) + letters
+    return 'X' + letters
+
+
+def fips_code(idx):
+    """
+    Returns the FIPS-like code of county number idx: a state code
+    (01 to 99, then A0 to ZZ) followed by a three digit county code.
+    Raises ValueError if idx is not below MAX_COUNTIES.
+    """
+    if not 0 <= idx < MAX_COUNTIES:
+        raise ValueError('county {} has no FIPS-like code (at most {} counties)'.format(
+            idx, MAX_COUNTIES))
+    state, county = divmod(idx, COUNTIES_PER_STATE)
+    if state < NUMERIC_STATES:
+        state_code = '{:02d}'.format(state + 1)
+    else:
+        letter, char = divmod(state - NUMERIC_STATES, len(CODE_CHARS))
+        state_code = CODE_CHARS[10 + letter] + CODE_CHARS[char]
+    return '{}{:03d}'.format(state_code, county + 1)
+
+
+def write_gdp_csv(file_name, num_countries, years=BUNDLED_YEARS, num_indicators=1,
+                  blank_rate=0.2, seed=DEFAULT_SEED, countries=()):
+    """
+    Inputs:
+      file_name      - name of the CSV file to write
+      num_countries  - number of countries
+      years          - range of the years of the table
+      num_indicators - number of indicator rows per country; the first is GDP
+      blank_rate     - fraction of cells left blank
+      seed           - seed of the random numbers
+      countries      - sequence of (name, code) pairs of the first
+                       countries, e.g. real ones; the others get
+                       synthetic names and codes
+    Output:
+      Returns the number of rows written.
+    """
+    rng = np.random.default_rng(seed)
+    years = list(years)
+    countries = list(countries)[:num_countries]
+    countries += [(synthetic_name(idx), synthetic_code(idx))
+                  for idx in range(len(countries), num_countries)]
+    indicators = [GDP_INDICATOR] + [('Indicator {}'.format(idx), 'SYN.IND.{}'.format(idx))
+                                    for idx in range(1, num_indicators)]
+
+    # GDP grows from a log-normal start by a normal annual rate
+    num_rows = num_countries * num_indicators
+    start = rng.normal(23.0, 2.0, size=(num_rows, 1))
+    growth = rng.normal(0.04, 0.06, size=(num_rows, len(years)))
+    values = np.exp(start + np.cumsum(growth, axis=1))
+    blank = rng.random(size=values.shape) < blank_rate
+    cells = np.char.mod('%.0f', values)
+    cells[blank] = ''
+
+    row_names = [country + indicator for country in countries for indicator in indicators]
+    with bulk_csv.open_csv(file_name) as csv_writer:
+        csv_writer.writerow(GDP_HEADER + [str(year) for year in years])
+        csv_writer.writerows(list(names) + row_cells
+                             for names, row_cells in zip(row_names, cells.tolist()))
+    return csv_writer.rows_written - 1
+
+
+def county_grid(num_counties, edge_points=DEFAULT_EDGE_POINTS, seed=DEFAULT_SEED,
+                svg_size=USA_SVG_SIZE):
+    """
+    Inputs:
+      num_counties - number of counties
+      edge_points  - number of points on each edge between two corners
+      seed         - seed of the random numbers
+      svg_size     - (width, height) of the map
+    Output:
+      Returns a (num_counties, 4 * (edge_points + 1) + 1, 2) float array
+      of the boundary of each county, a closed ring whose first point is
+      repeated at its end.  Counties fill a grid of cells row by row.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = svg_size
+    cols = max(1, math.ceil(math.sqrt(num_counties * width / height)))
+    rows = max(1, math.ceil(num_counties / cols))
+    cell_x = width / cols
+    cell_y = height / rows
+
+    # Corners, moved by up to a quarter of a cell
+    corner_x, corner_y = np.meshgrid(np.arange(cols + 1) * cell_x, np.arange(rows + 1) * cell_y)
+    corners = np.stack([corner_x, corner_y], axis=-1)
+    corners += rng.uniform(-0.25, 0.25, size=corners.shape) * (cell_x, cell_y)
+
+    # Points along each edge, moved sideways by up to a tenth of a cell
+    steps = np.arange(1, edge_points + 1) / (edge_points + 1)
+    steps = steps[:, np.newaxis]
+    across = corners[:, :-1, np.newaxis] + steps * (corners[:, 1:] - corners[:, :-1])[:, :, np.newaxis]
+    across[..., 1] += rng.uniform(-0.1, 0.1, size=across.shape[:-1]) * cell_y
+    down = corners[:-1, :, np.newaxis] + steps * (corners[1:] - corners[:-1])[:, :, np.newaxis]
+    down[..., 0] += rng.uniform(-0.1, 0.1, size=down.shape[:-1]) * cell_x
+
+    cells = np.arange(num_counties)
+    row, col = cells // cols, cells % cols
+    # Clockwise on the map: top edge, right edge, bottom edge backwards, left edge backwards
+    boundaries = np.concatenate([corners[row, col][:, np.newaxis], across[row, col],
+                           corners[row, col + 1][:, np.newaxis], down[row, col + 1],
+                           corners[row + 1, col + 1][:, np.newaxis], across[row + 1, col][:, ::-1],
+                           corners[row + 1, col][:, np.newaxis], down[row, col][:, ::-1],
+                           corners[row, col][:, np.newaxis]], axis=1)
+    return np.clip(boundaries, 0, svg_size)
+
+
+def write_county_svg(file_name, ids, boundaries, svg_size=USA_SVG_SIZE):
+    """
+    Inputs:
+      file_name  - name of the SVG file to write
+      ids        - list of the id of each county
+      boundaries - array of the boundary of each county, as county_grid returns
+      svg_size   - (width, height) of the map
+    Output:
+      Returns the list of the path data strings written, one per county.
+
+    Action:
+      Writes an SVG map with one <path> element per county, in the
+      layout of USA_Counties_2014.svg.
+    """
+    points = np.char.mod('%.5f', boundaries)
+    path_data_list = ['M ' + ' L '.join(x + ',' + y for x, y in county_points)
+                      for county_points in points.tolist()]
+    with atomic_file.atomic_write(file_name, encoding='utf-8') as svg_file:
+        svg_file.write(SVG_HEAD.format(width=svg_size[0], height=svg_size[1]))
+        for county_id, path_data in zip(ids, path_data_list):
+            svg_file.write(SVG_PATH.format(style=COUNTY_STYLE, d=path_data, id=county_id))
+        svg_file.write(SVG_TAIL)
+    return path_data_list
+
+
+def write_county_files(svg_file_name, center_file_name, risk_file_name, joined_file_name=None,
+                       num_counties=BUNDLED_COUNTIES, num_risk_rows=BUNDLED_RISK_ROWS,
+                       overlap=0.96, edge_points=DEFAULT_EDGE_POINTS, seed=DEFAULT_SEED,
+                       svg_size=USA_SVG_SIZE):
+    """
+    Inputs:
+      svg_file_name    - name of the SVG map to write
+      center_file_name - name of the county center CSV file to write
+      risk_file_name   - name of the cancer-risk CSV file to write
+      joined_file_name - name of the joined CSV file to write, or None
+      num_counties     - number of counties on the map
+      num_risk_rows    - number of rows of the cancer-risk table
+      overlap          - fraction of the cancer-risk rows whose FIPS code
+                         is on the map (at most num_counties of them)
+      edge_points      - number of points on each edge between two corners
+      seed             - seed of the random numbers
+      svg_size         - (width, height) of the map
+    Output:
+      Returns the number of rows of the joined table.
+
+    Action:
+      Writes the map, the center of each county on it, and a cancer-risk
+      table sorted by decreasing risk, as in the bundled files.  The
+      joined table is the cancer-risk table with the center of each
+      county on the map added, in the same order.
+    """
+    # Codes of the counties on the map, then of the risk table's counties not on it
+    num_matched = min(round(num_risk_rows * overlap), num_counties)
+    num_codes = num_counties + num_risk_rows - num_matched
+    if num_codes > MAX_COUNTIES:
+        raise ValueError('{} counties and {} risk rows need {} FIPS-like codes, more than {}'.format(
+            num_counties, num_risk_rows, num_codes, MAX_COUNTIES))
+
+    rng = np.random.default_rng(seed)
+    boundaries = county_grid(num_counties, edge_points, rng.integers(1 << 32), svg_size)
+    ids = [fips_code(idx) for idx in range(num_counties)]
+    path_data_list = write_county_svg(svg_file_name, ids, boundaries, svg_size)
+
+    # Centers of the paths as written, so they are those the pipeline computes
+    centers = np.array([center_row[1:]
+                        for center_row in svg_paths.path_centers(zip(ids, path_data_list))])
+    bulk_csv.write_columns([ids, centers[:, 0], centers[:, 1]], center_file_name)
+
+    # Counties of the risk table: some on the map, the others after the last one on it
+    counties = np.concatenate([rng.choice(num_counties, size=num_matched, replace=False),
+                               num_counties + np.arange(num_risk_rows - num_matched)])
+    rng.shuffle(counties)
+    risks = np.sort(np.exp(rng.uniform(math.log(MIN_RISK), math.log(MAX_RISK),
+                                       size=num_risk_rows)))[::-1]
+    populations = np.round(np.exp(rng.normal(10.3, 1.5, size=num_risk_rows))).astype(np.int64)
+    states, _ = np.divmod(counties, COUNTIES_PER_STATE)
+    risk_columns = [[chr(ord('A') + state // 26 % 26) + chr(ord('A') + state % 26)
+                     for state in states.tolist()],
+                    ['County {}'.format(county) for county in counties.tolist()],
+                    [fips_code(county) for county in counties.tolist()],
+                    populations,
+                    np.char.mod('%.1E', risks)]
+    bulk_csv.write_columns(risk_columns, risk_file_name)
+
+    on_map = counties < num_counties
+    if joined_file_name is not None:
+        joined_columns = [np.asarray(column)[on_map] for column in risk_columns]
+        joined_columns += [centers[counties[on_map], 0], centers[counties[on_map], 1]]
+        bulk_csv.write_columns(joined_columns, joined_file_name)
+    return int(on_map.sum())
+
+
+def write_inputs(directory, scale=1, seed=DEFAULT_SEED, countries=(), num_indicators=1):
+    """
+    Inputs:
+      directory      - directory to write the files to
+      scale          - multiple of the sizes of the bundled files
+      seed           - seed of the random numbers
+      countries      - sequence of (name, code) pairs of the first
+                       countries of the GDP table
+      num_indicators - number of indicator rows per country of the GDP
+                       table; the first is GDP
+    Output:
+      Returns a dictionary mapping each key of INPUT_NAMES to the name of
+      the file written, with the sizes of the bundled files times scale.
+    """
+    os.makedirs(directory, exist_ok=True)
+    files = {key: os.path.join(directory, name) for key, name in INPUT_NAMES.items()}
+    write_county_files(files['svg'], files['centers'], files['risk'], files['joined'],
+                       num_counties=BUNDLED_COUNTIES * scale,
+                       num_risk_rows=BUNDLED_RISK_ROWS * scale, seed=seed)
+    write_gdp_csv(files['gdp'], BUNDLED_COUNTRIES * scale, num_indicators=num_indicators,
+                  seed=seed, countries=countries)
+    return files
+
+
+def main(argv=None):
+    """
+    Writes the synthetic inputs as the command line argv asks.
+    """
+    parser = argparse.ArgumentParser(description='Write synthetic input files.')
+    parser.add_argument('directory', help='directory to write the files to')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='multiple of the bundled file sizes (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED,
+                        help='seed of the random numbers (default: %(default)s)')
+    parser.add_argument('--indicators', type=int, default=1,
+                        help='indicator rows per country of the GDP table (default: %(default)s)')
+    args = parser.parse_args(argv)
+    for name in write_inputs(args.directory, args.scale, args.seed,
+                             num_indicators=args.indicators).values():
+        print('Wrote', name)
+
+
+if __name__ == '__main__':
+    main()
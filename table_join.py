@@ -0,0 +1,272 @@
+"""
+Hash joins of tables stored as nested lists (one list per row), such as
+those returned by read_csv_file.
+
+The right table is indexed once by its key columns in a dictionary, so a
+join costs O(n + m) rather than the O(n * m) of scanning a list for
+every row.  Keys present in only one of the tables (the anti-joins) are
+reported as sets instead of being printed row by row.
+
+Rows are never copied while joining.  A KeyedTable keeps a reference to
+each row and hands out RowViews that hide the key columns, and a
+JoinResult only records which rows pair up; joined rows are built one at
+a time when the result is iterated, e.g. by csv_writer.writerows().
+"""
+
+from collections.abc import Sequence
+
+
+# Join modes
+INNER = 'inner'     # rows whose key is in both tables
+LEFT = 'left'       # every left row, plus matching right columns if any
+RIGHT = 'right'     # every right row, plus matching left columns if any
+OUTER = 'outer'     # every row of both tables
+
+
+def key_columns(key_col):
+    """
+    Input:
+      key_col - a column index or a tuple of column indices
+    Output:
+      Returns the key columns as a tuple of column indices.
+    """
+    if isinstance(key_col, int):
+        return (key_col,)
+    return tuple(key_col)
+
+
+def make_key_function(key_col):
+    """
+    Input:
+      key_col - a column index or a tuple of column indices
+    Output:
+      Returns a function that takes a row and returns its key: the entry
+      in the key column for a single column, else a tuple of entries.
+    """
+    cols = key_columns(key_col)
+    if len(cols) == 1:
+        col = cols[0]
+        return lambda row: row[col]
+    return lambda row: tuple(row[col] for col in cols)
+
+
+def index_table(table, key_col):
+    """
+    Inputs:
+      table   - nested list, each list a row
+      key_col - a column index or a tuple of column indices
+    Output:
+      Returns a dictionary mapping each key to the list of indices of
+      the rows having that key, in table order.
+    """
+    row_key = make_key_function(key_col)
+    index = {}
+    for row_idx, row in enumerate(table):
+        index.setdefault(row_key(row), []).append(row_idx)
+    return index
+
+
+def table_width(table, key_cols):
+    """
+    Inputs:
+      table    - nested list, each list a row
+      key_cols - tuple of key column indices of table
+    Output:
+      Returns the number of columns of the first row (the header of a
+      CSV file), or for an empty table just enough columns to hold the
+      key columns.
+    """
+    if table:
+        return len(table[0])
+    return max(key_cols) + 1
+
+
+class RowView(Sequence):
+    """
+    Read-only view of a row with its key columns left out.  The row
+    itself is not copied.
+    """
+    __slots__ = ('_row', '_cols')
+
+    def __init__(self, row, cols):
+        self._row = row
+        self._cols = cols
+
+    def __len__(self):
+        return len(self._cols)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._row[col] for col in self._cols[idx]]
+        return self._row[self._cols[idx]]
+
+    def __iter__(self):
+        row = self._row
+        return (row[col] for col in self._cols)
+
+    def __eq__(self, other):
+        return isinstance(other, Sequence) and list(self) == list(other)
+
+    def __repr__(self):
+        return 'RowView({!r})'.format(list(self))
+
+
+class KeyedTable:
+    """
+    A table indexed by its key columns.  Looking up a key returns a
+    RowView of the matching row without its key columns, like the lists
+    held in the dictionary returned by make_dict, but without copying
+    the row.
+
+    The index is built with index_table unless the index (or the part of
+    it that will be looked up) is passed in.
+    """
+
+    def __init__(self, table, key_col, index=None):
+        self.table = table
+        self.key_cols = key_columns(key_col)
+        self.index = index_table(table, key_col) if index is None else index
+        width = len(table[0]) if table else 0
+        self.value_cols = tuple(col for col in range(width) if col not in self.key_cols)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __getitem__(self, key):
+        """
+        Returns a view of the last row with the given key, as make_dict
+        keeps the last of several rows sharing a key.
+        """
+        return self.view(self.index[key][-1])
+
+    def view(self, row_idx):
+        """
+        Input:
+          row_idx - index of a row of the table
+        Output:
+          Returns a RowView of that row without its key columns.
+        """
+        return RowView(self.table[row_idx], self.value_cols)
+
+
+class JoinResult:
+    """
+    The result of hash_join.
+
+    Attributes:
+      pairs           - list of (left row index, right row index) pairs,
+                        one per joined row, with None for a missing row
+      left_unmatched  - set of keys of the left table not found in the right table
+      right_unmatched - set of keys of the right table not found in the left table
+      left_width      - number of left columns of the rows having no left row
+
+    Iterating over a JoinResult builds the joined rows one at a time.
+    """
+
+    def __init__(self, left_table, right, left_cols, pairs, left_unmatched,
+                 right_unmatched, fill, left_width):
+        self.left_table = left_table
+        self.right = right
+        self.left_cols = left_cols
+        self.pairs = pairs
+        self.left_unmatched = left_unmatched
+        self.right_unmatched = right_unmatched
+        self.fill = fill
+        self.left_width = left_width
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __iter__(self):
+        for left_idx, right_idx in self.pairs:
+            yield self.build_row(left_idx, right_idx)
+
+    def build_row(self, left_idx, right_idx):
+        """
+        Inputs:
+          left_idx  - index of a left row, or None
+          right_idx - index of a right row, or None
+        Output:
+          Returns the joined row for one of the pairs as a new list.
+        """
+        if left_idx is None:
+            # Right row only - its key goes in the left key columns
+            row = [self.fill] * self.left_width
+            right_row = self.right.table[right_idx]
+            for left_col, right_col in zip(self.left_cols, self.right.key_cols):
+                row[left_col] = right_row[right_col]
+        else:
+            row = list(self.left_table[left_idx])
+        if right_idx is None:
+            row.extend([self.fill] * len(self.right.value_cols))
+        else:
+            row.extend(self.right.view(right_idx))
+        return row
+
+    @property
+    def rows(self):
+        """
+        Returns the joined rows as a new nested list.
+        """
+        return list(self)
+
+
+def hash_join(left_table, right_table, left_key, right_key, how=INNER, fill='', last=False):
+    """
+    Inputs:
+      left_table  - nested list, each list a row
+      right_table - nested list, each list a row
+      left_key    - key column (or tuple of columns) of left_table
+      right_key   - key column (or tuple of columns) of right_table
+      how         - INNER, LEFT, RIGHT or OUTER
+      fill        - value used for the columns of a missing row
+      last        - if True, only the last right row of each key is
+                    joined, as make_dict keeps the last row of a key
+    Output:
+      Returns a JoinResult.  Each joined row consists of the left row
+      followed by the right row with its key columns removed, as
+      merge_csv_files builds them.  Unless last is True, a key that
+      occurs several times in both tables produces one row per pair.
+      Rows appear in left table
+      order, followed by any unmatched right rows in right table order.
+    """
+    if how not in (INNER, LEFT, RIGHT, OUTER):
+        raise ValueError('unknown join mode: {!r}'.format(how))
+
+    left_cols = key_columns(left_key)
+    if len(left_cols) != len(key_columns(right_key)):
+        raise ValueError('left and right keys have different numbers of columns')
+    left_row_key = make_key_function(left_key)
+    right = KeyedTable(right_table, right_key)
+    if last:
+        right_rows = {key: right_rows[-1:] for key, right_rows in right.index.items()}
+    else:
+        right_rows = right.index
+
+    pairs = []
+    left_keys = set()
+    left_unmatched = set()
+    for left_idx, left_row in enumerate(left_table):
+        key = left_row_key(left_row)
+        left_keys.add(key)
+        if key in right_rows:
+            pairs.extend((left_idx, right_idx) for right_idx in right_rows[key])
+        else:
+            left_unmatched.add(key)
+            if how in (LEFT, OUTER):
+                pairs.append((left_idx, None))
+
+    right_unmatched = {key for key in right_rows if key not in left_keys}
+    if how in (RIGHT, OUTER):
+        for key, key_rows in right_rows.items():
+            if key in right_unmatched:
+                pairs.extend((None, right_idx) for right_idx in key_rows)
+
+    return JoinResult(left_table, right, left_cols, pairs, left_unmatched,
+                      right_unmatched, fill, table_width(left_table, left_cols))
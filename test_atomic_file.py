@@ -0,0 +1,59 @@
+"""
+Tests of atomic_file and of the writers built on it.
+"""
+
+import os
+
+import pytest
+
+import atomic_file
+import bulk_csv
+
+
+def write_old_file(directory):
+    """
+    Writes a file holding 'old' and returns its name.
+    """
+    file_name = os.path.join(str(directory), 'output.csv')
+    with open(file_name, 'w') as old_file:
+        old_file.write('old\n')
+    return file_name
+
+
+def check_unchanged(directory, file_name):
+    """
+    Checks that file_name still holds 'old' and that no temporary file
+    is left in directory.
+    """
+    with open(file_name) as old_file:
+        assert old_file.read() == 'old\n'
+    assert os.listdir(str(directory)) == [os.path.basename(file_name)]
+
+
+def test_failed_write_keeps_old_file(tmp_path):
+    file_name = write_old_file(tmp_path)
+    with pytest.raises(RuntimeError):
+        with atomic_file.atomic_write(file_name) as new_file:
+            new_file.write('new\n')
+            raise RuntimeError('failed mid-write')
+    check_unchanged(tmp_path, file_name)
+
+
+def test_failed_csv_write_keeps_old_file(tmp_path):
+    file_name = write_old_file(tmp_path)
+    for compress in [False, True]:
+        with pytest.raises(RuntimeError):
+            with bulk_csv.open_csv(file_name, compress=compress) as csv_writer:
+                csv_writer.writerows([['01001', 1.5]] * 10)
+                raise RuntimeError('failed mid-write')
+        check_unchanged(tmp_path, file_name)
+
+
+def test_write_replaces_file(tmp_path):
+    file_name = write_old_file(tmp_path)
+    with atomic_file.atomic_write(file_name, 'wb') as new_file:
+        new_file.write(b'new\n')
+        assert os.path.exists(atomic_file.temp_name(file_name))
+    with open(file_name, 'rb') as new_file:
+        assert new_file.read() == b'new\n'
+    assert os.listdir(str(tmp_path)) == ['output.csv']
@@ -0,0 +1,77 @@
+"""
+Tests of bulk_csv against rows written one at a time by csv.writer.
+"""
+
+import csv
+import gzip
+import os
+
+import numpy as np
+
+import bulk_csv
+
+
+ROWS = [['01001', 73.85184749491232, 264.844022996094],
+        ['02013', 0.1 + 0.2, -1e-300],
+        ['with,comma', 'with "quote"', ''],
+        ['01003', 5, float('nan')]]
+
+
+def write_reference(file_name, rows):
+    """
+    Writes rows one writerow call at a time, as the course scripts did.
+    """
+    with open(file_name, 'w', newline='') as csv_file:
+        csv_writer = csv.writer(csv_file, delimiter=',', quoting=csv.QUOTE_MINIMAL)
+        for row in rows:
+            csv_writer.writerow(row)
+
+
+def read_bytes(file_name):
+    """
+    Returns the contents of a file.
+    """
+    with open(file_name, 'rb') as data_file:
+        return data_file.read()
+
+
+def test_rows_identical_to_writerow(tmp_path):
+    reference_name = os.path.join(str(tmp_path), 'reference.csv')
+    file_name = os.path.join(str(tmp_path), 'bulk.csv')
+    write_reference(reference_name, ROWS)
+    assert bulk_csv.write_rows(ROWS, file_name) == len(ROWS)
+    assert read_bytes(file_name) == read_bytes(reference_name)
+
+
+def test_float_columns_identical_to_writerow(tmp_path):
+    # Floats are written at repr precision, so they read back identical
+    values = np.random.default_rng(0).normal(size=(2, 5000)) * 1e3
+    ids = ['{:05d}'.format(idx) for idx in range(5000)]
+    reference_name = os.path.join(str(tmp_path), 'reference.csv')
+    file_name = os.path.join(str(tmp_path), 'bulk.csv')
+    write_reference(reference_name, zip(ids, values[0].tolist(), values[1].tolist()))
+    bulk_csv.write_columns([ids, values[0], values[1]], file_name)
+    assert read_bytes(file_name) == read_bytes(reference_name)
+    with open(file_name, newline='') as csv_file:
+        read_values = np.array([row[1:] for row in csv.reader(csv_file)], dtype=np.float64)
+    assert np.array_equal(read_values, values.T)
+
+
+def test_float_precision(tmp_path):
+    file_name = os.path.join(str(tmp_path), 'rounded.csv')
+    bulk_csv.write_columns([['a', 'b'], np.array([1.23456, 2.0])], file_name, float_precision=2)
+    assert read_bytes(file_name) == b'a,1.23\r\nb,2.00\r\n'
+    bulk_csv.write_rows([['a', 1.23456, 7]], file_name, float_precision=2)
+    assert read_bytes(file_name) == b'a,1.23,7\r\n'
+
+
+def test_gzip_is_deterministic(tmp_path):
+    plain_name = os.path.join(str(tmp_path), 'rows.csv')
+    bulk_csv.write_rows(ROWS, plain_name)
+    first_name = os.path.join(str(tmp_path), 'first', 'rows.csv.gz')
+    second_name = os.path.join(str(tmp_path), 'second', 'rows.csv.gz')
+    for file_name in [first_name, second_name]:
+        os.makedirs(os.path.dirname(file_name))
+        bulk_csv.write_rows(ROWS, file_name)
+    assert read_bytes(first_name) == read_bytes(second_name)
+    assert gzip.decompress(read_bytes(first_name)) == read_bytes(plain_name)
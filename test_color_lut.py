@@ -0,0 +1,40 @@
+"""
+Tests of color_lut.
+"""
+
+import numpy as np
+import matplotlib as mpl
+
+import color_lut
+
+
+def test_nan_leaves_table_unchanged():
+    lut = color_lut.ColorLUT('viridis', 0.0, 1.0)
+    first_color = lut(0.0)
+    assert lut(np.nan) == tuple(lut.bad)
+    assert lut(0.0) == first_color
+
+
+def test_colors_identical_to_to_rgba():
+    # With one bin per colormap color the table is the colormap's own
+    colormap = mpl.colormaps['jet']
+    lut = color_lut.ColorLUT(colormap, -2.0, 3.0, bins=colormap.N)
+    values = np.random.default_rng(0).uniform(-2.0, 3.0, size=1000)
+    mappable = mpl.cm.ScalarMappable(mpl.colors.Normalize(-2.0, 3.0), colormap)
+    assert np.array_equal(lut(values), mappable.to_rgba(values))
+
+
+def test_out_of_range_values():
+    lut = color_lut.ColorLUT('viridis', 0.0, 1.0)
+    assert lut(-5.0) == lut(0.0)
+    assert lut(5.0) == lut(1.0)
+    unclamped = color_lut.ColorLUT('viridis', 0.0, 1.0, clamp=False)
+    assert unclamped(5.0) == tuple(unclamped.bad)
+
+
+def test_transform_and_hex():
+    lut = color_lut.ColorLUT('viridis', 1.0, 3.0, transform=np.log10)
+    assert list(lut(100.0)) == lut(np.array([100.0]))[0].tolist()
+    hex_colors = lut.to_hex([10.0, 1000.0, np.nan])
+    assert hex_colors == [mpl.colors.to_hex(lut(10.0)), mpl.colors.to_hex(lut(1000.0)),
+                          mpl.colors.to_hex(lut.bad)]
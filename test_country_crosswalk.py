@@ -0,0 +1,66 @@
+"""
+Tests of country_crosswalk for codes shared by several countries.
+"""
+
+import os
+
+import country_crosswalk
+
+
+CODE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         '04.04 Project_Plotting GDP Data on a World Map - Part 2',
+                         'isp_country_codes.csv')
+
+# FIPS NL is shared by the Caribbean Netherlands and the Netherlands,
+# which come later in the file
+DUPLICATE_ROWS = ['Name,ISO3166-1-Alpha-3,FIPS,ITU',
+                  'Caribbean Netherlands,BES,NL,ATN',
+                  'Netherlands,NLD,NL,HOL',
+                  'Norway,NOR,NO,NOR',
+                  'Svalbard & Jan Mayen,SJM,,NOR']
+
+
+def write_code_file(directory):
+    """
+    Writes the code table of DUPLICATE_ROWS and returns its name.
+    """
+    file_name = os.path.join(str(directory), 'codes.csv')
+    with open(file_name, 'w', newline='') as csv_file:
+        csv_file.write('\n'.join(DUPLICATE_ROWS) + '\n')
+    return file_name
+
+
+def test_index_codes_keeps_last_row():
+    assert country_crosswalk.index_codes(['NL', 'nl', '', 'NO']) == {'nl': 1, 'no': 3}
+
+
+def test_duplicate_code_converts_as_last_country(tmp_path):
+    crosswalk = country_crosswalk.read_crosswalk(write_code_file(tmp_path))
+    assert crosswalk.convert('nl', 'FIPS', 'ISO3166-1-Alpha-3') == 'NLD'
+    assert crosswalk.convert('NOR', 'ITU', 'ISO3166-1-Alpha-3') == 'SJM'
+    # The last country with a shared code may have no code to convert to
+    assert crosswalk.convert('nor', 'ITU', 'FIPS') is None
+
+
+def test_converter_agrees_with_mapping(tmp_path):
+    crosswalk = country_crosswalk.read_crosswalk(write_code_file(tmp_path))
+    mapping = crosswalk.mapping('FIPS', 'ISO3166-1-Alpha-3')
+    converter = crosswalk.converter('FIPS', 'ISO3166-1-Alpha-3')
+    assert converter == {code.casefold(): to_code for code, to_code in mapping.items() if code}
+
+
+def test_saved_crosswalk_keeps_last_row(tmp_path):
+    code_file_name = write_code_file(tmp_path)
+    index_file_name = os.path.join(str(tmp_path), 'codes.json')
+    country_crosswalk.load_crosswalk(code_file_name, index_file_name=index_file_name, cache=None)
+    crosswalk = country_crosswalk.open_crosswalk(index_file_name, code_file_name,
+                                                 [',', '"', None])
+    assert crosswalk is not None
+    assert crosswalk.convert('NL', 'FIPS', 'ISO3166-1-Alpha-3') == 'NLD'
+
+
+def test_bundled_code_table():
+    crosswalk = country_crosswalk.read_crosswalk(CODE_FILE, columns=['FIPS', 'ITU',
+                                                                     'ISO3166-1-Alpha-3'])
+    assert crosswalk.convert('NL', 'FIPS', 'ISO3166-1-Alpha-3') == 'NLD'
+    assert crosswalk.convert('NOR', 'ITU', 'ISO3166-1-Alpha-3') == 'SJM'
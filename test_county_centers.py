@@ -0,0 +1,55 @@
+"""
+Tests of the county centers written by the 02.06 solution script.
+"""
+
+import csv
+import importlib.util
+import os
+
+import synthetic_data
+
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_FILE = os.path.join(PACKAGE_DIR,
+                           '02.06_Practice_Project_Extracting_Data_from_an_SVG_File_solution.py')
+SVG_FILE = os.path.join(PACKAGE_DIR, 'USA_Counties_2014.svg')
+CENTERS_FILE = os.path.join(PACKAGE_DIR, 'USA_Counties_with_FIPS_and_centers.csv')
+
+
+def load_script():
+    """
+    Imports the 02.06 solution script and returns it.
+    """
+    spec = importlib.util.spec_from_file_location('svg_solution', SCRIPT_FILE)
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+    return script
+
+
+def read_rows(file_name):
+    """
+    Returns the rows of a CSV file as lists of strings.
+    """
+    with open(file_name, newline='') as csv_file:
+        return list(csv.reader(csv_file))
+
+
+def test_centers_match_bundled_file(tmp_path):
+    script = load_script()
+    bundled_rows = read_rows(CENTERS_FILE)
+    for processes, chunk_size in [(1, 100), (2, 37)]:
+        csv_file_name = os.path.join(str(tmp_path), 'centers_{}.csv'.format(processes))
+        script.process_county_attributes(SVG_FILE, csv_file_name, processes=processes,
+                                         chunk_size=chunk_size)
+        assert read_rows(csv_file_name) == bundled_rows
+
+
+def test_synthetic_centers_match_pipeline(tmp_path):
+    script = load_script()
+    names = {key: os.path.join(str(tmp_path), name)
+             for key, name in synthetic_data.INPUT_NAMES.items()}
+    synthetic_data.write_county_files(names['svg'], names['centers'], names['risk'],
+                                      num_counties=50, num_risk_rows=60)
+    csv_file_name = os.path.join(str(tmp_path), 'computed.csv')
+    script.process_county_attributes(names['svg'], csv_file_name)
+    assert read_rows(csv_file_name) == read_rows(names['centers'])
@@ -0,0 +1,88 @@
+"""
+Tests of gdp_table on small GDP files.
+"""
+
+import math
+import os
+
+import gdp_table
+import parse_cache
+
+
+GDP_ROWS = ['Country Name,Country Code,1960,1961,1962',
+            'Aruba,ABW,1.5,,2.5',
+            'Andorra,AND,3.5,4.5']
+
+
+def write_gdp_file(directory, rows=GDP_ROWS):
+    """
+    Writes a GDP file of the given rows and returns its gdpinfo.
+    """
+    file_name = os.path.join(str(directory), 'gdp.csv')
+    with open(file_name, 'w', newline='') as csv_file:
+        csv_file.write('\n'.join(rows) + '\n')
+    return {'gdpfile': file_name,
+            'separator': ',',
+            'quote': '"',
+            'country_name': 'Country Name',
+            'country_code': 'Country Code'}
+
+
+def test_file_without_code_column(tmp_path):
+    rows = [row.replace(',ABW', '').replace(',AND', '').replace(',Country Code', '')
+            for row in GDP_ROWS]
+    gdpinfo = write_gdp_file(tmp_path, rows)
+    table = gdp_table.load_gdp_table(gdpinfo, ('country_name',), cache=None)
+    assert table.index('Country Name') == {'Aruba': 0, 'Andorra': 1}
+    assert table.years == [1960, 1961, 1962]
+
+
+def test_keys_are_part_of_cache_key(tmp_path):
+    gdpinfo = write_gdp_file(tmp_path)
+    cache = parse_cache.ParseCache()
+    by_name = gdp_table.load_gdp_table(gdpinfo, ('country_name',), cache=cache)
+    by_code = gdp_table.load_gdp_table(gdpinfo, ('country_code',), cache=cache)
+    assert by_name is not by_code
+    assert list(by_code.keys) == ['Country Code']
+    assert gdp_table.load_gdp_table(gdpinfo, ('country_name',), cache=cache) is by_name
+
+
+def test_blank_and_short_rows_are_nan(tmp_path):
+    table = gdp_table.load_gdp_table(write_gdp_file(tmp_path), ('country_name',), cache=None)
+    assert table.values.shape == (2, 3)
+    assert table.values[0, 0] == 1.5 and math.isnan(table.values[0, 1])
+    # Andorra's row has no 1962 cell at all
+    assert math.isnan(table.values[1, 2])
+    assert not table.values.flags.writeable
+
+
+def test_values_identical_to_float():
+    for cell in ['12345678901234.5', '1.1', '3e-7', '0.30000000000000004']:
+        assert gdp_table.parse_cell(cell) == float(cell)
+    assert math.isnan(gdp_table.parse_cell('..'))
+
+
+def test_plot_values(tmp_path):
+    table = gdp_table.load_gdp_table(write_gdp_file(tmp_path), ('country_name',), cache=None)
+    row = table.row('Country Name', 'Aruba')
+    assert table.plot_values(row, 1960, 1962) == [(1960, 1.5), (1962, 2.5)]
+    assert table.plot_values(row, '1961', '1962') == [(1962, 2.5)]
+    assert table.row('Country Name', 'Atlantis') is None
+
+
+def test_build_map_dicts(tmp_path):
+    table = gdp_table.load_gdp_table(write_gdp_file(tmp_path), ('country_code',), cache=None)
+    reconciled = ({'aw': 'ABW', 'ad': 'AND'}, {'xx'})
+    map_dicts = gdp_table.build_map_dicts(table, 'Country Code', reconciled, ['1961', '1999'])
+    assert map_dicts['1961'] == ({'ad': math.log10(4.5)}, {'xx'}, {'aw'})
+    assert map_dicts['1999'] == ({}, {'xx'}, {'aw', 'ad'})
+
+
+def test_edited_file_is_read_again(tmp_path):
+    gdpinfo = write_gdp_file(tmp_path)
+    cache = parse_cache.ParseCache()
+    table = gdp_table.load_gdp_table(gdpinfo, ('country_name',), cache=cache)
+    write_gdp_file(tmp_path, GDP_ROWS + ['Angola,AGO,5.5,6.5,7.5'])
+    edited = gdp_table.load_gdp_table(gdpinfo, ('country_name',), cache=cache)
+    assert edited is not table
+    assert len(edited) == 3
@@ -0,0 +1,134 @@
+"""
+Tests of incremental_join against full joins with table_join.
+"""
+
+import csv
+import io
+import json
+import os
+
+import incremental_join
+import table_join
+
+
+LEFT_TABLE = [['Autauga', 'AL', '01001', '6.0E-05'],
+              ['Baldwin', 'AL', '01003', '6.1E-05'],
+              ['Barbour', 'AL', '01005', '6.2E-05'],
+              ['Bibb', 'AL', '01007', '6.3E-05'],
+              ['Blount', 'AL', '01009', '6.4E-05']]
+
+RIGHT_TABLE = [['01001', '1.5', '2.5'],
+               ['01003', '3.5', '4.5'],
+               ['01007', '5.5', '6.5'],
+               ['01009', '7.5', '8.5'],
+               ['01011', '9.5', '10.5']]
+
+
+def joined_text(left_table, right_table, how):
+    """
+    Returns the CSV text of a full join of the tables.
+    """
+    output = io.StringIO(newline='')
+    csv_writer = csv.writer(output, delimiter=',', quoting=csv.QUOTE_MINIMAL)
+    csv_writer.writerows(table_join.hash_join(left_table, right_table, 2, 0, how=how))
+    return output.getvalue()
+
+
+def read_text(file_name):
+    """
+    Returns the whole text of a file.
+    """
+    with open(file_name, newline='') as text_file:
+        return text_file.read()
+
+
+def read_manifest(output_file):
+    """
+    Returns the header and body of the manifest of output_file.
+    """
+    with open(incremental_join.manifest_name(output_file), encoding='utf-8') as manifest_file:
+        return json.loads(manifest_file.readline()), json.loads(manifest_file.readline())
+
+
+def check_update(left_table, right_table, output_file, how=table_join.OUTER):
+    """
+    Updates the join of the tables in output_file, checks the file and
+    its manifest against a full join and returns the JoinUpdate.
+    """
+    update = incremental_join.update_join(left_table, right_table, 2, 0, output_file, how=how)
+    assert read_text(output_file) == joined_text(left_table, right_table, how)
+    full_join = table_join.hash_join(left_table, right_table, 2, 0, how=how)
+    assert update.num_rows == len(full_join)
+    assert update.left_unmatched == full_join.left_unmatched
+    assert update.right_unmatched == full_join.right_unmatched
+
+    header, body = read_manifest(output_file)
+    assert header['rows'] == update.num_rows
+    assert header['stamp'] == [os.path.getsize(output_file), os.stat(output_file).st_mtime_ns]
+    assert body['left_keys'] == [row[2] for row in left_table]
+    assert body['right_keys'] == [row[0] for row in right_table]
+    assert body['left_hashes'] == [incremental_join.row_hash(row) for row in left_table]
+    assert sum(body['left_lengths']) + sum(body['right_only_lengths']) == len(read_text(output_file))
+    return update
+
+
+def test_first_update_is_full(tmp_path):
+    output_file = os.path.join(str(tmp_path), 'joined.csv')
+    update = check_update(LEFT_TABLE, RIGHT_TABLE, output_file)
+    assert update.full and update.rewritten
+    header, body = read_manifest(output_file)
+    assert body['right_only_keys'] == ['01011']
+
+
+def test_unchanged_tables_are_not_rewritten(tmp_path):
+    output_file = os.path.join(str(tmp_path), 'joined.csv')
+    check_update(LEFT_TABLE, RIGHT_TABLE, output_file)
+    update = check_update(LEFT_TABLE, RIGHT_TABLE, output_file)
+    assert not update.rewritten
+    assert update.changed == set()
+
+
+def test_edit_add_and_delete_rows(tmp_path):
+    output_file = os.path.join(str(tmp_path), 'joined.csv')
+    check_update(LEFT_TABLE, RIGHT_TABLE, output_file)
+
+    # Edit a left row
+    left_table = [list(row) for row in LEFT_TABLE]
+    left_table[1][3] = '9.9E-05'
+    update = check_update(left_table, RIGHT_TABLE, output_file)
+    assert not update.full
+    assert update.modified == {'01003'}
+    assert update.added == update.removed == set()
+
+    # Add a left row matching the right-only key, and delete another one
+    left_table.append(['Butler', 'AL', '01011', '6.5E-05'])
+    del left_table[3]
+    update = check_update(left_table, RIGHT_TABLE, output_file)
+    assert update.added == {'01011'}
+    assert update.removed == {'01007'}
+
+    # Edit, add and delete right rows
+    right_table = [list(row) for row in RIGHT_TABLE]
+    right_table[0][1] = '0.5'
+    right_table.append(['01013', '11.5', '12.5'])
+    del right_table[1]
+    update = check_update(left_table, right_table, output_file)
+    assert update.modified == {'01001'}
+    assert update.added == {'01013'}
+    assert update.removed == {'01003'}
+
+
+def test_edited_output_file_forces_full_join(tmp_path):
+    output_file = os.path.join(str(tmp_path), 'joined.csv')
+    check_update(LEFT_TABLE, RIGHT_TABLE, output_file)
+    with open(output_file, 'a', newline='') as csv_file:
+        csv_file.write('extra,row\r\n')
+    left_table = LEFT_TABLE[:-1]
+    assert check_update(left_table, RIGHT_TABLE, output_file).full
+
+
+def test_join_modes(tmp_path):
+    for how in [table_join.INNER, table_join.LEFT, table_join.RIGHT, table_join.OUTER]:
+        output_file = os.path.join(str(tmp_path), '{}.csv'.format(how))
+        check_update(LEFT_TABLE, RIGHT_TABLE, output_file, how=how)
+        check_update(LEFT_TABLE[1:], RIGHT_TABLE[:-1], output_file, how=how)
@@ -0,0 +1,87 @@
+"""
+Tests of parse_cache invalidation when a file changes.
+"""
+
+import os
+
+import parse_cache
+
+
+def write_file(directory, text, name='data.csv'):
+    """
+    Writes text to a file and returns its name.
+    """
+    file_name = os.path.join(str(directory), name)
+    with open(file_name, 'w') as data_file:
+        data_file.write(text)
+    return file_name
+
+
+def read_lines(file_name, *options):
+    """
+    Loader returning the lines of a file and the options it was given.
+    """
+    with open(file_name) as data_file:
+        return data_file.read().splitlines(), options
+
+
+def test_unchanged_file_is_parsed_once(tmp_path):
+    file_name = write_file(tmp_path, 'a\nb\n')
+    cache = parse_cache.ParseCache()
+    first = cache.get(file_name, read_lines)
+    assert cache.get(file_name, read_lines) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_size_change_invalidates(tmp_path):
+    file_name = write_file(tmp_path, 'a\nb\n')
+    cache = parse_cache.ParseCache()
+    stat = os.stat(file_name)
+    cache.get(file_name, read_lines)
+    write_file(tmp_path, 'a\nb\nc\n')
+    # Keep the old modification time, so only the size tells the versions apart
+    os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.get(file_name, read_lines)[0] == ['a', 'b', 'c']
+    assert cache.misses == 2
+
+
+def test_mtime_change_invalidates(tmp_path):
+    file_name = write_file(tmp_path, 'a\nb\n')
+    cache = parse_cache.ParseCache()
+    stat = os.stat(file_name)
+    cache.get(file_name, read_lines)
+    # Same size, new contents and modification time
+    write_file(tmp_path, 'c\nd\n')
+    os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+    assert cache.get(file_name, read_lines)[0] == ['c', 'd']
+    assert cache.misses == 2
+
+
+def test_options_are_part_of_key(tmp_path):
+    file_name = write_file(tmp_path, 'a\n')
+    cache = parse_cache.ParseCache()
+    assert cache.get(file_name, read_lines, ',')[1] == (',',)
+    assert cache.get(file_name, read_lines, ';')[1] == (';',)
+    assert cache.misses == 2
+
+
+def test_least_recently_used_entry_is_dropped(tmp_path):
+    names = [write_file(tmp_path, name, name) for name in ['a', 'b', 'c']]
+    cache = parse_cache.ParseCache(maxsize=2)
+    cache.get(names[0], read_lines)
+    cache.get(names[1], read_lines)
+    cache.get(names[0], read_lines)
+    cache.get(names[2], read_lines)
+    assert len(cache) == 2
+    cache.get(names[0], read_lines)
+    cache.get(names[1], read_lines)
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_invalidate_drops_every_option(tmp_path):
+    file_name = write_file(tmp_path, 'a\n')
+    cache = parse_cache.ParseCache()
+    cache.get(file_name, read_lines, ',')
+    cache.get(file_name, read_lines, ';')
+    cache.invalidate(file_name)
+    assert len(cache) == 0
@@ -0,0 +1,53 @@
+"""
+Tests of render_pool on small charts.
+"""
+
+import os
+
+import pytest
+
+import render_pool
+
+
+XY_SPEC = {'type': 'xy',
+           'title': 'GDP',
+           'series': [('Aruba', [(1960, 1.5), (1961, 2.5)])]}
+WORLD_SPEC = {'type': 'world',
+              'title': 'GDP in 1960',
+              'series': [('GDP', {'aw': 1.5, 'ad': 2.5})]}
+
+
+def read_bytes(file_name):
+    """
+    Returns the contents of a file.
+    """
+    with open(file_name, 'rb') as data_file:
+        return data_file.read()
+
+
+def test_file_holds_returned_bytes(tmp_path):
+    map_file = os.path.join(str(tmp_path), 'xy.svg')
+    svg_bytes = render_pool.output_chart(render_pool.build_chart(XY_SPEC), map_file)
+    assert svg_bytes.startswith(b'<?xml')
+    assert read_bytes(map_file) == svg_bytes
+
+
+def test_bytes_mode_writes_nothing(tmp_path):
+    svg_bytes = render_pool.output_chart(render_pool.build_chart(WORLD_SPEC),
+                                         mode=render_pool.RENDER_BYTES)
+    assert b'GDP in 1960' in svg_bytes
+    assert os.listdir(str(tmp_path)) == []
+    with pytest.raises(ValueError):
+        render_pool.output_chart(render_pool.build_chart(XY_SPEC), mode='paper')
+
+
+def test_errors_are_reported_per_job(tmp_path):
+    jobs = [(XY_SPEC, os.path.join(str(tmp_path), 'xy.svg')),
+            ({'type': 'pie', 'series': []}, os.path.join(str(tmp_path), 'pie.svg')),
+            (WORLD_SPEC, os.path.join(str(tmp_path), 'world.svg'))]
+    for processes in [1, 2]:
+        results = render_pool.render_charts(jobs, processes=processes)
+        assert [result.map_file for result in results] == [map_file for _, map_file in jobs]
+        assert results[0].error is None and results[2].error is None
+        assert results[1].error.startswith('KeyError')
+        assert sorted(os.listdir(str(tmp_path))) == ['world.svg', 'xy.svg']
@@ -0,0 +1,92 @@
+"""
+Tests of svg_paths against the path code of the 02.06 solution script.
+"""
+
+import importlib.util
+import math
+import os
+
+import numpy as np
+
+import svg_paths
+
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_FILE = os.path.join(PACKAGE_DIR,
+                           '02.06_Practice_Project_Extracting_Data_from_an_SVG_File_solution.py')
+SVG_FILE = os.path.join(PACKAGE_DIR, 'USA_Counties_2014.svg')
+
+SQUARE = 'M 0,0 L 4,0 L 4,4 L 0,4 L 0,0'
+# A square with a square hole wound the other way
+SQUARE_WITH_HOLE = SQUARE + ' M 1,1 L 1,2 L 2,2 L 2,1 L 1,1 z'
+
+SMALL_SVG = '''<?xml version="1.0"?>
+<svg xmlns="http://www.w3.org/2000/svg">
+  <g id="counties">
+    <path id="01001" d="M 0,0 L 1,0 L 1,1 L 0,0" />
+    <g><path id="01003" d="M 2,2 L 3,2 L 3,3 L 2,2" /></g>
+    <rect id="not-a-path" />
+  </g>
+  <path d="M 5,5 L 6,5" />
+</svg>
+'''
+
+
+def load_script():
+    """
+    Imports the 02.06 solution script and returns it.
+    """
+    spec = importlib.util.spec_from_file_location('svg_solution', SCRIPT_FILE)
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+    return script
+
+
+def test_iter_path_attributes(tmp_path):
+    svg_file_name = os.path.join(str(tmp_path), 'small.svg')
+    with open(svg_file_name, 'w') as svg_file:
+        svg_file.write(SMALL_SVG)
+    assert list(svg_paths.iter_path_attributes(svg_file_name, ('id',))) == [
+        ('01001',), ('01003',), ('',)]
+
+
+def test_iter_chunks():
+    assert [len(chunk) for chunk in svg_paths.iter_chunks(range(10), 4)] == [4, 4, 2]
+    assert list(svg_paths.iter_chunks([], 4)) == []
+
+
+def test_parse_path_rings():
+    coords, ring_starts = svg_paths.parse_path_rings(SQUARE_WITH_HOLE)
+    assert coords.shape == (10, 2)
+    assert ring_starts.tolist() == [0, 5]
+
+
+def test_path_centers_identical_to_script():
+    # Float identity, not closeness: the centers file must not change
+    script = load_script()
+    attributes = list(svg_paths.iter_path_attributes(SVG_FILE))
+    for county_id, boundary in attributes:
+        center = script.compute_county_center(script.get_boundary_coordinates(boundary))
+        assert svg_paths.path_centers([(county_id, boundary)]) == [[county_id] + list(center)]
+
+
+def test_batched_centers_agree_with_path_centers():
+    attributes = list(svg_paths.iter_path_attributes(SVG_FILE))
+    centers = svg_paths.compute_centers([path_data for _, path_data in attributes])
+    expected = np.array([row[1:] for row in svg_paths.path_centers(attributes)])
+    assert np.allclose(centers, expected, rtol=1e-12, atol=0)
+
+
+def test_area_centers():
+    assert svg_paths.compute_center(SQUARE, svg_paths.AREA) == [2.0, 2.0]
+    # The hole pulls the center away from it
+    xcenter, ycenter = svg_paths.compute_center(SQUARE_WITH_HOLE, svg_paths.AREA)
+    assert xcenter == ycenter > 2.0
+    centers = svg_paths.compute_centers([SQUARE, SQUARE_WITH_HOLE], svg_paths.AREA)
+    assert np.allclose(centers, [[2.0, 2.0], [xcenter, ycenter]])
+
+
+def test_path_without_extent_has_nan_center():
+    centers = svg_paths.compute_centers([SQUARE, 'M 1,1'])
+    assert centers[0].tolist() == [2.0, 2.0]
+    assert all(math.isnan(value) for value in centers[1])
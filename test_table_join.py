@@ -0,0 +1,98 @@
+"""
+Tests of table_join for tables with missing rows.
+"""
+
+import table_join
+
+
+RIGHT_TABLE = [['01001', '0.5'],
+               ['01003', '0.7']]
+
+
+def test_empty_left_table_keeps_key_columns():
+    result = table_join.hash_join([], RIGHT_TABLE, 1, 0, how=table_join.OUTER)
+    assert result.rows == [['', '01001', '0.5'],
+                           ['', '01003', '0.7']]
+    assert result.right_unmatched == {'01001', '01003'}
+
+
+def test_right_only_rows_have_left_header_width():
+    # A short later row does not change the width of the left columns
+    left_table = [['Name', 'FIPS', 'State'],
+                  ['Autauga', '01001']]
+    result = table_join.hash_join(left_table, RIGHT_TABLE, 1, 0, how=table_join.RIGHT)
+    assert result.rows[-1] == ['', '01003', '', '0.7']
+
+
+LEFT_TABLE = [['Autauga', '01001'],
+              ['Baldwin', '01005']]
+
+
+def test_empty_right_table():
+    for how in [table_join.LEFT, table_join.OUTER]:
+        result = table_join.hash_join(LEFT_TABLE, [], 1, 0, how=how)
+        assert result.rows == [['Autauga', '01001'], ['Baldwin', '01005']]
+        assert result.left_unmatched == {'01001', '01005'}
+    assert table_join.hash_join(LEFT_TABLE, [], 1, 0, how=table_join.RIGHT).rows == []
+
+
+def test_empty_left_table():
+    assert table_join.hash_join([], RIGHT_TABLE, 1, 0, how=table_join.LEFT).rows == []
+    result = table_join.hash_join([], RIGHT_TABLE, 1, 0, how=table_join.RIGHT)
+    assert result.rows == [['', '01001', '0.5'], ['', '01003', '0.7']]
+
+
+def test_both_tables_empty():
+    for how in [table_join.INNER, table_join.LEFT, table_join.RIGHT, table_join.OUTER]:
+        result = table_join.hash_join([], [], 1, 0, how=how)
+        assert result.rows == []
+        assert result.left_unmatched == result.right_unmatched == set()
+
+
+def test_one_sided_rows():
+    # 01001 is in both tables, 01005 only on the left and 01003 only on the right
+    both = [['Autauga', '01001', '0.5']]
+    left_only = [['Baldwin', '01005', '']]
+    right_only = [['', '01003', '0.7']]
+    joins = {table_join.INNER: both,
+             table_join.LEFT: both + left_only,
+             table_join.RIGHT: both + right_only,
+             table_join.OUTER: both + left_only + right_only}
+    for how, rows in joins.items():
+        result = table_join.hash_join(LEFT_TABLE, RIGHT_TABLE, 1, 0, how=how)
+        assert result.rows == rows
+        assert result.left_unmatched == {'01005'}
+        assert result.right_unmatched == {'01003'}
+
+
+def test_last_join_matches_dictionary_join():
+    # As merge_csv_files joins through a dictionary keeping the last row of a key
+    right_table = RIGHT_TABLE + [['01001', '0.9']]
+    right_dict = {row[0]: row[1:] for row in right_table}
+    expected = [left_row + right_dict[left_row[1]] for left_row in LEFT_TABLE
+                if left_row[1] in right_dict]
+    result = table_join.hash_join(LEFT_TABLE, right_table, 1, 0, last=True)
+    assert result.rows == expected == [['Autauga', '01001', '0.9']]
+    # Without last, a repeated key gives one row per pair
+    assert len(table_join.hash_join(LEFT_TABLE, right_table, 1, 0)) == 2
+
+
+def test_multi_column_keys():
+    left_table = [['AL', 'Autauga', '1'], ['AL', 'Baldwin', '2']]
+    right_table = [['Autauga', 'AL', 'x'], ['Baldwin', 'AK', 'y']]
+    result = table_join.hash_join(left_table, right_table, (0, 1), (1, 0), how=table_join.OUTER)
+    assert result.rows == [['AL', 'Autauga', '1', 'x'],
+                           ['AL', 'Baldwin', '2', ''],
+                           ['AK', 'Baldwin', '', 'y']]
+    assert result.left_unmatched == {('AL', 'Baldwin')}
+
+
+def test_keyed_table_views():
+    keyed = table_join.KeyedTable([list(row) for row in RIGHT_TABLE] + [['01001', '0.9']], 0)
+    assert keyed['01001'] == ['0.9']
+    assert list(keyed) == ['01001', '01003']
+    # Views share the rows rather than copying them
+    row = keyed.table[0]
+    view = keyed.view(0)
+    row[1] = '0.1'
+    assert view == ['0.1']
@@ -0,0 +1,72 @@
+"""
+Tests of typed_csv on a small cancer-risk style table.
+"""
+
+import math
+import os
+
+import pytest
+
+import parse_cache
+import typed_csv
+
+
+ROWS = ['AL,Autauga County,1001,54571,6.9E-05,404.2,232.9',
+        'AK,Aleutians East,02013,3141,,45.7,1.2',
+        'XX,Placeholder,-,0,1.0E-06,0.30000000000000004,12.5']
+
+SCHEMA = [('fips', 2, typed_csv.FIPS),
+          ('population', 3, typed_csv.INT),
+          ('risk', 4, typed_csv.FLOAT),
+          ('x', 5, typed_csv.FLOAT)]
+
+
+def write_table(directory, rows=ROWS):
+    """
+    Writes the rows to a CSV file and returns its name.
+    """
+    file_name = os.path.join(str(directory), 'table.csv')
+    with open(file_name, 'w', newline='') as csv_file:
+        csv_file.write('\n'.join(rows) + '\n')
+    return file_name
+
+
+def test_column_types(tmp_path):
+    table = typed_csv.load_typed_csv(write_table(tmp_path), SCHEMA, cache=None)
+    assert table.names == ['fips', 'population', 'risk', 'x']
+    assert table['fips'].tolist() == ['01001', '02013', '-']
+    assert table['population'].tolist() == [54571, 3141, 0]
+    assert math.isnan(table['risk'][1])
+
+
+def test_floats_identical_to_float(tmp_path):
+    table = typed_csv.load_typed_csv(write_table(tmp_path), SCHEMA, cache=None)
+    assert table['x'].tolist() == [float(row.split(',')[5]) for row in ROWS]
+    assert table['risk'][0] == float('6.9E-05')
+
+
+def test_columns_are_read_only(tmp_path):
+    table = typed_csv.load_typed_csv(write_table(tmp_path), SCHEMA, cache=None)
+    with pytest.raises(ValueError):
+        table['risk'][0] = 0.0
+
+
+def test_bad_value_names_column(tmp_path):
+    rows = ROWS + ['AL,Bad,1003,many,1.0E-05,1.0,1.0']
+    with pytest.raises(ValueError, match='population'):
+        typed_csv.load_typed_csv(write_table(tmp_path, rows), SCHEMA, cache=None)
+
+
+def test_take_and_rows(tmp_path):
+    table = typed_csv.load_typed_csv(write_table(tmp_path), SCHEMA, cache=None)
+    assert table.head(1).to_rows() == [['01001', 54571, 6.9E-05, 404.2]]
+    assert len(table.take(table['population'] > 1000)) == 2
+
+
+def test_edited_file_is_read_again(tmp_path):
+    file_name = write_table(tmp_path)
+    cache = parse_cache.ParseCache()
+    table = typed_csv.load_typed_csv(file_name, SCHEMA, cache=cache)
+    assert typed_csv.load_typed_csv(file_name, SCHEMA, cache=cache) is table
+    write_table(tmp_path, ROWS[:2])
+    assert len(typed_csv.load_typed_csv(file_name, SCHEMA, cache=cache)) == 2
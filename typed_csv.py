@@ -0,0 +1,156 @@
+"""
+Reading CSV files into typed columns.
+
+read_csv_file returns every field as a string, so users of the table
+convert the same fields (populations, risks, centers) again and again.
+read_typed_csv instead takes a schema naming the columns to keep and the
+type of each, and converts every column once, as a whole, into a NumPy
+array:
+
+  FIPS   - FIPS code, as a string zero-padded to five digits
+  INT    - 64-bit integer
+  FLOAT  - 64-bit float, with blank fields read as NaN
+  STRING - string, as read
+
+Columns not in the schema are dropped while reading.
+"""
+
+import csv
+from collections import namedtuple
+
+import numpy as np
+
+import instrument
+import parse_cache
+
+
+FIPS = 'fips'
+INT = 'int'
+FLOAT = 'float'
+STRING = 'string'
+
+FIPS_WIDTH = 5
+
+# One column of a schema: its name in the table, its index in the file and its type
+Column = namedtuple('Column', ['name', 'index', 'kind'])
+
+# Tables read by load_typed_csv, shared by every caller in the process
+TABLE_CACHE = parse_cache.ParseCache(maxsize=8)
+
+
+class TypedTable:
+    """
+    A table of typed columns of equal length.
+
+    Attributes:
+      columns - dictionary mapping each column name to a NumPy array,
+                in schema order
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def names(self):
+        """
+        Returns the list of column names.
+        """
+        return list(self.columns)
+
+    def take(self, rows):
+        """
+        Input:
+          rows - slice, integer array of row indices, or boolean mask
+        Output:
+          Returns a new TypedTable of the selected rows.  A slice gives
+          views of the columns rather than copies.
+        """
+        return TypedTable({name: column[rows] for name, column in self.columns.items()})
+
+    def head(self, num_rows):
+        """
+        Returns a TypedTable of the first num_rows rows (all rows for None).
+        """
+        return self.take(slice(None, num_rows))
+
+    def to_rows(self):
+        """
+        Returns the table as a nested list, one list of Python values per row.
+        """
+        return [list(row) for row in zip(*[column.tolist() for column in self.columns.values()])]
+
+
+def convert_column(fields, kind, name='column'):
+    """
+    Inputs:
+      fields - list of field strings of one column
+      kind   - FIPS, INT, FLOAT or STRING
+      name   - column name used in error messages
+    Output:
+      Returns the fields converted to a NumPy array of the given type.
+    """
+    try:
+        if kind == FLOAT:
+            return np.array([field if field.strip() else 'nan' for field in fields],
+                            dtype=np.float64)
+        if kind == INT:
+            return np.array(fields).astype(np.int64)
+        if kind == FIPS:
+            # Only numeric codes are padded - placeholders such as '-' are kept
+            return np.array([field.zfill(FIPS_WIDTH) if field.isdigit() else field
+                             for field in fields], dtype=str)
+        if kind == STRING:
+            return np.array(fields, dtype=str)
+    except ValueError as error:
+        raise ValueError('bad value in column {!r}: {}'.format(name, error)) from None
+    raise ValueError('unknown column type: {!r}'.format(kind))
+
+
+def read_typed_csv(file_name, schema, delimiter=','):
+    """
+    Inputs:
+      file_name - name of a CSV file without a header
+      schema    - sequence of Columns to read
+      delimiter - field separator
+    Output:
+      Returns a TypedTable holding the columns of the schema, as
+      read-only arrays.
+    """
+    fields = [[] for _ in schema]
+    indices = [column.index for column in schema]
+    with open(file_name, newline='') as csv_file:
+        for row in csv.reader(csv_file, delimiter=delimiter):
+            for column_fields, index in zip(fields, indices):
+                column_fields.append(row[index])
+    num_rows = len(fields[0]) if fields else 0
+    instrument.count('rows_read', num_rows)
+    instrument.count('cells_parsed', num_rows * len(schema))
+    columns = {column.name: convert_column(column_fields, column.kind, column.name)
+               for column, column_fields in zip(schema, fields)}
+    for array in columns.values():
+        array.flags.writeable = False
+    return TypedTable(columns)
+
+
+def load_typed_csv(file_name, schema, delimiter=',', cache=TABLE_CACHE):
+    """
+    Inputs:
+      as read_typed_csv, plus
+      cache - ParseCache to read the table through, or None
+    Output:
+      Returns the TypedTable for the file, reading it only if it is not
+      already cached.  The table is shared between callers and must not
+      be modified.
+    """
+    schema = tuple(Column(*column) for column in schema)
+    if cache is None:
+        return read_typed_csv(file_name, schema, delimiter)
+    return cache.get(file_name, read_typed_csv, schema, delimiter)